@@ -1,14 +1,19 @@
 # app/__init__.py
 
-from flask import Flask
+import sqlite3
+import time
+from flask import Flask, g, has_request_context, request, before_render_template, template_rendered
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
 from flask_login import LoginManager
 from authlib.integrations.flask_client import OAuth
 from datetime import timedelta # Needed for session lifetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.db_routing import RoutingSession, init_routing
 
 # 1. Initialize extensions BEFORE the app object
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession}) # Sends GET reads to the replica bind, if any
 login = LoginManager()
 login.login_view = 'login' # Route name for login page redirection
 
@@ -30,6 +35,17 @@ app.config['SESSION_PERMANENT'] = True
 db.init_app(app)
 login.init_app(app)
 oauth.init_app(app) # Initialize OAuth with the app instance
+init_routing(app)
+
+# SQLite tuning (WAL, synchronous, mmap_size), applied to every new connection;
+# Postgres pool and statement settings are in config.engine_options()
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        for name, value in app.config.get('SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
 
 # Register Google OAuth client using the loaded config
 oauth.register(
@@ -41,12 +57,70 @@ oauth.register(
 )
 
 # --- User Loader ---
+# Served from a per-worker identity cache (user + role + alumni profile in one query)
 @login.user_loader
 def load_user(id):
-    from app.models import User
-    return db.session.get(User, int(id))
+    return identity.load_identity(int(id))
+# --------------------
+
+# --- Request metrics: latency, SQL count and time, template time, slow queries ---
+# Recorded per endpoint in app/metrics.py and served at /metrics. A request is
+# recorded when its response is closed, so streamed bodies are included.
+from app.metrics import metrics as request_metrics, configure as configure_metrics, log_slow_query
+configure_metrics(app)
+slow_query_seconds = app.config.get('SLOW_QUERY_MS', 0) / 1000
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    in_request = has_request_context()
+    if in_request:
+        g.db_time = g.get('db_time', 0.0) + duration
+    if slow_query_seconds and duration >= slow_query_seconds:
+        log_slow_query((request.endpoint or 'unmatched') if in_request else '-', duration, statement)
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def stop_template_timer(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        g.template_time = g.get('template_time', 0.0) + time.perf_counter() - started
+
+@app.after_request
+def record_request_metrics(response):
+    if app.config.get('QUERY_COUNT_HEADER'):
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+    started = g.get('request_started')
+    if started is not None:
+        stats = g._get_current_object() # Still updated while a streamed body is generated
+        endpoint, method = request.endpoint or 'unmatched', request.method
+        response.call_on_close(lambda: request_metrics.record_request(
+            endpoint, method, response.status_code, time.perf_counter() - started,
+            stats.get('query_count', 0), stats.get('db_time', 0.0), stats.get('template_time', 0.0)))
+    return response
 # --------------------
 
 # 4. Import models and routes LAST
 from app import models
-from app import routes
\ No newline at end of file
+from app import identity
+from app import tenancy
+from app import routes
+from app import assets
+from app import commands
\ No newline at end of file
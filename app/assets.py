@@ -0,0 +1,133 @@
+# app/assets.py
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import namedtuple
+
+from flask import request, send_file
+from app import app
+
+try:
+    import brotli
+except ImportError: # Optional: without it only the gzip variants are built
+    brotli = None
+
+# --- Static asset manifest ---
+# The first url_for('static', ...) fingerprints every file under app/static, so the
+# URL of css/style.css becomes css/style.<hash>.css, with <hash> taken from its
+# bytes. A fingerprinted URL only ever has one content, so it is served with a
+# one-year immutable Cache-Control and browsers stop revalidating it. Text assets
+# are compressed once into instance/static (gzip, and brotli when installed), and
+# the variant the client accepts is sent. Files go out through send_file, which
+# hands them to the server's wsgi.file_wrapper (sendfile(2) under gunicorn).
+# Names that are not in the manifest, such as institute logos added later, are
+# served as before. Off in debug mode, where files change under a running server.
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.ico')
+MIN_COMPRESS_SIZE = 1024
+
+Asset = namedtuple('Asset', 'path mimetype variants') # variants: [(encoding, path)], preferred first
+
+
+def _gzip(data):
+    return gzip.compress(data, 9, mtime=0) # mtime=0: the same bytes give the same file
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class AssetManifest(object):
+
+    def __init__(self, static_dir, cache_dir):
+        self.static_dir = static_dir
+        self.cache_dir = cache_dir
+        self._urls = None   # filename -> fingerprinted filename
+        self._assets = {}   # fingerprinted filename -> Asset
+        self._lock = threading.Lock()
+
+    def load(self):
+        """The filename -> fingerprinted filename map, built on first use."""
+        if self._urls is None:
+            with self._lock:
+                if self._urls is None:
+                    self._build()
+        return self._urls
+
+    def asset(self, filename):
+        self.load()
+        return self._assets.get(filename)
+
+    def _build(self):
+        urls, assets = {}, {}
+        for root, dirs, files in os.walk(self.static_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                stem, ext = os.path.splitext(filename)
+                fingerprinted = f'{stem}.{digest}{ext}'
+                urls[filename] = fingerprinted
+                assets[fingerprinted] = Asset(path, mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                                              self._compress(data, digest, ext.lower()))
+        self._assets = assets
+        self._urls = urls
+
+    def _compress(self, data, digest, ext):
+        if ext not in COMPRESSIBLE or len(data) < MIN_COMPRESS_SIZE:
+            return []
+        variants = []
+        for encoding, suffix, compress in (('br', '.br', _brotli if brotli else None), ('gzip', '.gz', _gzip)):
+            if compress is None:
+                continue
+            path = os.path.join(self.cache_dir, f'{digest}{ext}{suffix}')
+            if not os.path.exists(path): # Built once; later starts (and other workers) reuse it
+                os.makedirs(self.cache_dir, exist_ok=True)
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue
+                tmp = f'{path}.{os.getpid()}.tmp'
+                with open(tmp, 'wb') as fh:
+                    fh.write(compressed)
+                os.replace(tmp, path)
+            variants.append((encoding, path))
+        return variants
+
+
+manifest = AssetManifest(app.static_folder, os.path.join(app.instance_path, 'static'))
+
+
+def serve_static(filename):
+    """Replaces Flask's static view: fingerprinted names get immutable caching and precompressed bodies."""
+    asset = manifest.asset(filename)
+    if asset is None:
+        return app.send_static_file(filename)
+    path, encoding = asset.path, None
+    for name, variant in asset.variants:
+        if request.accept_encodings[name]:
+            path, encoding = variant, name
+            break
+    response = send_file(path, mimetype=asset.mimetype, download_name=os.path.basename(filename),
+                         max_age=app.config['ASSET_MAX_AGE'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = manifest.load().get(values['filename'], values['filename'])
+
+
+if app.config.get('ASSET_FINGERPRINTS', True) and not app.debug:
+    app.view_functions['static'] = serve_static
+    app.url_defaults(fingerprint_static_url)
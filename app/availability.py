@@ -0,0 +1,139 @@
+# app/availability.py
+
+import hashlib
+import math
+import threading
+import time
+
+from sqlalchemy import event, exists, func, literal, select, union_all
+from app import app, db
+from app.models import Institute, User
+
+# --- Username / email / institute name availability ---
+# find_taken() checks any mix of the three with a single query; the registration
+# forms call it once per submission. For as-you-type checks, /api/availability asks
+# AvailabilityIndex first. It holds a Bloom filter of every taken value in this
+# process. A value the filter has never seen is certainly free, so most "available"
+# answers need no query. Only the filter's "maybe" answers (real matches and the
+# rare false positives) go to the database.
+#
+# New rows reach the filter in two ways. ORM inserts made by this process are added
+# at once. Rows written by other workers or by Core bulk inserts are read by id
+# every AVAILABILITY_REFRESH seconds. The filter is only a hint: submitting a form
+# always checks the database.
+
+KINDS = ('username', 'email', 'institute_name')
+SYNC_OVERLAP = 100 # Ids re-read each sync, for rows whose transactions committed out of id order
+
+
+def find_taken(username=None, email=None, institute_name=None):
+    """The set of kinds ('username', 'email', 'institute_name') whose given value is already used."""
+    checks = []
+    for kind, value, column in (('username', username, User.username), ('email', email, User.email),
+                                ('institute_name', institute_name, Institute.name)):
+        if value:
+            checks.append(select(literal(kind).label('kind')).where(exists().where(column == value)))
+    if not checks:
+        return set()
+    return set(db.session.execute(union_all(*checks) if len(checks) > 1 else checks[0]).scalars())
+
+
+class BloomFilter(object):
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2)) # Bits
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0 # Values added, kept by the caller
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)] # Double hashing
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class AvailabilityIndex(object):
+
+    def __init__(self, refresh=5.0, error_rate=0.01):
+        self.refresh = refresh
+        self.error_rate = error_rate
+        self._filter = None
+        self._max_ids = {'user': 0, 'institute': 0}
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self.checks = self.db_checks = 0
+
+    def note(self, kind, value):
+        """Adds a value that has just been taken (a no-op until the filter is built)."""
+        bloom = self._filter
+        if bloom is not None and value:
+            bloom.add(f'{kind}:{value}')
+
+    def _rows(self, min_user_id=0, min_institute_id=0):
+        users = db.session.execute(select(User.id, User.username, User.email).where(User.id > min_user_id)
+                                   .execution_options(yield_per=5000))
+        for user_id, username, email in users:
+            yield 'user', user_id, (('username', username), ('email', email))
+        institutes = db.session.execute(select(Institute.id, Institute.name).where(Institute.id > min_institute_id))
+        for institute_id, name in institutes:
+            yield 'institute', institute_id, (('institute_name', name),)
+
+    def _load(self, bloom, rows):
+        for table, row_id, values in rows:
+            for kind, value in values:
+                if value:
+                    bloom.add(f'{kind}:{value}')
+            if row_id > self._max_ids[table]:
+                self._max_ids[table] = row_id
+                bloom.count += len(values)
+
+    def _sync(self):
+        with self._lock:
+            if time.monotonic() < self._synced_at + self.refresh:
+                return
+            bloom = self._filter
+            if bloom is not None and bloom.count < bloom.capacity:
+                self._load(bloom, self._rows(self._max_ids['user'] - SYNC_OVERLAP,
+                                             self._max_ids['institute'] - SYNC_OVERLAP))
+            if bloom is None or bloom.count >= bloom.capacity: # First use, or full: rebuild with room to grow
+                users = db.session.execute(select(func.count(User.id))).scalar()
+                institutes = db.session.execute(select(func.count(Institute.id))).scalar()
+                bloom = BloomFilter(max(1024, 4 * (2 * users + institutes)), self.error_rate)
+                self._max_ids = {'user': 0, 'institute': 0}
+                self._load(bloom, self._rows())
+                self._filter = bloom
+            self._synced_at = time.monotonic()
+
+    def check(self, **values):
+        """Returns {kind: True if free} for the given username / email / institute_name values."""
+        self._sync()
+        self.checks += 1
+        maybe = {kind: value for kind, value in values.items() if f'{kind}:{value}' in self._filter}
+        taken = set()
+        if maybe:
+            self.db_checks += 1
+            taken = find_taken(**maybe)
+        return {kind: kind not in taken for kind in values}
+
+
+availability_index = AvailabilityIndex(refresh=app.config.get('AVAILABILITY_REFRESH', 5.0),
+                                       error_rate=app.config.get('AVAILABILITY_FALSE_POSITIVE_RATE', 0.01))
+
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    availability_index.note('username', target.username)
+    availability_index.note('email', target.email)
+
+
+@event.listens_for(Institute, 'after_insert')
+def _institute_inserted(mapper, connection, target):
+    availability_index.note('institute_name', target.name)
@@ -0,0 +1,297 @@
+# app/benchmark.py
+
+import http.client
+import json
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from sqlalchemy import func, select
+from app import db
+from app.models import Alumni, Event, Institute, User
+
+# --- Per-route load benchmark ---
+# Drives the portal's routes through the Flask test client (in this process) or
+# through a local gunicorn started for the run, with `concurrency` logged-in
+# sessions per route. Each route gets a few warm-up requests, then `requests`
+# timed ones. The JSON report gives latency percentiles, throughput, SQL queries
+# per request (from the X-Query-Count header, so queries run while a streamed body
+# is sent are not included) and the peak RSS of the serving process(es). Throughput
+# is also given per CPU available to the run (for `login`: logins per second per
+# core, which password hashing bounds). Reports from different commits are
+# compared with compare_reports().
+
+Scenario = namedtuple('Scenario', 'name method path role')
+
+# `path` is a format string filled from the sample picked for each request (see _sample)
+SCENARIOS = (
+    Scenario('home', 'GET', '/', None),
+    Scenario('events_list', 'GET', '/events', None),
+    Scenario('alumni_directory', 'GET', '/alumni', None),
+    Scenario('alumni_directory_year', 'GET', '/alumni?year={year}', None),
+    Scenario('alumni_search', 'GET', '/alumni?q={term}', None),
+    Scenario('login', 'POST', '/login', 'login'),
+    Scenario('alumni_profile', 'GET', '/alumni/{alumni_id}', 'alumnus'),
+    Scenario('dashboard_alumni', 'GET', '/dashboard', 'alumnus'),
+    Scenario('recommendations', 'GET', '/recommendations', 'alumnus'),
+    Scenario('dashboard_institute', 'GET', '/dashboard', 'admin'),
+    Scenario('admin_register_student', 'GET', '/admin/register_student', 'admin'),
+    Scenario('admin_export_alumni', 'GET', '/admin/export/alumni.csv', 'admin'),
+    Scenario('chatbot', 'POST', '/api/chatbot', None),
+)
+SCENARIO_NAMES = tuple(s.name for s in SCENARIOS)
+
+_CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+class ClientTransport(object):
+    """One session on the Flask test client."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self._client.open(path, method=method, data=form, json=json_body)
+        try:
+            body = response.get_data() # Streamed templates are rendered here
+        finally:
+            response.close()
+        return response.status_code, response.headers.get('X-Query-Count'), body
+
+
+class HTTPTransport(object):
+    """One keep-alive HTTP session with its own cookie jar."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self._connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+        self._cookies = SimpleCookie()
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body, headers['Content-Type'] = urlencode(form), 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body, headers['Content-Type'] = json.dumps(json_body), 'application/json'
+        if self._cookies:
+            headers['Cookie'] = '; '.join(f'{k}={m.value}' for k, m in self._cookies.items())
+        self._connection.request(method, path, body=body, headers=headers)
+        response = self._connection.getresponse()
+        data = response.read()
+        for cookie in response.headers.get_all('Set-Cookie') or ():
+            self._cookies.load(cookie)
+        return response.status, response.getheader('X-Query-Count'), data
+
+
+def _login_form(transport, username, password):
+    """The login form fields, with the CSRF token of a freshly fetched login page."""
+    form = {'username_or_email': username, 'password': password}
+    token = _CSRF_RE.search(transport.request('GET', '/login')[2].decode('utf-8', 'replace'))
+    if token:
+        form['csrf_token'] = token.group(1)
+    return form
+
+
+def _sample(db_session, rng, count=200):
+    """Request parameters drawn from the data: alumni ids, graduation years and search terms."""
+    max_id = db_session.execute(select(func.max(Alumni.id))).scalar() or 1
+    ids = [rng.randint(1, max_id) for _ in range(count)]
+    ids = db_session.execute(select(Alumni.id).where(Alumni.id.in_(ids))).scalars().all() or [1]
+    years = db_session.execute(select(Alumni.graduation_year).distinct()).scalars().all() or [datetime.now().year]
+    majors = db_session.execute(select(Alumni.major).where(Alumni.major.isnot(None)).distinct().limit(50)).scalars().all()
+    terms = [word for major in majors for word in major.split() if len(word) > 3] or ['alumni']
+    return {'alumni_id': ids, 'year': years, 'term': terms}
+
+
+def dataset_summary(db_session):
+    count = lambda model: db_session.execute(select(func.count()).select_from(model)).scalar()
+    return {'institutes': count(Institute), 'alumni': count(Alumni), 'users': count(User), 'events': count(Event),
+            'database': db_session.get_bind().dialect.name}
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pct = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+    return {'p50_ms': pct(0.50), 'p95_ms': pct(0.95), 'p99_ms': pct(0.99), 'max_ms': samples[-1] * 1000,
+            'mean_ms': sum(samples) / len(samples) * 1000}
+
+
+def _peak_rss_mb(pids):
+    """High-water RSS (VmHWM) of the largest of `pids`, or of this process when None."""
+    if pids is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    peaks = []
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as fh:
+                peaks += [int(line.split()[1]) / 1024 for line in fh if line.startswith('VmHWM:')]
+        except OSError:
+            pass
+    return max(peaks) if peaks else None
+
+
+def _gunicorn_pids(master):
+    """The gunicorn master and its workers."""
+    pids = [master.pid]
+    for entry in os.listdir('/proc'):
+        try:
+            with open(f'/proc/{entry}/status') as fh:
+                if any(line.split() == ['PPid:', str(master.pid)] for line in fh):
+                    pids.append(int(entry))
+        except (OSError, ValueError):
+            pass
+    return pids
+
+
+def start_gunicorn(app, workers=None, timeout=30):
+    """Starts gunicorn with the repository's gunicorn.conf.py on a free local port; returns (process, base url)."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    root = os.path.dirname(app.root_path)
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', QUERY_COUNT_HEADER='true',
+               CHATBOT_BACKEND=os.environ.get('CHATBOT_BACKEND', 'fake'),
+               CHATBOT_FAKE_LATENCY=os.environ.get('CHATBOT_FAKE_LATENCY', '0'),
+               CHATBOT_FAKE_TOKEN_DELAY=os.environ.get('CHATBOT_FAKE_TOKEN_DELAY', '0'))
+    if workers:
+        env['GUNICORN_WORKERS'] = str(workers)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+                               cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start listening in time')
+
+
+def _git_commit(root):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _run_scenario(scenario, new_session, credentials, params, requests, concurrency, warmup, seed):
+    """Times `requests` requests of one scenario over `concurrency` sessions."""
+    def session():
+        transport = new_session()
+        if scenario.role in ('alumnus', 'admin'):
+            status = transport.request('POST', '/login', form=_login_form(transport, *credentials[scenario.role]))[0]
+            if status != 302:
+                raise RuntimeError(f'Could not log in as {credentials[scenario.role][0]} (status {status})')
+        return transport
+
+    def one(transport, rng):
+        path = scenario.path.format(**{key: rng.choice(values) for key, values in params.items()})
+        if scenario.role == 'login':
+            transport = new_session() # Logging in needs an anonymous session every time
+            form = _login_form(transport, *credentials['alumnus'])
+            started = time.perf_counter()
+            status, queries, _ = transport.request('POST', path, form=form)
+        elif scenario.name == 'chatbot':
+            started = time.perf_counter()
+            status, queries, _ = transport.request('POST', path, json_body={'message': f'Who studied {rng.choice(params["term"])}?'})
+        else:
+            started = time.perf_counter()
+            status, queries, _ = transport.request(scenario.method, path)
+        return time.perf_counter() - started, status, int(queries) if queries is not None else None
+
+    def worker(index, count):
+        rng = random.Random(f'{seed}:{scenario.name}:{index}')
+        transport = session()
+        return [one(transport, rng) for _ in range(count)]
+
+    if warmup:
+        worker('warmup', warmup)
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for batch in pool.map(worker, range(concurrency), shares) for r in batch]
+    elapsed = time.perf_counter() - started
+
+    latencies = [r[0] for r in results]
+    statuses = Counter(r[1] for r in results)
+    queries = [r[2] for r in results if r[2] is not None]
+    report = {'requests': len(results), 'errors': sum(c for s, c in statuses.items() if s >= 400),
+              'statuses': {str(s): c for s, c in sorted(statuses.items())},
+              'throughput_rps': len(results) / elapsed if elapsed else None}
+    report.update(_percentiles(latencies))
+    report['queries_mean'] = sum(queries) / len(queries) if queries else None
+    report['queries_max'] = max(queries) if queries else None
+    return report
+
+
+def run_benchmark(app, scenarios=SCENARIO_NAMES, requests=100, concurrency=4, warmup=5, seed=1,
+                  password='Password123', target='client', workers=None, progress=None):
+    """
+    Benchmarks each named scenario against `target` ('client' or 'gunicorn') and
+    returns the JSON-ready report. Logs in as the users written by
+    generate_dataset(seed=...) with `password`. `progress(name, report)` is called
+    after every scenario.
+    """
+    credentials = {'alumnus': (f'synth{seed}-u1', password), 'admin': (f'synth{seed}-admin1', password)}
+    with app.app_context():
+        params = _sample(db.session, random.Random(seed))
+        dataset = dataset_summary(db.session)
+        db.session.remove()
+
+    process = pids = None
+    if target == 'gunicorn':
+        process, base_url = start_gunicorn(app, workers)
+        new_session = lambda: HTTPTransport(base_url)
+    else:
+        app.config['QUERY_COUNT_HEADER'] = True
+        if not app.config.get('CHATBOT_BACKEND'):
+            app.config.update(CHATBOT_BACKEND='fake', CHATBOT_FAKE_LATENCY=0, CHATBOT_FAKE_TOKEN_DELAY=0)
+        new_session = lambda: ClientTransport(app)
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    report = {'commit': _git_commit(os.path.dirname(app.root_path)), 'started_at': datetime.now().isoformat(timespec='seconds'),
+              'target': target, 'cpus': cpus, 'dataset': dataset,
+              'settings': {'requests': requests, 'concurrency': concurrency, 'warmup': warmup, 'seed': seed, 'workers': workers},
+              'routes': {}}
+    try:
+        by_name = {s.name: s for s in SCENARIOS}
+        for name in scenarios:
+            result = _run_scenario(by_name[name], new_session, credentials, params, requests, concurrency, warmup, seed)
+            pids = _gunicorn_pids(process) if process else None
+            result['peak_rss_mb'] = _peak_rss_mb(pids) # Cumulative: the high-water mark after this route
+            result['throughput_per_core_rps'] = result['throughput_rps'] / cpus if result['throughput_rps'] else None
+            report['routes'][name] = result
+            if progress:
+                progress(name, result)
+        report['peak_rss_mb'] = _peak_rss_mb(pids)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    return report
+
+
+def compare_reports(old, new, metric='p95_ms'):
+    """Yields (route, old value, new value, change in percent) for routes present in both reports."""
+    for name, result in new['routes'].items():
+        before, after = old['routes'].get(name, {}).get(metric), result.get(metric)
+        if before is None or after is None:
+            continue
+        yield name, before, after, (after - before) / before * 100 if before else 0.0
@@ -0,0 +1,127 @@
+# app/bootstrap.py
+
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, text, update
+from werkzeug.security import check_password_hash
+from app import db
+from app.models import Alumni, Institute, Event, User, Role, InstituteRollup, DataMigration
+from app.passwords import OAUTH_ONLY, can_fork, fork_pool
+from app.search import ensure_search_index
+from app.rollups import reconcile_rollups
+
+# --- Database initialisation ---
+# Run explicitly with `flask init-db` (and by `python run.py` in development),
+# never at import time, so starting a web worker does not open a connection or
+# write to the database. Safe to re-run after an upgrade: create_all only adds
+# missing tables, and the demo data is only seeded into an empty database.
+
+
+def seed_demo_data():
+    """Roles, the main institute, its admin (admin_main / supersecret) and some sample rows."""
+    role_admin = Role(name='Institute_Admin')
+    role_alumnus = Role(name='Alumnus')
+    role_student = Role(name='Student')
+    db.session.add_all([role_admin, role_alumnus, role_student])
+    db.session.flush()
+
+    main_institute = Institute(name='Main University', logo_path='logo.png')
+    db.session.add(main_institute)
+    db.session.flush()
+
+    admin_user = User(
+        username='admin_main',
+        email='admin@main.edu',
+        role_id=role_admin.id,
+        institute_id=main_institute.id
+    )
+    admin_user.set_password('supersecret')
+    db.session.add(admin_user)
+
+    db.session.add_all([
+        Alumni(name='Alice Johnson', graduation_year=2025, major='Computer Science', city='New York', phone_number='555-1234', linkedin_id='alice_j', institute_id=main_institute.id, profile_complete=True),
+        Alumni(name='Bob Smith', graduation_year=2024, major='Electrical Engineering', city='San Francisco', phone_number='555-5678', linkedin_id='bob_s', institute_id=main_institute.id, profile_complete=True),
+    ])
+    db.session.add_all([
+        Event(title='Annual Gala Dinner', date_time=datetime.now() + timedelta(days=60), location='Grand Hall', institute_id=main_institute.id),
+        Event(title='Mentorship Workshop', date_time=datetime.now() + timedelta(days=90), location='Online Webinar', institute_id=main_institute.id),
+    ])
+    db.session.commit()
+
+
+# --- Data migrations ---
+# Run once per database by init_database, in order, and recorded in data_migration.
+
+LEGACY_OAUTH_PASSWORD = 'GOOGLE_OAUTH_USER_NO_PASSWORD' # What older Google accounts were hashed from
+
+
+def _is_legacy_oauth_hash(password_hash):
+    return check_password_hash(password_hash, LEGACY_OAUTH_PASSWORD)
+
+
+def migrate_legacy_oauth_hashes():
+    """
+    Google accounts created before OAUTH_ONLY existed have a hash of a fixed string;
+    gives them OAUTH_ONLY, so that string is not a valid password. Returns how many.
+    """
+    rows = db.session.execute(select(User.id, User.password_hash)
+                              .where(User.password_hash.isnot(None), User.password_hash.notlike('!%'))).all()
+    if not rows:
+        return 0
+    workers = os.cpu_count() or 1
+    pool = fork_pool(workers) if len(rows) >= 32 and can_fork() else None # Every check is a full, slow hash
+    try:
+        hashes = [password_hash for _, password_hash in rows]
+        matches = (pool.map(_is_legacy_oauth_hash, hashes, chunksize=max(1, len(hashes) // (4 * workers)))
+                   if pool else map(_is_legacy_oauth_hash, hashes))
+        ids = [user_id for (user_id, _), legacy in zip(rows, matches) if legacy]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if ids:
+        db.session.execute(update(User).where(User.id.in_(ids)).values(password_hash=OAUTH_ONLY))
+    return len(ids)
+
+
+DATA_MIGRATIONS = (('legacy-oauth-hashes', migrate_legacy_oauth_hashes),)
+
+
+def apply_data_migrations():
+    """Runs the data migrations this database has not had yet, each in its own transaction."""
+    applied = set(db.session.execute(select(DataMigration.name)).scalars())
+    for name, migrate in DATA_MIGRATIONS:
+        if name not in applied:
+            migrate()
+            db.session.add(DataMigration(name=name))
+            db.session.commit()
+
+
+# Tables of earlier versions, dropped by init_database. alumni_stat held the global
+# alumni/year/institute counters, which institute_rollup (app/rollups.py) now keeps per institute.
+RETIRED_TABLES = ('alumni_stat',)
+
+
+def init_database(seed=True):
+    """
+    Creates missing tables and indexes, the full-text index and the dashboard rollups,
+    drops tables that earlier versions created and nothing uses any more, and applies
+    pending data migrations.
+    Seeds the demo data when `seed` is set and there are no roles yet.
+    Returns True when the demo data was seeded.
+    """
+    db.create_all()
+    with db.engine.begin() as connection:
+        for table in RETIRED_TABLES:
+            connection.execute(text(f'DROP TABLE IF EXISTS {table}'))
+    for table in db.metadata.sorted_tables: # create_all skips the indexes of tables that already exist
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    apply_data_migrations()
+    seeded = False
+    if seed and Role.query.first() is None:
+        seed_demo_data()
+        seeded = True
+    ensure_search_index()
+    if InstituteRollup.query.first() is None and (Alumni.query.first() is not None or Event.query.first() is not None):
+        reconcile_rollups() # Backfill the dashboard rollups for a database that predates them
+    return seeded
@@ -0,0 +1,257 @@
+# app/bulk_import.py
+
+import csv
+import io
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import partial
+from itertools import islice
+from types import SimpleNamespace
+
+from sqlalchemy import insert, select, or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import Alumni, User, Role
+from app.ml_utils import queue_alumni_changes
+from app.retrieval import queue_alumni_documents
+from app.page_cache import bump_data_versions, tenant_scopes
+from app.rollups import apply_alumni_rollups
+from app.passwords import INVITE_PENDING, can_fork, fork_pool, hash_method, password_checker
+
+# --- Bulk alumni import ---
+# Records are read from a CSV or NDJSON stream one chunk at a time. For each chunk:
+#   1. every row is validated on its own and against earlier rows of the file;
+#   2. one query finds the emails/usernames that already exist;
+#   3. passwords are hashed in a process pool (hashing is deliberately slow and
+#      holds the GIL): the CLI forks its own, a web worker uses the login pool
+#      (see app/passwords.py); rows without one get INVITE_PENDING, so the account can
+#      only be used once its owner has chosen a password through an invite link;
+#   4. Alumni and User rows go in with two multi-row INSERTs in one transaction,
+#      which also adjusts the dashboard rollups; the recommender and chatbot
+#      indexes pick the rows up on commit and the FTS triggers index them.
+# Rejected rows are reported with their line number and never stop the import.
+
+FIELDS = ('name', 'email', 'graduation_year', 'username', 'major', 'city',
+          'phone_number', 'linkedin_id', 'password', 'role')
+REQUIRED = ('name', 'email', 'graduation_year')
+MAX_LENGTHS = {'name': 100, 'email': 120, 'username': 64, 'major': 100, 'city': 100,
+               'phone_number': 20, 'linkedin_id': 100}
+ROLES = ('Alumnus', 'Student')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+RowError = namedtuple('RowError', 'line email username error')
+ImportReport = namedtuple('ImportReport', 'read imported rejected seconds')
+
+
+def iter_records(stream, fmt):
+    """Yields (line number, dict) from a binary CSV or NDJSON stream without reading it all."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(text, 1):
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_no, record if isinstance(record, dict) else {'__invalid__': 'Not a JSON object'}
+
+
+def _clean(record):
+    """Returns (values, error) for one raw record."""
+    if '__invalid__' in record:
+        return None, record['__invalid__']
+    values = {}
+    for field in FIELDS:
+        value = record.get(field)
+        value = str(value).strip() if value is not None else ''
+        values[field] = value or None
+    missing = [f for f in REQUIRED if not values[f]]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    values['email'] = values['email'].lower()
+    if not EMAIL_RE.match(values['email']):
+        return None, 'Invalid email'
+    if not values['username']:
+        values['username'] = values['email'].split('@', 1)[0]
+    try:
+        values['graduation_year'] = int(values['graduation_year'])
+    except ValueError:
+        return None, 'graduation_year is not a number'
+    if not 1900 <= values['graduation_year'] <= 2100:
+        return None, 'graduation_year is out of range'
+    for field, limit in MAX_LENGTHS.items():
+        if values[field] and len(values[field]) > limit:
+            return None, f'{field} is longer than {limit} characters'
+    if values['role'] is None:
+        values['role'] = 'Student' if values['graduation_year'] > datetime.now().year else 'Alumnus'
+    elif values['role'] not in ROLES:
+        return None, f"role must be one of {', '.join(ROLES)}"
+    return values, None
+
+
+def record_alumni_inserted(session, rows):
+    """
+    Does for alumni written with a Core INSERT what the ORM events would have done:
+    moves the rollups and the directory page versions in the current transaction and
+    queues the rows for the recommender and chatbot indexes (applied on commit).
+    `rows` are the inserted column values as dicts, each with its 'id'.
+    """
+    connection = session.connection()
+    apply_alumni_rollups(connection, rows)
+    bump_data_versions(connection, [scope for institute_id in sorted({r['institute_id'] for r in rows})
+                                    for scope in tenant_scopes(('alumni',), institute_id)])
+    inserted = [SimpleNamespace(**r) for r in rows]
+    queue_alumni_changes(session, inserted)
+    queue_alumni_documents(session, inserted)
+
+
+class AlumniImporter(object):
+    """
+    Imports records into one institute. Use as a context manager so the hashing pool
+    is shut down; `on_error(RowError)` is called for every rejected row.
+    """
+
+    def __init__(self, institute_id, chunk_size=1000, workers=None, on_error=None):
+        self.institute_id = institute_id
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.on_error = on_error or (lambda error: None)
+        self._pool = None
+        self._seen_emails, self._seen_usernames = set(), set()
+        self.read = self.imported = self.rejected = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def _hash_all(self, passwords):
+        if self._pool is None and len(passwords) >= 32 and can_fork(): # The CLI: safe to fork our own processes
+            self._pool = fork_pool(self.workers or os.cpu_count() or 1)
+        # A web worker already runs threads, so it shares the login hashing processes instead
+        pool, workers = (self._pool, self.workers or os.cpu_count()) if self._pool else (password_checker.pool, password_checker.workers)
+        if pool is None or len(passwords) < 32: # Not worth the round trips
+            return [generate_password_hash(p, hash_method()) for p in passwords]
+        chunksize = max(1, len(passwords) // (4 * (workers or 1)))
+        return list(pool.map(partial(generate_password_hash, method=hash_method()), passwords, chunksize=chunksize))
+
+    def _reject(self, line, values, error):
+        self.rejected += 1
+        values = values or {}
+        self.on_error(RowError(line, values.get('email'), values.get('username'), error))
+
+    def _existing(self, rows):
+        emails = [row[1]['email'] for row in rows]
+        usernames = [row[1]['username'] for row in rows]
+        found = db.session.execute(select(User.email, User.username)
+                                   .where(or_(User.email.in_(emails), User.username.in_(usernames))))
+        existing_emails, existing_usernames = set(), set()
+        for email, username in found:
+            existing_emails.add(email)
+            existing_usernames.add(username)
+        return existing_emails, existing_usernames
+
+    def _insert(self, rows, role_ids):
+        """Inserts (line, values, password hash) rows in the current transaction."""
+        alumni = [{'name': r['name'], 'graduation_year': r['graduation_year'], 'major': r['major'],
+                   'city': r['city'], 'phone_number': r['phone_number'], 'linkedin_id': r['linkedin_id'],
+                   'institute_id': self.institute_id, 'profile_complete': False} for _, r, _ in rows]
+        ids = db.session.execute(insert(Alumni).returning(Alumni.id, sort_by_parameter_order=True), alumni).scalars().all()
+        db.session.execute(insert(User), [
+            {'username': r['username'], 'email': r['email'], 'password_hash': h,
+             'role_id': role_ids[r['role']], 'alumni_id': alumni_id, 'institute_id': self.institute_id}
+            for (_, r, h), alumni_id in zip(rows, ids)])
+
+        record_alumni_inserted(db.session, [dict(a, id=i) for i, a in zip(ids, alumni)])
+
+    def _import_chunk(self, records, role_ids):
+        rows = []
+        for line, record in records:
+            self.read += 1
+            values, error = _clean(record)
+            if error is None and values['email'] in self._seen_emails:
+                error = 'Duplicate email earlier in the file'
+            elif error is None and values['username'] in self._seen_usernames:
+                error = 'Duplicate username earlier in the file'
+            if error:
+                self._reject(line, values, error)
+                continue
+            self._seen_emails.add(values['email'])
+            self._seen_usernames.add(values['username'])
+            rows.append((line, values))
+        if not rows:
+            return
+
+        existing_emails, existing_usernames = self._existing(rows)
+        rows = self._unregistered(rows, existing_emails, existing_usernames)
+        # Rows without a password can only be logged into once an invite link has been used
+        hashes = iter(self._hash_all([values['password'] for _, values in rows if values['password']]))
+        rows = [(line, values, next(hashes) if values['password'] else INVITE_PENDING) for line, values in rows]
+        for attempt in range(2): # A concurrent registration can take an email between check and insert
+            if not rows:
+                return
+            try:
+                self._insert(rows, role_ids)
+                db.session.commit()
+                self.imported += len(rows)
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    for line, values, _ in rows:
+                        self._reject(line, values, 'Conflicts with a row inserted concurrently')
+                    return
+                existing_emails, existing_usernames = self._existing(rows)
+                rows = self._unregistered(rows, existing_emails, existing_usernames)
+
+    def _unregistered(self, rows, existing_emails, existing_usernames):
+        accepted = []
+        for row in rows:
+            line, values = row[0], row[1]
+            if values['email'] in existing_emails:
+                self._reject(line, values, 'Email is already registered')
+            elif values['username'] in existing_usernames:
+                self._reject(line, values, 'Username is already taken')
+            else:
+                accepted.append(row)
+        return accepted
+
+    def iter_run(self, records):
+        """Imports an iterable of (line number, record dict), yielding an ImportReport after each chunk."""
+        started = time.perf_counter()
+        role_ids = dict(db.session.execute(select(Role.name, Role.id).where(Role.name.in_(ROLES))).all())
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            self._import_chunk(chunk, role_ids)
+            yield ImportReport(self.read, self.imported, self.rejected, time.perf_counter() - started)
+
+    def run(self, records):
+        """Imports everything and returns the final ImportReport."""
+        report = ImportReport(0, 0, 0, 0.0)
+        for report in self.iter_run(records):
+            pass
+        return report
+
+
+def detect_format(filename, content_type=None):
+    """'csv' or 'ndjson' from a file name or MIME type; None when neither matches."""
+    name = (filename or '').lower()
+    if name.endswith('.csv') or content_type == 'text/csv':
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or content_type in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
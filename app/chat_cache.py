@@ -0,0 +1,180 @@
+# app/chat_cache.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- Chatbot response cache ---
+# Replies are cached under a normalised form of the question, so "Hi! When is the
+# reunion?" and "when is the  reunion, please" share one upstream call. Two backends:
+#   memory - per-process TTL/LRU dict;
+#   sqlite - a small WAL-mode SQLite file in the instance folder, shared by every
+#            gunicorn worker on the host (hit statistics are shared too). A lookup
+#            only reads: each process adds its hit/miss counts to the shared ones
+#            at most every STATS_FLUSH_INTERVAL seconds (or with its next put), and
+#            an entry's LRU time is only moved once it is USED_AT_RESOLUTION old.
+# Concurrent identical misses are coalesced by ChatClient, within one process.
+
+STATS_FLUSH_INTERVAL = 10  # Seconds between writes of a process's hit/miss counts (sqlite)
+USED_AT_RESOLUTION = 60    # Seconds of LRU precision; a hit refreshes used_at no more often (sqlite)
+
+# Greetings and politeness only: modal verbs and pronouns change what is being asked
+_FILLER = frozenset('hi hello hey please pls thanks thx kindly'.split())
+
+
+def normalise_prompt(message):
+    """Lowercases, strips punctuation and filler words: "Hi! When is the reunion??" -> "when is the reunion"."""
+    words = re.findall(r'\w+', (message or '').lower())
+    return ' '.join(w for w in words if w not in _FILLER)
+
+
+def cache_key(message, namespace=''):
+    """Stable key for a message; `namespace` separates replies from different models or prompts."""
+    return hashlib.sha1(f'{namespace}\x00{normalise_prompt(message)}'.encode('utf-8')).hexdigest()
+
+
+class MemoryResponseCache(object):
+
+    def __init__(self, max_size=1024, ttl=86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, reply, upstream latency in seconds)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return entry[1]
+
+    def put(self, key, reply, latency):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, reply, latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return _stats(len(self._entries), self.hits, self.misses, self.saved_seconds)
+
+
+class SQLiteResponseCache(object):
+
+    def __init__(self, path, max_size=1024, ttl=86400):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()  # One connection per thread
+        self._pending = dict.fromkeys(('hits', 'misses', 'saved_seconds'), 0) # Not yet added to `counters`
+        self._pending_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, reply TEXT NOT NULL, latency REAL NOT NULL,
+                expires_at REAL NOT NULL, used_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_used_at ON responses (used_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0), ('saved_seconds', 0)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **deltas):
+        """Counts in memory; returns True when the counts are due to be written."""
+        with self._pending_lock:
+            for name, delta in deltas.items():
+                self._pending[name] += delta
+            return time.monotonic() - self._flushed_at >= STATS_FLUSH_INTERVAL
+
+    def _flush_counts(self, conn):
+        """Adds this process's pending counts to the shared ones."""
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = dict.fromkeys(pending, 0)
+            self._flushed_at = time.monotonic()
+        for name, delta in pending.items():
+            if delta:
+                conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (delta, name))
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT reply, latency, used_at FROM responses WHERE key = ? AND expires_at >= ?",
+                           (key, now)).fetchone()
+        flush = self._count(misses=1) if row is None else self._count(hits=1, saved_seconds=row[1])
+        touch = row is not None and now - row[2] >= USED_AT_RESOLUTION
+        if flush or touch: # The only writes on the read path, and rare
+            with conn:
+                if touch:
+                    conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+                if flush:
+                    self._flush_counts(conn)
+        return row[0] if row is not None else None
+
+    def put(self, key, reply, latency):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            self._flush_counts(conn) # Already writing
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                         (key, reply, latency, now + self.ttl, now))
+            # Drop expired entries, then the least recently used beyond max_size
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            conn.execute("""DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)""", (self.max_size,))
+
+    def clear(self):
+        with self._pending_lock:
+            self._pending = dict.fromkeys(self._pending, 0)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("UPDATE counters SET value = 0")
+
+    def stats(self):
+        conn = self._connect()
+        with conn:
+            self._flush_counts(conn)
+        size = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        counters = dict(conn.execute("SELECT name, value FROM counters"))
+        return _stats(size, int(counters['hits']), int(counters['misses']), counters['saved_seconds'])
+
+
+def _stats(size, hits, misses, saved_seconds):
+    lookups = hits + misses
+    return {'size': size, 'hits': hits, 'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0, 'saved_seconds': saved_seconds}
+
+
+def build_response_cache(config, instance_path):
+    """Builds the cache selected by CHATBOT_CACHE ('memory', 'sqlite' or 'none')."""
+    kind = (config.get('CHATBOT_CACHE') or 'memory').lower()
+    size, ttl = config.get('CHATBOT_CACHE_SIZE', 1024), config.get('CHATBOT_CACHE_TTL', 86400)
+    if kind == 'none':
+        return None
+    if kind == 'sqlite':
+        path = config.get('CHATBOT_CACHE_PATH') or os.path.join(instance_path, 'chatbot_cache.sqlite')
+        return SQLiteResponseCache(path, max_size=size, ttl=ttl)
+    return MemoryResponseCache(max_size=size, ttl=ttl)
@@ -0,0 +1,245 @@
+# app/chatbot.py
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from .chat_cache import cache_key, build_response_cache
+
+# --- Chatbot client ---
+# One ChatClient per process wraps a pluggable backend (Gemini or a local fake).
+# Upstream calls run on a small thread pool whose size caps how many chat requests
+# may be waiting on the model at once; when every slot is taken new requests fail
+# fast with ChatbotBusy instead of queueing behind slow generations, so chat can
+# never occupy all of a worker's threads (run gunicorn with gthread workers).
+# Replies are served from a response cache when possible (see chat_cache.py), and
+# concurrent identical questions share a single upstream call.
+
+PERSONA = "You are a helpful Alumni Assistant."
+
+
+class ChatbotBusy(Exception):
+    """Every upstream slot is in use."""
+
+
+class ChatbotUnavailable(Exception):
+    """No backend is configured (e.g. GEMINI_API_KEY is missing)."""
+
+
+class GeminiBackend(object):
+    """Google Gemini; the SDK is imported and configured once, on first construction."""
+
+    def __init__(self, config):
+        api_key = config.get('GEMINI_API_KEY')
+        if not api_key:
+            raise ChatbotUnavailable('GEMINI_API_KEY is not set')
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(config.get('CHATBOT_MODEL', 'gemini-2.5-flash'))
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend(object):
+    """Offline stand-in with configurable latency, for tests and load experiments."""
+
+    def __init__(self, config):
+        self.latency = config.get('CHATBOT_FAKE_LATENCY', 0.5)         # Seconds before the first token
+        self.token_delay = config.get('CHATBOT_FAKE_TOKEN_DELAY', 0.02) # Seconds between tokens
+
+    def _words(self, prompt):
+        message = prompt.rsplit('User:', 1)[-1].strip()
+        facts = prompt.count('\n- ')
+        return f"(offline assistant, {facts} facts) You asked: {message}".split()
+
+    def generate(self, prompt):
+        time.sleep(self.latency + self.token_delay * len(self._words(prompt)))
+        return ' '.join(self._words(prompt))
+
+    def stream(self, prompt):
+        time.sleep(self.latency)
+        for word in self._words(prompt):
+            time.sleep(self.token_delay)
+            yield word + ' '
+
+
+BACKENDS = {'gemini': GeminiBackend, 'fake': FakeBackend}
+
+
+def register_backend(name, factory):
+    """Makes a backend selectable with CHATBOT_BACKEND=<name>; `factory(config)` builds it."""
+    BACKENDS[name] = factory
+
+
+def build_prompt(message, context=None):
+    """The persona, any retrieved portal data, then the user's message."""
+    if not context:
+        return f"{PERSONA} User: {message}"
+    facts = '\n'.join(f"- {snippet}" for snippet in context)
+    return (f"{PERSONA} Answer using the portal data below when it is relevant; "
+            f"say so if it does not cover the question.\nPortal data:\n{facts}\nUser: {message}")
+
+
+class ChatClient(object):
+
+    def __init__(self, backend, max_concurrency=4, timeout=30, cache=None, namespace=''):
+        self.backend = backend
+        self.timeout = timeout
+        self.cache = cache
+        self.namespace = namespace  # Part of every cache key, e.g. the model name
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='chatbot')
+        self._inflight = {}         # cache key -> Future of the upstream call answering it
+        self._inflight_lock = threading.Lock()
+        self.coalesced = 0
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ChatbotBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _cached(self, key):
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _store(self, key, reply, started):
+        if self.cache is not None and reply:
+            self.cache.put(key, reply, time.monotonic() - started)
+
+    def _generate(self, key, prompt):
+        started = time.monotonic()
+        reply = self.backend.generate(prompt)
+        self._store(key, reply, started)
+        return reply
+
+    def _upstream(self, key, fn, *args):
+        """
+        Runs `fn(*args)` upstream unless a call for the same key is already in flight.
+        Returns (future, joined) where `joined` is True when an existing call was reused.
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, True
+            future = self._submit(fn, *args)
+            self._inflight[key] = future
+
+        def forget(done):
+            with self._inflight_lock:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+        future.add_done_callback(forget)
+        return future, False
+
+    def _key(self, message, context, institute_id):
+        # Retrieved data is part of the key, so cached answers expire when the facts behind them change;
+        # so is the institute, so one institute is never served an answer written for another
+        return cache_key(message, '\x00'.join((self.namespace, str(institute_id), *(context or ()))))
+
+    def reply(self, message, context=None, institute_id=None):
+        """
+        Returns the full reply; raises ChatbotBusy or TimeoutError. `context` is a list
+        of snippets retrieved for institute `institute_id`.
+        """
+        key = self._key(message, context, institute_id)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        try:
+            future, _ = self._upstream(key, self._generate, key, build_prompt(message, context))
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise TimeoutError('The assistant took too long to answer')
+
+    def stream(self, message, context=None, institute_id=None):
+        """Yields reply chunks as the backend produces them; raises ChatbotBusy up front."""
+        key = self._key(message, context, institute_id)
+        cached = self._cached(key)
+        if cached is not None:
+            return iter([cached])
+        chunks = queue.Queue()
+        done = object()
+
+        def produce(prompt):
+            started, parts = time.monotonic(), []
+            try:
+                for chunk in self.backend.stream(prompt):
+                    parts.append(chunk)
+                    chunks.put(chunk)
+                self._store(key, ''.join(parts), started)
+                return ''.join(parts)
+            except Exception as e:
+                chunks.put(e)
+                raise
+            finally:
+                chunks.put(done)
+
+        future, joined = self._upstream(key, produce, build_prompt(message, context))
+        if joined: # Someone is already asking this; wait for their whole answer
+            return self._wait(future)
+
+        def consume():
+            while True:
+                try:
+                    item = chunks.get(timeout=self.timeout) # Per chunk, so long replies may keep streaming
+                except queue.Empty:
+                    raise TimeoutError('The assistant took too long to answer')
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+        return consume()
+
+    def _wait(self, future):
+        try:
+            yield future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise TimeoutError('The assistant took too long to answer')
+
+    def stats(self):
+        stats = self.cache.stats() if self.cache is not None else {}
+        stats['coalesced'] = self.coalesced
+        return stats
+
+
+def sse_event(data, event=None):
+    """Formats one Server-Sent Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_chat_client(app):
+    """Returns the process-wide ChatClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = app.config
+                name = config.get('CHATBOT_BACKEND') or ('gemini' if config.get('GEMINI_API_KEY') else None)
+                if name not in BACKENDS:
+                    raise ChatbotUnavailable(f'Unknown or unconfigured chatbot backend: {name}')
+                _client = ChatClient(BACKENDS[name](config),
+                                     max_concurrency=config.get('CHATBOT_MAX_CONCURRENCY', 4),
+                                     timeout=config.get('CHATBOT_TIMEOUT', 30),
+                                     cache=build_response_cache(config, app.instance_path),
+                                     namespace=f"{name}:{config.get('CHATBOT_MODEL')}:{PERSONA}")
+    return _client
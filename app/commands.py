@@ -0,0 +1,361 @@
+# app/commands.py
+
+import time
+import click
+from flask.cli import AppGroup
+from . import app, db
+
+# --- DATABASE ---
+@app.cli.command('init-db')
+@click.option('--no-seed', 'seed', flag_value=False, default=True, help='Only create tables and indexes.')
+def init_db(seed):
+    """Create missing tables and indexes; seed demo data into an empty database."""
+    from .bootstrap import init_database
+    seeded = init_database(seed=seed)
+    click.echo('Database initialised' + (' with demo data (admin_main / supersecret).' if seeded else '.'))
+
+
+@app.cli.command('sync-replica')
+def sync_replica():
+    """Copy the primary SQLite database over the SQLite replica (DATABASE_REPLICA_URL)."""
+    import sqlite3
+    primary, replica = db.engines[None], db.engines.get('replica')
+    if replica is None or {primary.dialect.name, replica.dialect.name} != {'sqlite'}:
+        raise click.ClickException('Needs SQLite for both DATABASE_URL and DATABASE_REPLICA_URL; '
+                                   'a Postgres replica is kept current by streaming replication.')
+    started = time.perf_counter()
+    source, target = sqlite3.connect(primary.url.database), sqlite3.connect(replica.url.database)
+    try:
+        source.backup(target) # Consistent snapshot, even while the app is writing
+    finally:
+        source.close()
+        target.close()
+    click.echo(f'Replica {replica.url.database} updated in {time.perf_counter() - started:.1f}s.')
+
+
+# --- RECOMMENDATIONS ---
+recs_cli = AppGroup('recs', help='Build and inspect the recommendation index.')
+
+@recs_cli.command('build')
+def recs_build():
+    """Rebuild the recommendation index and publish it to all workers."""
+    from .ml_utils import rebuild_index
+    started = time.perf_counter()
+    index = rebuild_index(app, db.session)
+    click.echo(f'Built index v{index.version}: {len(index)} alumni in {len(index.partitions)} institutes in {time.perf_counter() - started:.2f}s')
+
+@recs_cli.command('status')
+def recs_status():
+    """Show the currently published index version."""
+    from .ml_utils import index_dir, published_version, load_index
+    directory = index_dir(app)
+    version = published_version(directory)
+    if version is None:
+        click.echo('No recommendation index has been published yet. Run `flask recs build`.')
+        return
+    index = load_index(directory, version)
+    click.echo(f'Index v{version}: {len(index)} alumni in {len(index.partitions)} institutes, built {time.ctime(index.built_at)}')
+
+@recs_cli.command('bench')
+@click.option('--sizes', default='10000,100000,1000000', show_default=True, help='Comma-separated alumni counts.')
+@click.option('--full-limit', default=10000, show_default=True, help='Largest N to run the full N x N baseline for (it needs 8*N^2 bytes).')
+@click.option('--seed', default=42, show_default=True)
+def recs_bench(sizes, full_limit, seed):
+    """Compare a cold recommendation: full similarity matrix vs single-row scoring."""
+    from .ml_utils import benchmark_cold_scoring
+    click.echo(f"{'alumni':>10} {'encode':>10} {'single':>10} {'single MB':>10} {'full':>10} {'full MB':>10}")
+    for n in (int(size) for size in sizes.split(',')):
+        r = benchmark_cold_scoring(n, run_full=n <= full_limit, seed=seed)
+        if r['full_s'] is None:
+            full, full_mb = 'skipped', f"~{8 * n * n / 2 ** 20:.0f}"
+        else:
+            full, full_mb = f"{r['full_s'] * 1000:.1f}ms", f"{r['full_peak_mb']:.1f}"
+        click.echo(f"{n:>10} {r['encode_s']:>9.2f}s {r['single_s'] * 1000:>8.1f}ms {r['single_peak_mb']:>10.1f} {full:>10} {full_mb:>10}")
+
+@recs_cli.command('graph')
+@click.option('--block-size', default=256, show_default=True, help='Rows scored per task; bounds peak memory per worker.')
+@click.option('--workers', default=None, type=int, help='Process pool size (defaults to the CPU count).')
+@click.option('--top-k', default=10, show_default=True, help='Neighbours stored per alumnus.')
+@click.option('--restart', is_flag=True, help='Ignore any interrupted run and start over.')
+def recs_graph(block_size, workers, top_k, restart):
+    """Compute the all-pairs alumni similarity graph into the alumni_similarity table."""
+    from .ml_utils import build_similarity_graph
+    started = time.perf_counter()
+
+    def progress(job):
+        click.echo(f'Job {job.id}: block {job.completed_blocks}/{job.total_blocks} ({time.perf_counter() - started:.1f}s)')
+
+    job = build_similarity_graph(db.session, block_size=block_size, workers=workers, k=top_k, restart=restart, progress=progress)
+    click.echo(f'Similarity graph job {job.id} finished in {time.perf_counter() - started:.1f}s')
+
+app.cli.add_command(recs_cli)
+
+# --- SEARCH ---
+search_cli = AppGroup('search', help='Manage the alumni full-text index.')
+
+@search_cli.command('rebuild')
+def search_rebuild():
+    """Create the full-text index if needed and re-index every alumnus."""
+    from .search import rebuild_search_index
+    rebuild_search_index()
+    click.echo(f'Full-text index rebuilt ({db.engine.dialect.name}).')
+
+app.cli.add_command(search_cli)
+
+# --- ROLLUPS ---
+rollups_cli = AppGroup('rollups', help='Maintain the institute dashboard rollups.')
+
+@rollups_cli.command('reconcile')
+@click.option('--institute', 'institute_id', default=None, type=int, help='Only this institute (default: all).')
+@click.option('--every', default=0, type=float, help='Repeat every this many seconds instead of exiting (0: run once).')
+def rollups_reconcile(institute_id, every):
+    """Recompute the rollups from the Alumni and Event tables and correct any that drifted."""
+    from .rollups import reconcile_rollups
+    while True:
+        started = time.perf_counter()
+        corrected = reconcile_rollups(institute_id)
+        click.echo(f'{corrected} rollup counters corrected in {time.perf_counter() - started:.2f}s.')
+        if not every:
+            break
+        db.session.remove()
+        time.sleep(every)
+
+app.cli.add_command(rollups_cli)
+
+
+# --- CHATBOT ---
+chatbot_cli = AppGroup('chatbot', help='Chatbot client tools.')
+
+@chatbot_cli.command('bench')
+@click.option('--backend', default='fake', show_default=True, help="Backend to exercise ('fake' needs no network).")
+@click.option('--concurrency', default=16, show_default=True, help='Simultaneous chat users.')
+@click.option('--requests', 'total', default=64, show_default=True, help='Messages sent in total.')
+@click.option('--stream', is_flag=True, help='Use streamed replies and report time to first chunk.')
+@click.option('--distinct', default=0, help='Cycle through this many questions with a memory cache (0: every message unique, no cache).')
+def chatbot_bench(backend, concurrency, total, stream, distinct):
+    """Fire concurrent chat messages and report latency percentiles and rejections."""
+    from concurrent.futures import ThreadPoolExecutor
+    from .chatbot import BACKENDS, ChatClient, ChatbotBusy
+    from .chat_cache import MemoryResponseCache
+    client = ChatClient(BACKENDS[backend](app.config),
+                        max_concurrency=app.config['CHATBOT_MAX_CONCURRENCY'], timeout=app.config['CHATBOT_TIMEOUT'],
+                        cache=MemoryResponseCache() if distinct else None)
+
+    def one(i):
+        if distinct:
+            i %= distinct
+        started = time.perf_counter()
+        try:
+            if stream:
+                chunks = client.stream(f'message {i}')
+                next(chunks, None)
+                first = time.perf_counter() - started
+                for _ in chunks:
+                    pass
+                return first
+            client.reply(f'message {i}')
+            return time.perf_counter() - started
+        except ChatbotBusy:
+            return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(r for r in results if r is not None)
+    label = 'first chunk' if stream else 'reply'
+    click.echo(f'{total} messages, {concurrency} concurrent, {len(latencies)} served, '
+               f'{total - len(latencies)} rejected as busy, {elapsed:.2f}s wall')
+    if latencies:
+        pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        click.echo(f'{label} latency: p50 {pct(0.50):.0f}ms  p95 {pct(0.95):.0f}ms  max {latencies[-1] * 1000:.0f}ms')
+    if distinct:
+        stats = client.stats()
+        _echo_cache_stats(stats)
+        click.echo(f"{stats['coalesced']} requests joined an identical call already in flight")
+
+def _echo_cache_stats(stats):
+    click.echo(f"Cache: {stats['size']} entries, {stats['hits']} hits / {stats['misses']} misses "
+               f"({stats['hit_rate']:.0%}), {stats['saved_seconds']:.1f}s of upstream latency saved")
+
+@chatbot_cli.command('cache')
+@click.option('--clear', is_flag=True, help='Drop every cached reply and reset the counters.')
+def chatbot_cache(clear):
+    """Show (or clear) the chatbot response cache configured by CHATBOT_CACHE."""
+    from .chat_cache import build_response_cache
+    cache = build_response_cache(app.config, app.instance_path)
+    if cache is None:
+        click.echo('The chatbot response cache is disabled (CHATBOT_CACHE=none).')
+        return
+    if clear:
+        cache.clear()
+    _echo_cache_stats(cache.stats())
+
+@chatbot_cli.command('context')
+@click.argument('question')
+@click.option('--institute', 'institute_id', default=None, type=int, help='Ask as this institute (default: DEFAULT_INSTITUTE_ID).')
+@click.option('--repeat', default=200, show_default=True, help='Searches to time after the index is built.')
+def chatbot_context(question, institute_id, repeat):
+    """Show the portal snippets the chatbot would be given for QUESTION, with timings."""
+    institute_id = institute_id or app.config['DEFAULT_INSTITUTE_ID']
+    from .retrieval import retrieval_index, retrieve_context
+    started = time.perf_counter()
+    retrieval_index.build(db.session)
+    click.echo(f'Indexed {len(retrieval_index)} documents in {time.perf_counter() - started:.2f}s')
+    snippets = retrieve_context(app, question, institute_id)
+    for snippet in snippets:
+        click.echo(f'- {snippet}')
+    for _ in range(repeat):
+        retrieve_context(app, question, institute_id)
+    t = retrieval_index.timings()
+    click.echo(f"Search latency over {t['count']} runs: p50 {t['p50_ms']:.2f}ms  p95 {t['p95_ms']:.2f}ms  max {t['max_ms']:.2f}ms")
+
+app.cli.add_command(chatbot_cli)
+
+
+
+# --- ALUMNI ---
+alumni_cli = AppGroup('alumni', help='Alumni data tools.')
+
+@alumni_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--institute', 'institute_id', type=int, required=True, help='Institute the alumni belong to.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None, help='Defaults to the file extension.')
+@click.option('--errors', 'errors_path', default=None, help='Where to write rejected rows (default: PATH.errors.csv).')
+@click.option('--chunk-size', default=None, type=int, help='Rows per transaction (default: BULK_IMPORT_CHUNK_SIZE).')
+@click.option('--workers', default=None, type=int, help='Password hashing processes (default: CPU count).')
+def alumni_import(path, institute_id, fmt, errors_path, chunk_size, workers):
+    """Bulk-import alumni and their logins from a CSV or NDJSON file."""
+    import csv
+    from .bulk_import import AlumniImporter, RowError, iter_records, detect_format
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+    errors_path = errors_path or f'{path}.errors.csv'
+    with open(path, 'rb') as source, open(errors_path, 'w', newline='', encoding='utf-8') as errors_file:
+        errors = csv.writer(errors_file)
+        errors.writerow(RowError._fields)
+        importer = AlumniImporter(institute_id, chunk_size=chunk_size or app.config['BULK_IMPORT_CHUNK_SIZE'],
+                                  workers=workers or app.config['BULK_IMPORT_WORKERS'], on_error=errors.writerow)
+        report = None
+        with importer:
+            for report in importer.iter_run(iter_records(source, fmt)):
+                click.echo(f'{report.read} read, {report.imported} imported, {report.rejected} rejected '
+                           f'({report.read / report.seconds:.0f} rows/s)')
+    if report is None:
+        click.echo('The file has no records.')
+        return
+    click.echo(f'Done in {report.seconds:.1f}s: {report.imported} imported, {report.rejected} rejected '
+               f'({report.imported / report.seconds:.0f} imported rows/s).')
+    if report.rejected:
+        click.echo(f'Rejected rows written to {errors_path}')
+
+@alumni_cli.command('invites')
+@click.option('--institute', 'institute_id', type=int, default=None, help='Accounts of this institute that have no password yet.')
+@click.option('--username', default=None, help='Only this account, whatever its password (a reset link).')
+@click.option('--base-url', default='http://localhost:5000', show_default=True, help='Where the portal is served.')
+def alumni_invites(institute_id, username, base_url):
+    """Print invite links (username, email, link as CSV) for accounts to choose a password with."""
+    import csv
+    import sys
+    from .models import User
+    from .passwords import INVITE_PENDING, invite_url
+    if (institute_id is None) == (username is None):
+        raise click.UsageError('Pass either --institute or --username.')
+    users = (User.query.filter_by(username=username) if username else
+             User.query.filter_by(institute_id=institute_id, password_hash=INVITE_PENDING)).order_by(User.id)
+    writer = csv.writer(sys.stdout)
+    with app.test_request_context(base_url=base_url):
+        for user in users.yield_per(500):
+            writer.writerow((user.username, user.email, invite_url(user)))
+
+@alumni_cli.command('export')
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('--institute', 'institute_id', type=int, required=True, help='Institute to export.')
+@click.option('--kind', type=click.Choice(['alumni', 'events']), default='alumni', show_default=True)
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output (name it .gz).')
+def alumni_export(output, institute_id, kind, fmt, compress):
+    """Stream an institute's alumni or events to OUTPUT as CSV or NDJSON."""
+    import resource
+    from .export import export_rows
+    started, size = time.perf_counter(), 0
+    with open(output, 'wb') as f:
+        for chunk in export_rows(kind, fmt, institute_id, compress):
+            f.write(chunk)
+            size += len(chunk)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    click.echo(f'Wrote {size / 2 ** 20:.1f} MB to {output} in {time.perf_counter() - started:.1f}s (peak RSS {peak_mb:.0f} MB).')
+
+app.cli.add_command(alumni_cli)
+
+# --- BENCHMARKS ---
+bench_cli = AppGroup('bench', help='Synthetic data and per-route load benchmarks.')
+
+@bench_cli.command('seed')
+@click.option('--seed', default=1, show_default=True, help='Random seed; the same seed and volumes give the same data.')
+@click.option('--institutes', default=10, show_default=True)
+@click.option('--alumni', default=10000, show_default=True, help='Alumni (each with a user account) across all institutes.')
+@click.option('--events', default=50, show_default=True, help='Events per institute.')
+@click.option('--password', default='Password123', show_default=True, help='Password of every generated user.')
+def bench_seed(seed, institutes, alumni, events, password):
+    """Fill the database with a reproducible synthetic population."""
+    from .synthetic import generate_dataset
+    progress = lambda written: click.echo(f'  {written}/{alumni} alumni', err=True)
+    try:
+        counts = generate_dataset(seed, institutes, alumni, events, password, progress=progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Wrote {counts['institutes']} institutes, {counts['alumni']} alumni and {counts['events']} events "
+               f"in {counts['seconds']:.1f}s. Log in as synth{seed}-u1 or synth{seed}-admin1.")
+    click.echo('Run `flask recs build` to index the new alumni for recommendations.')
+
+@bench_cli.command('routes')
+@click.option('--route', 'routes', multiple=True, help='Scenario to run (repeatable; default: all).')
+@click.option('--requests', default=100, show_default=True, help='Timed requests per route.')
+@click.option('--concurrency', default=4, show_default=True, help='Simultaneous sessions per route.')
+@click.option('--warmup', default=5, show_default=True, help='Untimed requests per route first.')
+@click.option('--seed', default=1, show_default=True, help='Seed of the `bench seed` data to log in with.')
+@click.option('--password', default='Password123', show_default=True)
+@click.option('--target', type=click.Choice(['client', 'gunicorn']), default='client', show_default=True,
+              help='Flask test client in this process, or a gunicorn started for the run.')
+@click.option('--workers', default=None, type=int, help='gunicorn workers (default: gunicorn.conf.py).')
+@click.option('--output', default='-', show_default=True, help='Where to write the JSON report.')
+def bench_routes(routes, requests, concurrency, warmup, seed, password, target, workers, output):
+    """Time every route and write latency, throughput, query and memory figures as JSON."""
+    import json
+    from .benchmark import SCENARIO_NAMES, run_benchmark
+    unknown = set(routes) - set(SCENARIO_NAMES)
+    if unknown:
+        raise click.BadParameter(f"unknown route(s) {', '.join(sorted(unknown))}; choose from {', '.join(SCENARIO_NAMES)}")
+
+    def progress(name, result):
+        click.echo(f"  {name:<24} p50 {result['p50_ms']:8.1f}ms  p95 {result['p95_ms']:8.1f}ms  "
+                   f"{result['throughput_rps']:7.1f} req/s  {result['queries_mean'] or 0:5.1f} queries  "
+                   f"{result['errors']} errors" + (f"  ({result['throughput_per_core_rps']:.1f} logins/s per core)"
+                                                   if name == 'login' else ''), err=True)
+
+    report = run_benchmark(app, routes or SCENARIO_NAMES, requests, concurrency, warmup, seed, password,
+                           target, workers, progress=progress)
+    with click.open_file(output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+        fh.write('\n')
+
+@bench_cli.command('compare')
+@click.argument('old', type=click.File())
+@click.argument('new', type=click.File())
+@click.option('--metric', default='p95_ms', show_default=True, help='Route field to compare.')
+@click.option('--threshold', default=10.0, show_default=True, help='Percent increase reported as a regression.')
+def bench_compare(old, new, metric, threshold):
+    """Compare two `bench routes` reports; exits with status 1 on a regression."""
+    import json
+    from .benchmark import compare_reports
+    regressions = 0
+    for name, before, after, change in compare_reports(json.load(old), json.load(new), metric):
+        flag = (-change if metric == 'throughput_rps' else change) > threshold # Throughput regresses downwards
+        regressions += flag
+        click.echo(f"{name:<24} {before:10.2f} -> {after:10.2f}  {change:+7.1f}%{'  REGRESSION' if flag else ''}")
+    if regressions:
+        raise SystemExit(1)
+
+app.cli.add_command(bench_cli)
@@ -0,0 +1,54 @@
+# app/db_routing.py
+
+import time
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+# --- Read replica routing ---
+# With DATABASE_REPLICA_URL set, the 'replica' bind serves the reads of GET and HEAD
+# requests. Everything else stays on the primary: other methods, CLI commands and
+# background jobs, every flush and INSERT/UPDATE/DELETE statement, and any read made
+# after a flush in the same request. Once a request has written, the client is
+# pinned to the primary for REPLICA_PIN_SECONDS (through its session cookie), so the
+# page it is redirected to shows its own write even while the replica lags behind.
+
+PIN_KEY = '_db_primary_until'
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) and reads_from_replica():
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reads_from_replica():
+    return has_request_context() and g.get('db_replica', False) and not g.get('db_wrote', False)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def init_routing(app):
+    """Registers the request hooks; a no-op unless a replica bind is configured."""
+    if 'replica' not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    pin_seconds = app.config.get('REPLICA_PIN_SECONDS', 5)
+
+    @app.before_request
+    def choose_database():
+        g.db_replica = request.method in ('GET', 'HEAD') and session.get(PIN_KEY, 0) < time.time()
+
+    @app.after_request
+    def pin_to_primary(response):
+        if g.get('db_wrote'):
+            session[PIN_KEY] = time.time() + pin_seconds
+        return response
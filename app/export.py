@@ -0,0 +1,77 @@
+# app/export.py
+
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+from app import db
+from app.models import Alumni, Event, User
+
+# --- Streaming exports ---
+# Rows are read with a server-side cursor (stream_results on Postgres; SQLite
+# cursors stream by nature) in partitions of BATCH_SIZE plain tuples, formatted and
+# optionally gzipped one partition at a time, so memory stays flat however many
+# rows an institute has.
+
+BATCH_SIZE = 2000
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _alumni_query(institute_id):
+    return (select(Alumni.id, Alumni.name, User.email, Alumni.graduation_year, Alumni.major, Alumni.city,
+                   Alumni.phone_number, Alumni.linkedin_id, Alumni.profile_complete)
+            .outerjoin(User, User.alumni_id == Alumni.id)
+            .where(Alumni.institute_id == institute_id)
+            .order_by(Alumni.id))
+
+
+def _events_query(institute_id):
+    return (select(Event.id, Event.title, Event.description, Event.date_time, Event.location)
+            .where(Event.institute_id == institute_id)
+            .order_by(Event.date_time, Event.id))
+
+
+EXPORTS = {'alumni': _alumni_query, 'events': _events_query}
+
+
+def _csv_chunks(result):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(result.keys())
+    for partition in result.partitions():
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(result):
+    keys = list(result.keys())
+    for partition in result.partitions():
+        yield ''.join(json.dumps(dict(zip(keys, row)), default=str) + '\n' for row in partition)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_rows(kind, fmt, institute_id, compress=False):
+    """
+    Yields the export of one institute's `kind` ('alumni' or 'events') as encoded
+    `fmt` ('csv' or 'ndjson') bytes, gzipped when `compress` is set.
+    """
+    stmt = EXPORTS[kind](institute_id).execution_options(stream_results=True, yield_per=BATCH_SIZE)
+    result = db.session.execute(stmt)
+    try:
+        chunks = (text.encode('utf-8') for text in (_csv_chunks if fmt == 'csv' else _ndjson_chunks)(result))
+        yield from _gzip(chunks) if compress else chunks
+    finally:
+        result.close()
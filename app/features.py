@@ -0,0 +1,123 @@
+# app/features.py
+
+import zlib
+import numpy as np
+from scipy import sparse
+
+# --- Structured feature encoding ---
+# Every field becomes its own sparse block, scaled so that the dot product of two
+# encoded rows is the weighted average of the per-field similarities:
+#   sim(a, b) = sum(w_f * sim_f(a, b)) / sum(w_f)
+# Encoders are stateless (no fitted vocabulary), so one alumnus can be encoded on
+# its own and still line up with a matrix built earlier or in another process.
+
+
+def _normalise(value):
+    """Canonical form of a categorical value ("  New  York " -> "new york"), or None."""
+    if value is None:
+        return None
+    value = ' '.join(str(value).split()).lower()
+    return value or None
+
+
+class CategoricalField(object):
+    """
+    One-hot encoding of a whole value, hashed into `n_features` columns.
+    Multi-word values stay a single category, so "New York" only matches "New York".
+    """
+
+    def __init__(self, name, weight=1.0, n_features=2 ** 18):
+        self.name = name
+        self.weight = weight
+        self.n_features = n_features
+
+    def encode(self, values):
+        values = np.array(values, dtype=object)
+        n = len(values)
+        values[np.equal(values, None)] = ''
+        # Normalise and hash each distinct raw value once (crc32 is stable across processes, unlike hash())
+        uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+        normalised = [_normalise(u) for u in uniques]
+        buckets = np.fromiter((zlib.crc32(u.encode('utf-8')) % self.n_features if u else 0 for u in normalised),
+                              dtype=np.int64, count=len(uniques))
+        present = np.array([u is not None for u in normalised], dtype=bool)[inverse.ravel()]
+        inverse = inverse.ravel()
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(present, out=indptr[1:])
+        cols = buckets[inverse][present]
+        return sparse.csr_matrix((np.ones(len(cols), dtype=np.float32), cols, indptr), shape=(n, self.n_features))
+
+
+class NumericProximityField(object):
+    """
+    Encodes a number as Gaussian weights over integer anchors in [low, high], so that
+    the similarity of two values falls off smoothly with their distance:
+    sim(a, b) = exp(-(a - b)^2 / (4 * sigma^2)), e.g. 1 year apart ~0.94, 5 years ~0.21 for sigma=2.
+    """
+
+    def __init__(self, name, weight=1.0, low=1900, high=2100, sigma=2.0):
+        self.name = name
+        self.weight = weight
+        self.low, self.high = low, high
+        self.sigma = sigma
+        self.n_features = high - low + 1
+        self._radius = int(np.ceil(3 * sigma))  # Weights beyond 3 sigma are dropped
+
+    def encode(self, values):
+        raw = np.asarray(values)
+        if raw.dtype.kind not in 'iuf':
+            raw = np.array(values, dtype=object)
+            raw[np.equal(raw, None)] = np.nan
+        raw = raw.astype(np.float64)
+        present = ~np.isnan(raw)
+        values = np.clip(raw[present], self.low, self.high)
+
+        offsets = np.arange(-self._radius, self._radius + 1)
+        anchors = np.rint(values)[:, None] + offsets[None, :]
+        weights = np.exp(-((anchors - values[:, None]) ** 2) / (2 * self.sigma ** 2))
+        weights[(anchors < self.low) | (anchors > self.high)] = 0
+        weights /= np.linalg.norm(weights, axis=1, keepdims=True)
+
+        n, width = len(raw), len(offsets)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(present * width, out=indptr[1:])
+        cols = np.clip(anchors - self.low, 0, self.n_features - 1).astype(np.int64)
+        return sparse.csr_matrix((weights.astype(np.float32).ravel(), cols.ravel(), indptr),
+                                 shape=(n, self.n_features))
+
+
+class FeatureEncoder(object):
+    """Encodes records field by field and stacks the weighted blocks into one CSR matrix."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        total = float(sum(f.weight for f in fields))
+        self._scales = [np.float32(np.sqrt(f.weight / total)) for f in fields]
+
+    @property
+    def field_names(self):
+        return tuple(f.name for f in self.fields)
+
+    def transform_columns(self, columns):
+        """`columns` maps each field name to a sequence of values (one per record)."""
+        blocks = [field.encode(columns[field.name]) * scale for field, scale in zip(self.fields, self._scales)]
+        return sparse.hstack(blocks, format='csr')
+
+    def transform(self, records):
+        """Encodes objects or rows exposing the field names as attributes."""
+        columns = {name: [getattr(r, name) for r in records] for name in self.field_names}
+        return self.transform_columns(columns)
+
+    def transform_one(self, values):
+        """Encodes a single record given as a tuple in `field_names` order."""
+        return self.transform_columns({name: [value] for name, value in zip(self.field_names, values)})
+
+
+def alumni_encoder():
+    """The encoding used for alumni similarity: major and city one-hot, graduation year by proximity."""
+    return FeatureEncoder([
+        CategoricalField('major', weight=0.5),
+        CategoricalField('city', weight=0.3),
+        NumericProximityField('graduation_year', weight=0.2),
+    ])
@@ -2,11 +2,25 @@
 
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, IntegerField, TextAreaField, DateTimeLocalField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length, Optional
+from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional
 from flask_wtf.file import FileField, FileAllowed
-from app.models import User, Institute
+from app.availability import find_taken
 
-class IndividualRegistrationForm(FlaskForm):
+class UniqueFieldsMixin(object):
+    """After the field validators pass, checks every field in `unique_fields` ({field: (kind, message)}) with one query."""
+    unique_fields = {}
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        fields = {name: getattr(self, name) for name in self.unique_fields}
+        values = {self.unique_fields[name][0]: field.data for name, field in fields.items() if field.data and not field.errors}
+        taken = find_taken(**values) if values else set()
+        for name, (kind, message) in self.unique_fields.items():
+            if kind in taken and not fields[name].errors:
+                fields[name].errors.append(message)
+                valid = False
+        return valid
+
+class IndividualRegistrationForm(UniqueFieldsMixin, FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=25)])
     email = StringField('Email', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
@@ -14,29 +28,30 @@ class IndividualRegistrationForm(FlaskForm):
     name = StringField('Full Name', validators=[DataRequired()])
     graduation_year = IntegerField('Graduation Year', validators=[DataRequired()])
     submit = SubmitField('Register')
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user is not None: raise ValidationError('That username is taken.')
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is not None: raise ValidationError('That email is already registered.')
+    unique_fields = {'username': ('username', 'That username is taken.'),
+                     'email': ('email', 'That email is already registered.')}
 
-class InstituteRegistrationForm(FlaskForm):
+class InstituteRegistrationForm(UniqueFieldsMixin, FlaskForm):
     institute_name = StringField('Institute Name', validators=[DataRequired()])
     admin_username = StringField('Admin Username', validators=[DataRequired(), Length(min=4, max=25)])
     admin_email = StringField('Admin Email', validators=[DataRequired(), Email()])
     admin_password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
     admin_password2 = PasswordField('Repeat Password', validators=[DataRequired(), EqualTo('admin_password')])
     submit = SubmitField('Register Institute')
-    def validate_institute_name(self, institute_name):
-        institute = Institute.query.filter_by(name=institute_name.data).first()
-        if institute is not None: raise ValidationError('That institute is already registered.')
+    unique_fields = {'institute_name': ('institute_name', 'That institute is already registered.'),
+                     'admin_username': ('username', 'That username is taken.'),
+                     'admin_email': ('email', 'That email is already registered.')}
 
 class LoginForm(FlaskForm):
     username_or_email = StringField('Username or Email', validators=[DataRequired()])
     password = PasswordField('Password', validators=[DataRequired()])
     submit = SubmitField('Log In')
 
+class SetPasswordForm(FlaskForm):
+    password = PasswordField('New Password', validators=[DataRequired(), Length(min=6)])
+    password2 = PasswordField('Repeat Password', validators=[DataRequired(), EqualTo('password')])
+    submit = SubmitField('Set Password')
+
 class ProfileCompletionForm(FlaskForm):
     major = StringField('Major/Discipline', validators=[DataRequired()])
     city = StringField('Current City', validators=[DataRequired()])
@@ -45,7 +60,7 @@ class ProfileCompletionForm(FlaskForm):
     photo = FileField('Profile Picture (.jpg or .png)', validators=[FileAllowed(['jpg', 'png'], 'Images only!'), DataRequired()])
     submit = SubmitField('Complete Profile')
 
-class AdminStudentRegistrationForm(FlaskForm):
+class AdminStudentRegistrationForm(UniqueFieldsMixin, FlaskForm):
     name = StringField('Full Name', validators=[DataRequired()])
     graduation_year = IntegerField('Graduation Year', validators=[DataRequired()])
     major = StringField('Major/Discipline', validators=[DataRequired()])
@@ -55,9 +70,12 @@ class AdminStudentRegistrationForm(FlaskForm):
     email = StringField('Email (Mandatory)', validators=[DataRequired(), Email()])
     username = StringField('Username (Optional)', validators=[Optional(), Length(max=25)])
     submit = SubmitField('Register Student/Alumnus')
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is not None: raise ValidationError('That email is already registered.')
+    unique_fields = {'email': ('email', 'That email is already registered.'),
+                     'username': ('username', 'That username is taken.')}
+
+class BulkImportForm(FlaskForm):
+    file = FileField('CSV or NDJSON file', validators=[FileAllowed(['csv', 'ndjson', 'jsonl'], 'CSV or NDJSON only!'), DataRequired()])
+    submit = SubmitField('Import')
 
 class EventForm(FlaskForm):
     title = StringField('Event Title', validators=[DataRequired(), Length(max=100)])
@@ -0,0 +1,107 @@
+# app/identity.py
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.orm import joinedload
+from app import app, db
+from app.models import User, Role, Alumni
+
+# --- Identity cache for the login user loader ---
+# The user, their role and their alumni profile are fetched with one joined query
+# in a short-lived session and kept detached in a per-worker TTL/LRU cache. Each
+# request merges the cached copy into its own session without touching the
+# database, so current_user.role and current_user.alumni_profile cost no queries.
+# Entries are evicted as soon as this worker writes the user, their profile or a
+# role; writes made by other workers become visible within IDENTITY_CACHE_TTL.
+
+
+class IdentityCache(object):
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # user_id -> (expires_at, detached User)
+        self._by_alumni = {}            # alumni_id -> user_id, to evict on profile writes
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user):
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            if user.alumni_id is not None:
+                self._by_alumni[user.alumni_id] = user.id
+            while len(self._entries) > self.max_size:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._by_alumni.pop(evicted.alumni_id, None)
+
+    def invalidate(self, user_id=None, alumni_id=None):
+        with self._lock:
+            if alumni_id is not None:
+                user_id = self._by_alumni.pop(alumni_id, user_id)
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._by_alumni.pop(entry[1].alumni_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_alumni.clear()
+
+
+identity_cache = IdentityCache(max_size=app.config.get('IDENTITY_CACHE_SIZE', 1024),
+                               ttl=app.config.get('IDENTITY_CACHE_TTL', 60))
+
+
+def _fetch_identity(user_id):
+    """Loads a user with role and alumni profile in one query, detached from any session."""
+    session = db.session.session_factory()
+    try:
+        stmt = select(User).options(joinedload(User.role), joinedload(User.alumni_profile)).where(User.id == user_id)
+        return session.execute(stmt).scalars().first()
+    finally:
+        session.close() # Detaches the instances but keeps their loaded attributes
+
+
+def load_identity(user_id):
+    """Flask-Login user loader: returns the user attached to the request's session."""
+    user = identity_cache.get(user_id)
+    if user is None:
+        user = _fetch_identity(user_id)
+        if user is None:
+            return None
+        identity_cache.put(user)
+    # merge(load=False) copies the cached state into this session without a SELECT
+    return db.session.merge(user, load=False)
+
+
+# --- Invalidation ---
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    identity_cache.invalidate(user_id=target.id)
+
+
+@event.listens_for(Alumni, 'after_update')
+@event.listens_for(Alumni, 'after_delete')
+def _profile_changed(mapper, connection, target):
+    identity_cache.invalidate(alumni_id=target.id)
+
+
+@event.listens_for(Role, 'after_update')
+@event.listens_for(Role, 'after_delete')
+def _role_changed(mapper, connection, target):
+    identity_cache.clear() # Roles change rarely; drop everyone rather than track members
@@ -0,0 +1,151 @@
+# app/images.py
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, url_for
+from app import app
+
+# --- Profile photo pipeline ---
+# An upload is checked (header only), written to instance/photos/originals under
+# the hash of its bytes and handed to a thread pool; the request returns at once.
+# The pool decodes it (JPEG draft mode decodes straight at a reduced scale), then
+# writes every size in PHOTO_SIZES as WebP and JPEG, named "<hash>-<size>.<ext>".
+# A name therefore only ever has one content, so the /photos route serves it with
+# immutable far-future cache headers, and a new photo gets new URLs.
+
+FORMATS = (('webp', 'WEBP', {'quality': 80, 'method': 4}),
+           ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}))
+ACCEPTED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+MAX_PIXELS = 40_000_000  # Refuse decompression bombs before decoding
+PIPELINE_VERSION = 1     # Part of every hash; bump when the outputs change
+
+log = logging.getLogger(__name__)
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def photo_dir(app):
+    return os.path.join(app.instance_path, 'photos')
+
+
+def output_name(digest, size, ext):
+    return f'{digest}-{size}.{ext}'
+
+
+def _write_atomic(path, save):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        save(f)
+    os.replace(tmp, path)
+
+
+def process_photo(source, directory, digest, sizes):
+    """Decodes `source` once and writes every size/format; safe to run in a worker thread."""
+    from PIL import Image, ImageOps # Imported on first upload, not by every worker at startup
+    with Image.open(source) as image:
+        # Draft mode lets the JPEG decoder skip detail the largest output does not need
+        largest = max(sizes)
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, 'white') # JPEG has no alpha; flatten onto white
+            background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        image = image.convert('RGB')
+        for size in sorted(sizes, reverse=True): # Each size is resampled from the previous, larger one
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS) if image.size != (size, size) else image
+            for ext, fmt, options in FORMATS:
+                _write_atomic(os.path.join(directory, output_name(digest, size, ext)),
+                              lambda f: image.save(f, fmt, **options))
+
+
+class PhotoPipeline(object):
+
+    def __init__(self):
+        self._executor = None
+        self._pending = {}   # digest -> Future, while this process is still generating it
+        self._lock = threading.Lock()
+
+    def _pool(self, workers):
+        # Created on first use (under the lock), so each forked worker process gets its own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='photos')
+        return self._executor
+
+    def submit(self, app, upload):
+        """Validates and stores an upload, queues the resizing and returns the photo's hash."""
+        from PIL import Image
+        data = upload.read()
+        try:
+            with Image.open(io.BytesIO(data)) as probe: # Reads the header only
+                if probe.format not in ACCEPTED_FORMATS:
+                    raise InvalidImage(f'Unsupported image format: {probe.format}')
+                if probe.width * probe.height > MAX_PIXELS:
+                    raise InvalidImage('Image is too large')
+        except (OSError, Image.DecompressionBombError) as e:
+            raise InvalidImage(str(e))
+
+        sizes = tuple(app.config['PHOTO_SIZES'])
+        digest = hashlib.sha256(data + f'{PIPELINE_VERSION}:{sizes}'.encode()).hexdigest()[:20]
+        directory = photo_dir(app)
+        originals = os.path.join(directory, 'originals')
+        os.makedirs(originals, exist_ok=True)
+        original = os.path.join(originals, digest)
+        if not os.path.exists(original):
+            _write_atomic(original, lambda f: f.write(data))
+        if os.path.exists(os.path.join(directory, output_name(digest, min(sizes), FORMATS[-1][0]))):
+            return digest # Same picture uploaded before
+
+        with self._lock:
+            if digest not in self._pending:
+                future = self._pool(app.config['PHOTO_WORKERS']).submit(process_photo, original, directory, digest, sizes)
+                self._pending[digest] = future
+                future.add_done_callback(lambda done: self._finished(digest, done))
+        return digest
+
+    def _finished(self, digest, future):
+        with self._lock:
+            self._pending.pop(digest, None)
+        if future.exception() is not None:
+            log.error('Processing photo %s failed', digest, exc_info=future.exception())
+
+    def wait(self, digest, timeout):
+        """Waits up to `timeout` seconds for a photo this process is still generating."""
+        with self._lock:
+            future = self._pending.get(digest)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+
+photo_pipeline = PhotoPipeline()
+
+
+def is_pipeline_photo(photo_file):
+    """Pipeline photos are stored as a bare hash; older rows hold a filename under static/images."""
+    return bool(photo_file) and '.' not in photo_file
+
+
+def photo_url(photo_file, size, ext='jpg'):
+    if not is_pipeline_photo(photo_file):
+        return url_for('static', filename='images/' + (photo_file or 'default_user.png'))
+    return url_for('photo', filename=output_name(photo_file, size, ext))
+
+
+def photo_srcset(photo_file, ext='jpg'):
+    """srcset listing every generated size, for <img>/<source> elements."""
+    if not is_pipeline_photo(photo_file):
+        return photo_url(photo_file, 0)
+    return ', '.join(f'{photo_url(photo_file, size, ext)} {size}w' for size in current_app.config['PHOTO_SIZES'])
+
+
+app.jinja_env.globals.update(photo_url=photo_url, photo_srcset=photo_srcset, is_pipeline_photo=is_pipeline_photo)
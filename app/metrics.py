@@ -0,0 +1,180 @@
+# app/metrics.py
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# --- Request metrics ---
+# Every process keeps its own counters and histograms in memory (a dict update
+# under a lock per request). With METRICS_DIR set (gunicorn.conf.py sets it), each
+# process also writes a snapshot to "<METRICS_DIR>/<pid>.json" at most every
+# METRICS_FLUSH_INTERVAL seconds, and /metrics sums the snapshots of every worker,
+# including workers that have since exited, so the totals never go backwards.
+# Snapshots are written by a background thread, started by the first request a
+# process records. The directory is emptied when gunicorn starts.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (type, help)
+SERIES = {
+    'portal_request_duration_seconds': ('histogram', 'Time from the start of a request until its response body was sent.'),
+    'portal_request_queries': ('histogram', 'SQL statements executed per request.'),
+    'portal_request_db_seconds_total': ('counter', 'Time spent executing SQL statements, per endpoint.'),
+    'portal_request_template_seconds_total': ('counter', 'Time spent rendering templates (including queries made while rendering).'),
+    'portal_slow_queries_total': ('counter', 'SQL statements slower than SLOW_QUERY_MS, per endpoint.'),
+}
+
+slow_query_log = logging.getLogger('app.slow_queries')
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._counters = {}     # (name, labels) -> value
+        self.directory = None
+        self.flush_interval = 5.0
+        self._dirty = False
+        self._flusher = None
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(buckets) + 2)
+            histogram[bisect_left(buckets, value)] += 1 # Non-cumulative here; summed up in render()
+            histogram[-1] += value
+            self._dirty = True
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+
+    def record_request(self, endpoint, method, status, duration, queries, db_time, template_time):
+        self.observe('portal_request_duration_seconds', (('endpoint', endpoint), ('method', method), ('status', str(status))),
+                     duration, LATENCY_BUCKETS)
+        self.observe('portal_request_queries', (('endpoint', endpoint),), queries, QUERY_BUCKETS)
+        if db_time:
+            self.inc('portal_request_db_seconds_total', (('endpoint', endpoint),), db_time)
+        if template_time:
+            self.inc('portal_request_template_seconds_total', (('endpoint', endpoint),), template_time)
+        if self.directory and self._flusher is None:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is None: # Started lazily, so each forked worker gets its own thread
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._dirty = False
+            return {'histograms': [[name, list(labels), list(values)] for (name, labels), values in self._histograms.items()],
+                    'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()]}
+
+    def flush(self):
+        """Writes this process's snapshot to METRICS_DIR."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp = f'{path}.{threading.get_ident()}.tmp' # The flusher and a /metrics request may write at once
+        with open(tmp, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+
+    def collect(self):
+        """The snapshots of every process (this one's current), summed."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                pass # Being replaced right now; its numbers are in the next scrape
+        return snapshots
+
+
+def _merge(snapshots):
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+
+def render(snapshots):
+    """Prometheus text exposition format (version 0.0.4) of the summed snapshots."""
+    histograms, counters = _merge(snapshots)
+    lines = []
+    for name, (kind, help_text) in SERIES.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if kind == 'histogram':
+            buckets = LATENCY_BUCKETS if name.endswith('_seconds') else QUERY_BUCKETS
+            for (series, labels), values in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {values[-1]}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        else:
+            lines += [f'{name}{_labels(labels)} {value}' for (series, labels), value in sorted(counters.items()) if series == name]
+    return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def configure(app):
+    """Applies METRICS_* and SLOW_QUERY_LOG settings; called once from app/__init__.py."""
+    metrics.directory = app.config.get('METRICS_DIR') or None
+    metrics.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+    if metrics.directory:
+        atexit.register(metrics.flush)
+    if app.config.get('SLOW_QUERY_LOG'):
+        handler = logging.FileHandler(app.config['SLOW_QUERY_LOG'])
+        handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+        slow_query_log.addHandler(handler)
+    slow_query_log.setLevel(logging.WARNING)
+
+
+def log_slow_query(endpoint, duration, statement):
+    metrics.inc('portal_slow_queries_total', (('endpoint', endpoint),))
+    slow_query_log.warning('Slow query (%.1f ms) in %s: %s', duration * 1000, endpoint, ' '.join(statement.split())[:2000])
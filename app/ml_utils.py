@@ -1,120 +1,798 @@
 # app/ml_utils.py
 
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
-# CRITICAL FIX: Import the model here (assuming models.py is imported in __init__.py)
-# For reliability, we access the model directly. 
-# NOTE: This file must be executed within Flask's app context where db is defined.
-
-# We cannot directly import app.models.Alumni here due to circular import risk,
-# so we rely on the object being available via db_session, and ensure the class 
-# definition is imported safely elsewhere. Since Flask-SQLAlchemy registers models,
-# we need to ensure the class object is imported correctly from models.py
-
-# --- FIX: We will modify the function to accept the Alumni model as an argument ---
-# However, the most practical solution that works with the structure is to 
-# pull the model inside the function via the db session's access. 
-# A cleaner way is to assume it's imported in the route that calls this utility.
-
-# For standard structure, let's redefine the import assuming models is loaded
-# in the main app.__init__
-# Let's assume the Alumni model is accessible via the app's loaded models:
-
-# --- Temporarily modify the function signature to bypass the error cleanly ---
-# However, let's proceed with the standard import path, which works if done correctly:
-
-# Assuming a direct import path for the model object (standard setup):
-from app.models import Alumni 
-
-def get_recommendations(current_alumnus_id, db_session):
-    """Generates recommendations for a given alumnus based on common features."""
-    
-    # 1. Fetch data required for analysis (excluding the current user)
-    alumni_data = db_session.query(Alumni.id, Alumni.major, Alumni.city, Alumni.graduation_year).filter(Alumni.id != current_alumnus_id).all()
-    
-    # If not enough data exists, return empty list
-    if not alumni_data:
-        return []
+import os
+import fcntl
+import pickle
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 
-    # Fetch the current user's profile for comparison (Needed to append to df)
-    current_alumnus_data = db_session.query(Alumni.id, Alumni.major, Alumni.city, Alumni.graduation_year).filter(Alumni.id == current_alumnus_id).first()
-    
-    # Convert query results to a DataFrame
-    df_list = [a._asdict() for a in alumni_data]
-    df_list.insert(0, current_alumnus_data._asdict()) # Insert current user at index 0 for easy indexing
-
-    df = pd.DataFrame(df_list)
-    
-    # 2. Create a "content string" from relevant features
-    df['content'] = df['major'].fillna('') + ' ' + df['city'].fillna('') + ' ' + df['graduation_year'].astype(str)
-    
-    # 3. Create Vectorizer (Converts text features into numerical vectors)
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(df['content'])
-    
-    # 4. Compute Similarity (Cosine Similarity)
-    cosine_sim = linear_kernel(tfidf_matrix, tfidf_matrix)
-    
-    # 5. Get Scores for the current user (index 0)
-    # We use index [0] because we inserted the current user at the start
-    sim_scores = list(enumerate(cosine_sim[0])) 
-    
-    # Sort the scores (highest similarity first)
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    
-    # Select the top 5 (excluding the user themselves at index 0)
-    sim_scores = sim_scores[1:6] 
-    
-    # Get the Alumni IDs corresponding to the top recommendations
 # CRITICAL: We import the Alumni model here for database access
-from app.models import Alumni 
+from app import db
+from app.models import Alumni
+
+# --- Recommendation Index Settings ---
+TOP_K = 10            # Neighbours kept per alumnus in the precomputed table
+BLOCK_SIZE = 512      # Rows scored at once while building (bounds peak memory)
+INDEX_DIR_NAME = 'recommendations'
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'build.lock'
+FEATURE_FIELDS = ('major', 'city', 'graduation_year')
+INDEX_FORMAT = 3      # Bump when the pickled index layout or encoding changes
+JOURNAL_LIMIT = 10000 # Recent local changes kept for replay onto a newly loaded index
+
+# numpy, scipy and the feature encoders are bound by _import_numeric() the first
+# time an index is built, loaded or queried, so importing this module (the change
+# tracking below is registered at startup) does not load the numeric stack.
+np = sparse = alumni_encoder = None
+
+
+def _import_numeric():
+    global np, sparse, alumni_encoder
+    if np is None:
+        import numpy
+        from scipy import sparse as scipy_sparse
+        from app.features import alumni_encoder as encoder
+        sparse, alumni_encoder = scipy_sparse, encoder
+        np = numpy # Bound last: other threads treat np as the "ready" flag
+
+
+class RecommendationIndex(object):
+    """
+    Precomputed recommendation data for the alumni of one institute:
+    a sparse feature matrix plus a top-k neighbour table (ids and scores).
+    Lookups are a binary search into `ids` and a row read from `neighbours`.
+    """
+
+    format = INDEX_FORMAT
+
+    def __init__(self, version, ids, encoder, matrix, neighbours, scores, built_at=None):
+        _import_numeric()
+        self.version = version
+        self.built_at = built_at or time.time()  # Snapshot time of the data it was built from
+        self.ids = ids                  # np.int64 array, sorted ascending
+        self.encoder = encoder          # FeatureEncoder used to build `matrix`
+        self.matrix = matrix            # CSR matrix, one L2-normalised row per alumnus
+        self.neighbours = neighbours    # (N, TOP_K) alumni ids, -1 = empty slot
+        self.scores = scores            # (N, TOP_K) float32 similarity scores
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, alumni_id):
+        """Returns the matrix row of an alumnus, or None if it is not indexed."""
+        pos = int(np.searchsorted(self.ids, alumni_id))
+        if pos < len(self.ids) and self.ids[pos] == alumni_id:
+            return pos
+        return None
+
+    def lookup(self, alumni_id, limit=5):
+        """Returns up to `limit` recommended Alumni IDs, best match first."""
+        row = self.row_of(alumni_id)
+        if row is None:
+            return None
+        ids = self.neighbours[row, :limit]
+        return [int(i) for i in ids if i >= 0]
+
+    # --- Incremental updates ---
+    # Changes arrive in batches, one per commit. A batch rebuilds the id, matrix and
+    # neighbour arrays once (one O(N) copy however many rows changed), then scores
+    # only the changed alumni against the corpus, a block at a time; the encoder is
+    # stateless. Neighbour lists are patched only where a changed alumnus now belongs
+    # or used to appear. Lists it drops out of are not back-filled, so they may be
+    # slightly short until the next full rebuild.
+
+    def vectorize(self, features):
+        """Encodes one alumnus given as a (major, city, graduation_year) tuple."""
+        return self.encoder.transform_one(features)
+
+    def similarities(self, vector):
+        """Scores one (1, V) row vector against every indexed alumnus."""
+        return (self.matrix @ vector.T).toarray().ravel().astype(np.float32)
+
+    def query(self, features, exclude_id=None, limit=5):
+        """Recommends for an alumnus that is not (yet) part of the index."""
+        sims = self.similarities(self.vectorize(features))
+        row = self.row_of(exclude_id) if exclude_id is not None else None
+        if row is not None:
+            sims[row] = -np.inf
+        top = top_k(sims, min(limit, len(sims) - (row is not None)))
+        return [int(i) for i in self.ids[top]]
+
+    def apply(self, changes):
+        """Applies {alumni_id: (major, city, graduation_year), or None to remove} as one batch."""
+        if not changes:
+            return
+        changed = np.fromiter(changes, dtype=np.int64, count=len(changes))
+        upserts = [(alumni_id, features) for alumni_id, features in changes.items() if features is not None]
+        new_ids = np.fromiter((alumni_id for alumni_id, _ in upserts), dtype=np.int64, count=len(upserts))
+
+        # 1. Drop every changed row, append the new versions and restore id order, in one copy
+        keep = np.flatnonzero(~np.isin(self.ids, changed))
+        ids = np.concatenate([self.ids[keep], new_ids])
+        order = np.argsort(ids, kind='stable')
+        matrix = self.matrix[keep]
+        if upserts:
+            columns = zip(self.encoder.field_names, zip(*(features for _, features in upserts)))
+            vectors = self.encoder.transform_columns({name: list(values) for name, values in columns})
+            matrix = sparse.vstack([matrix, vectors], format='csr')
+        width = self.neighbours.shape[1]
+        self.ids = ids[order]
+        self.matrix = matrix[order]
+        self.neighbours = np.concatenate([self.neighbours[keep], np.full((len(upserts), width), -1, dtype=np.int64)])[order]
+        self.scores = np.concatenate([self.scores[keep], np.zeros((len(upserts), width), dtype=np.float32)])[order]
+
+        # 2. Lists that named a changed alumnus forget it; new scores are put back in step 3
+        stale = np.isin(self.neighbours, changed)
+        for row in np.flatnonzero(stale.any(axis=1)):
+            self._set_row(row, self.neighbours[row][~stale[row]], self.scores[row][~stale[row]])
+
+        # 3. Score the new versions against the corpus, a block of alumni at a time
+        rows = np.searchsorted(self.ids, new_ids)
+        for start in range(0, len(upserts), BLOCK_SIZE):
+            block = (self.matrix @ vectors[start:start + BLOCK_SIZE].T).toarray().astype(np.float32)
+            for j, (alumni_id, row) in enumerate(zip(new_ids[start:start + BLOCK_SIZE], rows[start:start + BLOCK_SIZE])):
+                sims = block[:, j]
+                sims[row] = -np.inf
+                k = min(TOP_K, len(sims) - 1)
+                top = top_k(sims, k) if k > 0 else np.empty(0, dtype=np.int64)
+                self._set_row(row, self.ids[top], sims[top])
+                # Lists it now belongs in
+                weakest = np.where(self.neighbours[:, -1] >= 0, self.scores[:, -1], -np.inf)
+                for r in np.flatnonzero(sims > weakest):
+                    self._patch_row(r, alumni_id, sims[r])
+
+    def upsert(self, alumni_id, features):
+        """Adds or re-scores one alumnus and patches the neighbour lists it affects."""
+        self.apply({alumni_id: features})
+        return True
+
+    def remove(self, alumni_id):
+        """Drops one alumnus from the matrix and from every neighbour list."""
+        if self.row_of(alumni_id) is None:
+            return False
+        self.apply({alumni_id: None})
+        return True
+
+    def _patch_row(self, row, alumni_id, score):
+        """Removes `alumni_id` from one neighbour list and re-inserts it at `score` (if given)."""
+        ids, scores = self.neighbours[row], self.scores[row]
+        keep = (ids >= 0) & (ids != alumni_id)
+        ids, scores = ids[keep], scores[keep]
+        if score is not None:
+            pos = int(np.searchsorted(-scores, -score, side='right'))
+            ids, scores = np.insert(ids, pos, alumni_id), np.insert(scores, pos, score)
+        self._set_row(row, ids, scores)
+
+    def _set_row(self, row, ids, scores):
+        """Replaces one neighbour list with `ids` / `scores` (best first), padded or cut to TOP_K."""
+        ids, scores = ids[ids >= 0][:TOP_K], scores[ids >= 0][:TOP_K]
+        self.neighbours[row] = -1
+        self.scores[row] = 0
+        self.neighbours[row, :len(ids)] = ids
+        self.scores[row, :len(scores)] = scores
+
+
+class PartitionedIndex(object):
+    """
+    One RecommendationIndex per institute. Alumni are only ever recommended to
+    alumni of their own institute, so each partition is built, queried and patched
+    on its own: building costs the sum of the squared institute sizes rather than
+    the square of the whole corpus, and a write only touches its own institute.
+    """
+
+    format = INDEX_FORMAT
+
+    def __init__(self, version, partitions, built_at=None):
+        self.version = version
+        self.built_at = built_at or time.time()
+        self.partitions = partitions    # institute_id -> RecommendationIndex
+        self.institute_of = {int(alumni_id): institute_id for institute_id, index in partitions.items() for alumni_id in index.ids}
+
+    def __len__(self):
+        return len(self.institute_of)
+
+    def lookup(self, alumni_id, limit=5):
+        """Returns up to `limit` recommended Alumni IDs from the alumnus's institute, or None if not indexed."""
+        if alumni_id not in self.institute_of:
+            return None
+        return self.partitions[self.institute_of[alumni_id]].lookup(alumni_id, limit)
+
+    def query(self, features, institute_id, exclude_id=None, limit=5):
+        """Recommends from one institute for an alumnus that is not (yet) part of the index."""
+        index = self.partitions.get(institute_id)
+        return index.query(features, exclude_id=exclude_id, limit=limit) if index is not None and len(index) else []
+
+    def apply(self, changes):
+        """
+        Applies {alumni_id: (institute_id, features), or None to remove} with one batch
+        per affected partition, moving alumni whose institute changed.
+        """
+        batches = {}
+        for alumni_id, change in changes.items():
+            current = self.institute_of.get(alumni_id)
+            target = change[0] if change is not None else None
+            if current is not None and (change is None or current != target):
+                batches.setdefault(current, {})[alumni_id] = None
+                del self.institute_of[alumni_id]
+            if change is not None:
+                batches.setdefault(target, {})[alumni_id] = change[1]
+                self.institute_of[alumni_id] = target
+        for institute_id, batch in batches.items():
+            index = self.partitions.get(institute_id)
+            if index is None:
+                index = self.partitions[institute_id] = _build_partition([], self.version, self.built_at)
+            index.apply(batch)
+
+    def upsert(self, alumni_id, institute_id, features):
+        """Adds or re-scores one alumnus, moving it between partitions when its institute changed."""
+        self.apply({alumni_id: (institute_id, features)})
+        return True
+
+    def remove(self, alumni_id):
+        if alumni_id not in self.institute_of:
+            return False
+        self.apply({alumni_id: None})
+        return True
+
+
+# --- Single-row scoring ---
+# A cold recommendation only needs one row of the similarity matrix: multiplying
+# the requesting alumnus's sparse vector against the corpus is O(N·nnz) in time
+# and O(N) in memory, and a partial selection finds the top k without sorting N items.
+
+def score_row(matrix, row):
+    """Similarity of matrix row `row` against every row, as a dense float32 vector."""
+    return (matrix @ matrix[row].T).toarray().ravel().astype(np.float32)
 
-def get_recommendations(current_alumnus_id, db_session):
+
+def top_k(scores, k):
+    """Positions of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def _features(row):
+    """The encoded fields of one alumnus as a (major, city, graduation_year) tuple."""
+    return tuple(getattr(row, field) for field in FEATURE_FIELDS)
+
+
+def _change(row):
+    """What the index needs to place one alumnus: (institute_id, features)."""
+    return row.institute_id, _features(row)
+
+
+def _top_k_block(matrix, matrix_t, start, stop, k, lo=0, hi=None):
+    """
+    Scores rows [start, stop) against rows [lo, hi) (by default every row) and
+    returns the k best neighbours (row positions) and scores of each, excluding
+    the row itself. Peak memory is one dense (stop - start) x (hi - lo) float32 block.
+    """
+    hi = matrix.shape[0] if hi is None else hi
+    block = (matrix[start:stop] @ matrix_t[:, lo:hi]).toarray().astype(np.float32)
+    block[np.arange(stop - start), np.arange(start - lo, stop - lo)] = -np.inf  # Never recommend yourself
+
+    top = np.argpartition(block, -k, axis=1)[:, -k:]
+    top_scores = np.take_along_axis(block, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1) + lo, np.take_along_axis(top_scores, order, axis=1)
+
+
+def _top_k_table(matrix, k=TOP_K, block_size=BLOCK_SIZE):
+    """
+    Scores the matrix against itself one block of rows at a time and keeps
+    the k best neighbours (row positions) of every row, excluding itself.
+    """
+    n = matrix.shape[0]
+    width = k
+    k = min(k, max(n - 1, 0))
+    positions = np.full((n, width), -1, dtype=np.int64)
+    scores = np.zeros((n, width), dtype=np.float32)
+    if k == 0:
+        return positions, scores
+
+    matrix_t = matrix.T.tocsc()
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        positions[start:stop, :k], scores[start:stop, :k] = _top_k_block(matrix, matrix_t, start, stop, k)
+    return positions, scores
+
+
+def load_corpus(db_session):
+    """
+    Returns (ids, segments, encoder, matrix) for every Alumni row, ordered by
+    institute and id. `segments` lists the (start, stop) rows of each institute.
+    """
+    _import_numeric()
+    rows = (db_session.query(Alumni.id, Alumni.major, Alumni.city, Alumni.graduation_year, Alumni.institute_id)
+            .order_by(Alumni.institute_id, Alumni.id).execution_options(all_tenants=True).all())
+    ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+    segments, start = [], 0
+    for stop in range(1, len(rows) + 1):
+        if stop == len(rows) or rows[stop].institute_id != rows[start].institute_id:
+            segments.append((start, stop))
+            start = stop
+
+    encoder = alumni_encoder()
+    return ids, segments, encoder, encoder.transform(rows)
+
+
+def _build_partition(rows, version, built_at):
+    """A RecommendationIndex over `rows` (id, major, city, graduation_year), ordered by id."""
+    ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+    encoder = alumni_encoder()
+    matrix = encoder.transform(rows)
+
+    # Translate neighbour row positions into Alumni IDs
+    positions, scores = _top_k_table(matrix)
+    neighbours = np.full(positions.shape, -1, dtype=np.int64)
+    filled = positions >= 0
+    neighbours[filled] = ids[positions[filled]]
+    return RecommendationIndex(version, ids, encoder, matrix, neighbours, scores, built_at=built_at)
+
+
+def build_index(db_session, version=None):
+    """Builds a PartitionedIndex from every Alumni row in one pass, one partition per institute."""
+    _import_numeric()
+    started = time.time()
+    version = version or int(started * 1000)
+    rows = (db_session.query(Alumni.id, Alumni.major, Alumni.city, Alumni.graduation_year, Alumni.institute_id)
+            .order_by(Alumni.id).execution_options(all_tenants=True).all())
+    by_institute = {}
+    for row in rows:
+        by_institute.setdefault(row.institute_id, []).append(row)
+    return PartitionedIndex(version, {institute_id: _build_partition(members, version, started)
+                                      for institute_id, members in by_institute.items()}, built_at=started)
+
+
+# --- Versioned on-disk storage ---
+# Each build is written to its own `index-<version>.pkl` file and published by
+# atomically replacing the CURRENT pointer. Workers that already hold an older
+# version keep serving it while the new one is loaded in the background.
+
+def index_dir(app):
+    return os.path.join(app.instance_path, INDEX_DIR_NAME)
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_index(index, directory, keep=2):
+    """Writes `index` to disk, publishes it as CURRENT and prunes old versions."""
+    os.makedirs(directory, exist_ok=True)
+    _atomic_write(os.path.join(directory, f'index-{index.version}.pkl'),
+                  pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+    _atomic_write(os.path.join(directory, CURRENT_FILE), str(index.version).encode())
+
+    versions = sorted(int(name[6:-4]) for name in os.listdir(directory)
+                      if name.startswith('index-') and name.endswith('.pkl'))
+    for old in versions[:-keep]:
+        try:
+            os.remove(os.path.join(directory, f'index-{old}.pkl'))
+        except OSError:
+            pass
+
+
+def published_version(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as fh:
+            return int(fh.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def load_index(directory, version):
+    _import_numeric() # Unpickling bypasses RecommendationIndex.__init__
+    with open(os.path.join(directory, f'index-{version}.pkl'), 'rb') as fh:
+        return pickle.load(fh)
+
+
+class IndexHolder(object):
+    """
+    Per-worker handle on the current RecommendationIndex.
+    The CURRENT pointer is checked at most every RECS_RELOAD_INTERVAL seconds; a newer
+    version is loaded on a background thread and swapped in when ready, so requests
+    never wait on a reload. Changes committed by this worker are applied to the
+    loaded index right away and replayed onto newer versions built before them.
     """
-    Generates recommendations for a given alumnus based on common features (major, city, year).
+
+    def __init__(self, check_interval=30):
+        self.check_interval = check_interval
+        self.index = None
+        self._directory = None
+        self._next_check = 0.0
+        self._loading = False
+        self._journal = []        # (committed_at, alumni_id, (institute_id, features) or None) since the last load
+        self._rebuilder = None
+        self._lock = threading.RLock()
+
+    def get(self, app):
+        directory = index_dir(app)
+        if directory != self._directory:
+            self._directory, self.index, self._next_check = directory, None, 0.0
+        self._start_rebuilder(app)
+
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + app.config.get('RECS_RELOAD_INTERVAL', self.check_interval)
+            version = published_version(directory)
+            if version is not None and (self.index is None or version > self.index.version):
+                if self.index is None:
+                    self._load(directory, version)  # Nothing to serve yet: load inline once
+                else:
+                    self._load_in_background(directory, version)
+        return self.index
+
+    def lookup(self, app, alumni_id, limit=5):
+        """Returns (index, ids); ids is None when the alumnus is not in the index."""
+        index = self.get(app)
+        if index is None:
+            return None, None
+        with self._lock:
+            return self.index, self.index.lookup(alumni_id, limit)
+
+    def _load(self, directory, version):
+        try:
+            index = load_index(directory, version)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return
+        if getattr(index, 'format', 1) == INDEX_FORMAT:
+            self.publish(index)
+
+    def _load_in_background(self, directory, version):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def worker():
+            try:
+                self._load(directory, version)
+            finally:
+                self._loading = False
+
+        threading.Thread(target=worker, name='recs-index-reload', daemon=True).start()
+
+    def publish(self, index):
+        """Swaps in a newer index, replaying local changes it was built too early to contain."""
+        with self._lock:
+            if self.index is not None and index.version <= self.index.version:
+                return
+            self._journal = [entry for entry in self._journal if entry[0] >= index.built_at]
+            index.apply({alumni_id: change for _, alumni_id, change in self._journal}) # The latest change per alumnus
+            self.index = index
+
+    def apply(self, changes):
+        """Applies committed {alumni_id: (institute_id, features) or None} changes to the loaded index."""
+        committed_at = time.time()
+        with self._lock:
+            self._journal.extend((committed_at, alumni_id, change) for alumni_id, change in changes.items())
+            del self._journal[:-JOURNAL_LIMIT]
+            if self.index is not None:
+                self.index.apply(changes) # One batch per commit
+
+    def query(self, index, features, institute_id, exclude_id=None, limit=5):
+        with self._lock:
+            return index.query(features, institute_id, exclude_id=exclude_id, limit=limit)
+
+    # --- Background full rebuild ---
+    # One daemon thread per worker wakes up every RECS_REBUILD_INTERVAL seconds and
+    # rebuilds when the published index is older than that. A non-blocking file
+    # lock makes sure only one worker builds at a time; the others pick the new
+    # version up through the CURRENT pointer.
+
+    def _start_rebuilder(self, app):
+        interval = app.config.get('RECS_REBUILD_INTERVAL', 0)
+        if interval <= 0 or (self._rebuilder is not None and self._rebuilder.is_alive()):
+            return
+        with self._lock:
+            if self._rebuilder is not None and self._rebuilder.is_alive():
+                return
+            self._rebuilder = threading.Thread(target=self._rebuild_loop, args=(app, interval),
+                                               name='recs-index-rebuild', daemon=True)
+            self._rebuilder.start()
+
+    def _rebuild_loop(self, app, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                directory = index_dir(app)
+                version = published_version(directory)  # Versions are build timestamps in ms
+                if version is not None and time.time() - version / 1000.0 < interval:
+                    continue
+                with app.app_context():
+                    try:
+                        rebuild_index(app, db.session, blocking=False)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                app.logger.warning(f'Background recommendation rebuild failed: {e}')
+
+
+index_holder = IndexHolder()
+
+
+def rebuild_index(app, db_session, blocking=True):
+    """
+    Builds a fresh index, writes it to disk and makes it current for this worker.
+    Returns None without building if another process holds the build lock and
+    `blocking` is False.
+    """
+    directory = index_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        index = build_index(db_session)
+        save_index(index, directory)
+    index_holder.publish(index)
+    return index
+
+
+# --- Change tracking ---
+# Alumni writes are collected per session while flushing and handed to the index
+# only once the transaction has committed; a rollback discards them.
+
+def _pending_changes(target):
+    session = object_session(target)
+    return session.info.setdefault('recs_changes', {}) if session is not None else None
+
+
+def queue_alumni_changes(session, rows):
+    """
+    Queues alumni written with Core statements (which fire no ORM events) for the
+    index; `rows` expose id, institute_id, major, city and graduation_year. Applied on commit.
+    """
+    session.info.setdefault('recs_changes', {}).update((row.id, _change(row)) for row in rows)
+
+
+@event.listens_for(Alumni, 'after_insert')
+def _alumni_inserted(mapper, connection, target):
+    changes = _pending_changes(target)
+    if changes is not None:
+        changes[target.id] = _change(target)
+
+
+@event.listens_for(Alumni, 'after_update')
+def _alumni_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in FEATURE_FIELDS + ('institute_id',)):
+        changes = _pending_changes(target)
+        if changes is not None:
+            changes[target.id] = _change(target)
+
+
+@event.listens_for(Alumni, 'after_delete')
+def _alumni_deleted(mapper, connection, target):
+    changes = _pending_changes(target)
+    if changes is not None:
+        changes[target.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed_changes(session):
+    changes = session.info.pop('recs_changes', None)
+    if changes:
+        index_holder.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('recs_changes', None)
+
+
+def get_recommendations(current_alumnus_id, db_session, limit=5):
+    """
+    Returns a list of recommended Alumni IDs for the given alumnus.
+    Served from the precomputed index when one has been published
+    (see `flask recs build`); otherwise falls back to an on-the-fly computation.
+    """
+    from flask import current_app
+
+    index, ids = index_holder.lookup(current_app, current_alumnus_id, limit)
+    if ids is not None:
+        return ids
+    if index is not None:
+        # Not indexed yet (e.g. written by another worker): score this one profile against the index
+        row = (db_session.query(Alumni.major, Alumni.city, Alumni.graduation_year, Alumni.institute_id)
+               .filter(Alumni.id == current_alumnus_id).first())
+        if row is None:
+            return []
+        return index_holder.query(index, _features(row), row.institute_id, exclude_id=current_alumnus_id, limit=limit)
+    return compute_recommendations(current_alumnus_id, db_session, limit)
+
+
+def compute_recommendations(current_alumnus_id, db_session, limit=5):
+    """
+    Generates recommendations for a given alumnus based on common features (major, city, year),
+    from the other alumni of the same institute.
     Returns a list of recommended Alumni IDs.
     """
-    
-    # 1. Fetch data required for analysis (All Alumni)
-    # We fetch all data and will index the current user later
-    alumni_data = db_session.query(Alumni.id, Alumni.major, Alumni.city, Alumni.graduation_year).all()
-    
+
+    _import_numeric()
+
+    # 1. Fetch data required for analysis (the alumni of the same institute)
+    institute_id = db_session.query(Alumni.institute_id).filter(Alumni.id == current_alumnus_id).scalar()
+    alumni_data = (db_session.query(Alumni.id, Alumni.major, Alumni.city, Alumni.graduation_year)
+                   .filter(Alumni.institute_id == institute_id).all())
+
     # If not enough data exists (less than 2 users total), return empty list
     if len(alumni_data) < 2:
         return []
 
-    # Convert query results to a Pandas DataFrame (essential for Sklearn)
-    df_list = [a._asdict() for a in alumni_data]
-    df = pd.DataFrame(df_list)
-    
-    # 2. Create a "content string" from relevant features (e.g., "Computer Science San Francisco 2025")
-    df['content'] = df['major'].fillna('') + ' ' + df['city'].fillna('') + ' ' + df['graduation_year'].astype(str)
-    
-    # 3. Create Vectorizer (TF-IDF: Converts text features into numerical vectors)
-    # This prepares the data for similarity comparison.
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(df['content'])
-    
-    # 4. Compute Similarity (Cosine Similarity: measures the angle between vectors)
-    cosine_sim = linear_kernel(tfidf_matrix, tfidf_matrix)
-    
-    # 5. Get Recommendations based on the current user's index
-    indices = pd.Series(df.index, index=df['id']).drop_duplicates()
-    
-    try:
-        idx = indices[current_alumnus_id]
-    except KeyError:
+    ids = np.fromiter((a.id for a in alumni_data), dtype=np.int64, count=len(alumni_data))
+    matches = np.flatnonzero(ids == current_alumnus_id)
+    if not len(matches):
         return [] # User not found in the dataset being analyzed
+    idx = int(matches[0])
+
+    # 2. Encode the features (major and city one-hot, graduation year by proximity)
+    feature_matrix = alumni_encoder().transform(alumni_data)
+
+    # 3. Score only the current user's row against everyone (Cosine Similarity)
+    sim_scores = score_row(feature_matrix, idx)
+    sim_scores[idx] = -np.inf # Exclude the user themselves
+
+    # 4. Return the top N Alumni IDs
+    return [int(i) for i in ids[top_k(sim_scores, min(limit, len(ids) - 1))]]
+
+
+# --- Offline all-pairs similarity graph ---
+# Alumni are only paired within their own institute. Each institute's rows are
+# split into blocks that a process pool scores against that institute alone (peak
+# memory per worker is one block_size x institute size float32 block). Blocks are written
+# in order with one bulk insert per block, and the job's progress is committed in
+# the same transaction, so an interrupted run resumes after its last written block.
+
+_graph_matrix = None  # Set in each pool worker by _init_graph_worker
+
+
+def _init_graph_worker(matrix):
+    global _graph_matrix
+    _graph_matrix = (matrix, matrix.T.tocsc())
+
+
+def _score_graph_block(args):
+    block_no, start, stop, lo, hi, k = args
+    matrix, matrix_t = _graph_matrix
+    positions, scores = _top_k_block(matrix, matrix_t, start, stop, k, lo, hi)
+    return block_no, positions, scores
+
+
+def _graph_blocks(segments, block_size):
+    """(start, stop, institute start, institute stop) of every block; no block spans two institutes."""
+    return [(start, min(start + block_size, hi), lo, hi)
+            for lo, hi in segments for start in range(lo, hi, block_size)]
+
+
+def _corpus_signature(ids, segments, matrix):
+    """Changes whenever the alumni set, their institutes or their features change."""
+    import hashlib
+    digest = hashlib.sha256(ids.tobytes())
+    digest.update(np.asarray(segments, dtype=np.int64).tobytes())
+    for part in (matrix.indptr, matrix.indices, matrix.data):
+        digest.update(np.ascontiguousarray(part).tobytes())
+    return digest.hexdigest()
+
+
+def build_similarity_graph(db_session, block_size=256, workers=None, k=TOP_K, restart=False, progress=None):
+    """
+    Computes the top-k neighbours of every alumnus, among the alumni of the same
+    institute, into AlumniSimilarity. Resumes the latest unfinished job for the same data and settings unless
+    `restart` is set. `progress(job)` is called after every committed block.
+    Returns the finished SimilarityJob.
+    """
+    import multiprocessing
+    from sqlalchemy import insert
+    from datetime import datetime
+    from app.models import SimilarityJob, AlumniSimilarity
+
+    ids, segments, _, matrix = load_corpus(db_session)
+    k = min(k, max((hi - lo for lo, hi in segments), default=1) - 1) # Largest institute size - 1
+    signature = _corpus_signature(ids, segments, matrix)
+    blocks = _graph_blocks(segments, block_size)
+    total_blocks = len(blocks)
+
+    job = None
+    if not restart:
+        job = (db_session.query(SimilarityJob)
+               .filter_by(finished_at=None, corpus_signature=signature, top_k=k, block_size=block_size)
+               .order_by(SimilarityJob.id.desc()).first())
+    if job is None:
+        job = SimilarityJob(corpus_signature=signature, top_k=k, block_size=block_size, total_blocks=total_blocks)
+        db_session.add(job)
+        db_session.commit()
+
+    pending = list(range(job.completed_blocks, total_blocks))
+    if pending and k > 0:
+        workers = workers or os.cpu_count() or 1
+        context = multiprocessing.get_context('fork') if hasattr(os, 'fork') else multiprocessing
+        with context.Pool(workers, initializer=_init_graph_worker, initargs=(matrix,)) as pool:
+            # Submit a bounded window of blocks at a time so finished blocks never pile up in memory
+            window = workers * 2
+            for offset in range(0, len(pending), window):
+                # Small institutes have fewer than k others to pair with
+                tasks = [(b, *blocks[b], min(k, blocks[b][3] - blocks[b][2] - 1)) for b in pending[offset:offset + window]
+                         if blocks[b][3] - blocks[b][2] > 1]
+                for block_no, positions, scores in pool.imap(_score_graph_block, tasks):
+                    start = blocks[block_no][0]
+                    rows = [{'job_id': job.id, 'alumni_id': int(ids[start + i]), 'rank': rank,
+                             'neighbour_id': int(ids[positions[i, rank]]), 'score': float(scores[i, rank])}
+                            for i in range(positions.shape[0]) for rank in range(positions.shape[1])]
+                    db_session.execute(insert(AlumniSimilarity), rows)
+                    job.completed_blocks = block_no + 1
+                    db_session.commit()
+                    if progress:
+                        progress(job)
+
+    # Publish: mark finished and drop the edges of every older job
+    job.completed_blocks = total_blocks # Including blocks of one-alumnus institutes, which have no edges
+    job.finished_at = datetime.utcnow()
+    db_session.query(AlumniSimilarity).filter(AlumniSimilarity.job_id != job.id).delete(synchronize_session=False)
+    db_session.query(SimilarityJob).filter(SimilarityJob.id != job.id).delete(synchronize_session=False)
+    db_session.commit()
+    return job
+
+
+# --- Benchmark: full matrix vs single-row scoring ---
+
+def synthetic_columns(n, seed=42):
+    """Random major/city/year columns with a realistic number of distinct values."""
+    _import_numeric()
+    rng = np.random.default_rng(seed)
+    majors = np.array([f'Major {i}' for i in range(200)], dtype=object)
+    cities = np.array([f'City {i}' for i in range(1000)], dtype=object)
+    return {'major': majors[rng.integers(0, len(majors), n)],
+            'city': cities[rng.integers(0, len(cities), n)],
+            'graduation_year': rng.integers(1960, 2026, n)}
+
+
+def benchmark_cold_scoring(n, run_full=True, limit=5, seed=42):
+    """
+    Times one cold recommendation over `n` synthetic alumni with both scoring modes.
+    Returns {'n', 'encode_s', 'single_s', 'single_peak_mb', 'full_s', 'full_peak_mb'};
+    the full-matrix fields are None when `run_full` is False.
+    """
+    import tracemalloc
+    from sklearn.metrics.pairwise import linear_kernel
+
+    _import_numeric()
+    started = time.perf_counter()
+    matrix = alumni_encoder().transform_columns(synthetic_columns(n, seed))
+    result = {'n': n, 'encode_s': time.perf_counter() - started,
+              'full_s': None, 'full_peak_mb': None}
+
+    def measure(fn):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak / 2 ** 20
+
+    def single():
+        scores = score_row(matrix, 0)
+        scores[0] = -np.inf
+        return top_k(scores, limit)
+
+    def full():
+        # The previous implementation: N x N similarity matrix plus a sorted list of N tuples
+        cosine_sim = linear_kernel(matrix, matrix)
+        return sorted(enumerate(cosine_sim[0]), key=lambda x: x[1], reverse=True)[1:limit + 1]
 
-    # Get the similarity scores for the current user (using their index 'idx')
-    sim_scores = list(enumerate(cosine_sim[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    
-    # Select the top 5 (excluding the user themselves, which is the first entry)
-    sim_scores = sim_scores[1:6] 
-    
-    alumni_indices = [i[0] for i in sim_scores]
-    
-    # Return the list of recommended Alumni IDs
-    return df['id'].iloc[alumni_indices].tolist()
+    result['single_s'], result['single_peak_mb'] = measure(single)
+    if run_full:
+        result['full_s'], result['full_peak_mb'] = measure(full)
+    return result
@@ -2,7 +2,7 @@
 
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import hash_password, password_checker
 from flask_login import UserMixin
 
 # --- MODEL: Role ---
@@ -21,9 +21,10 @@ class User(UserMixin, db.Model):
     role_id = db.Column(db.Integer, db.ForeignKey('role.id'))
     alumni_id = db.Column(db.Integer, db.ForeignKey('alumni.id'))
     institute_id = db.Column(db.Integer, db.ForeignKey('institute.id'))
-    alumni_profile = db.relationship('Alumni', backref='user', uselist=False)
-    def set_password(self, password): self.password_hash = generate_password_hash(password)
-    def check_password(self, password): return check_password_hash(self.password_hash, password) if self.password_hash else False
+    alumni_profile = db.relationship('Alumni', backref=db.backref('user', uselist=False), uselist=False)
+    institute = db.relationship('Institute', backref=db.backref('users', lazy='dynamic'))
+    def set_password(self, password): self.password_hash = hash_password(password)
+    def check_password(self, password): return password_checker.verify(self, password) # May raise PasswordCheckBusy
     def __repr__(self): return f'<User {self.username} | Role: {self.role.name if self.role else "None"}>'
 
 # --- MODEL: Alumni ---
@@ -38,6 +39,7 @@ class Alumni(db.Model):
     photo_file = db.Column(db.String(100), default='default_user.png')
     profile_complete = db.Column(db.Boolean, default=False)
     institute_id = db.Column(db.Integer, db.ForeignKey('institute.id'))
+    __table_args__ = (db.Index('ix_alumni_institute_year_id', 'institute_id', 'graduation_year', 'id'),) # One institute's directory, in keyset order
     def __repr__(self): return f'<Alumni {self.name} ({self.graduation_year})>'
 
 # --- MODEL: Event ---
@@ -48,6 +50,7 @@ class Event(db.Model):
     date_time = db.Column(db.DateTime, nullable=False)
     location = db.Column(db.String(100))
     institute_id = db.Column(db.Integer, db.ForeignKey('institute.id'))
+    __table_args__ = (db.Index('ix_event_institute_date_time', 'institute_id', 'date_time'),) # One institute's upcoming events
     def __repr__(self): return f'<Event {self.title}>'
 
 # --- MODEL: Institute ---
@@ -57,4 +60,55 @@ class Institute(db.Model):
     logo_path = db.Column(db.String(255), default='logo.png')
     alumni = db.relationship('Alumni', backref='institute', lazy='dynamic')
     events = db.relationship('Event', backref='institute', lazy='dynamic')
-    def __repr__(self): return f'<Institute {self.name}>'
\ No newline at end of file
+    def __repr__(self): return f'<Institute {self.name}>'
+
+# --- MODEL: SimilarityJob ---
+# One run of `flask recs graph`; progress is committed per block so an
+# interrupted run can resume where it stopped.
+class SimilarityJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    corpus_signature = db.Column(db.String(64), nullable=False)
+    top_k = db.Column(db.Integer, nullable=False)
+    block_size = db.Column(db.Integer, nullable=False)
+    total_blocks = db.Column(db.Integer, nullable=False)
+    completed_blocks = db.Column(db.Integer, default=0, nullable=False)
+    def __repr__(self): return f'<SimilarityJob {self.id} ({self.completed_blocks}/{self.total_blocks})>'
+
+# --- MODEL: AlumniSimilarity ---
+# Edges of the all-pairs "alumni similarity graph": the top-k neighbours of every alumnus.
+class AlumniSimilarity(db.Model):
+    job_id = db.Column(db.Integer, db.ForeignKey('similarity_job.id'), primary_key=True)
+    alumni_id = db.Column(db.Integer, db.ForeignKey('alumni.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    neighbour_id = db.Column(db.Integer, db.ForeignKey('alumni.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    def __repr__(self): return f'<AlumniSimilarity {self.alumni_id} -> {self.neighbour_id} ({self.score:.3f})>'
+
+# --- MODEL: DataVersion ---
+# A counter per institute and kind of data ('events:3', 'institutes:3', 'alumni:3') that is bumped
+# in the same transaction as every write to it; cached pages are keyed on these (see app/page_cache.py).
+class DataVersion(db.Model):
+    scope = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    def __repr__(self): return f'<DataVersion {self.scope} = {self.version}>'
+
+# --- MODEL: InstituteRollup ---
+# Per-institute counts for the admin dashboard, kept current by ORM events (see app/rollups.py).
+# dimension 'alumni' (key ''), 'year', 'major', 'city', 'profile' ('complete' / 'incomplete'),
+# 'events' (key '') and 'event_month' (key 'YYYY-MM').
+class InstituteRollup(db.Model):
+    institute_id = db.Column(db.Integer, db.ForeignKey('institute.id'), primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    def __repr__(self): return f'<InstituteRollup {self.institute_id} {self.dimension}:{self.key} = {self.count}>'
+
+# --- MODEL: DataMigration ---
+# One-off data migrations that `flask init-db` has applied, by name (see app/bootstrap.py).
+class DataMigration(db.Model):
+    name = db.Column(db.String(64), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    def __repr__(self): return f'<DataMigration {self.name}>'
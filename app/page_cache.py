@@ -0,0 +1,216 @@
+# app/page_cache.py
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+from flask import Response, render_template, request, stream_template
+from flask_login import current_user
+from sqlalchemy import event, inspect, select
+from werkzeug.http import is_resource_modified
+from app import app, db
+from app.models import Alumni, DataVersion, Event, Institute
+from app.tenancy import current_institute_id
+
+# --- Page cache ---
+# Public pages are rendered once per combination of (institute, endpoint, URL, data
+# versions, nav variant) and then served from a per-process LRU. Every ORM write to
+# an Event, Institute or Alumni row bumps that kind's counter for its institute in the
+# data_version table ('events:3') on the same connection, so the bump commits or
+# rolls back with the write, and the next request for a page built from that
+# institute's data misses the cache. Core bulk inserts bypass ORM events and must
+# call bump_data_versions() themselves.
+#
+# Each institute has its own LRU of PAGE_CACHE_SIZE pages, and the cache holds up to
+# PAGE_CACHE_TENANTS of them, so a busy institute cannot push out another's pages.
+#
+# The only personalised part of a cached page is the nav (templates/_nav.html),
+# which has three variants: anonymous, member and admin. A cached template may read
+# current_user only in ways that the variant decides, such as is_authenticated.
+#
+# Every response carries an ETag and, once the data has been written at least once,
+# a Last-Modified header. A conditional request that matches a cached page gets a
+# 304 without rendering anything.
+
+Build = namedtuple('Build', 'template context valid_until changed_at')
+Build.__new__.__defaults__ = (None, None)
+# valid_until: naive local time after which the page is out of date even though no
+#   data changed (the first upcoming event it lists starts)
+# changed_at: naive local time the page last changed without a write (an event started)
+
+Page = namedtuple('Page', 'body etag last_modified valid_until')
+
+SCOPES = {Event: 'events', Institute: 'institutes', Alumni: 'alumni'} # Per institute: 'events:3'
+
+
+def tenant_scopes(scopes, institute_id):
+    """The data version scopes of one institute, e.g. ('events',), 3 -> ('events:3',)."""
+    return tuple(f'{scope}:{institute_id}' for scope in scopes)
+
+
+def bump_data_versions(connection, scopes):
+    """Increments the counters of `scopes` (see tenant_scopes) in the current transaction."""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    for scope in sorted(set(scopes)): # A fixed order, so concurrent writers lock rows alike
+        stmt = insert(table).values(scope=scope, version=1, updated_at=now)
+        connection.execute(stmt.on_conflict_do_update(index_elements=['scope'],
+                                                      set_={'version': table.c.version + 1, 'updated_at': now}))
+
+
+def _bump_on_write(scope):
+    def listener(mapper, connection, target):
+        if isinstance(target, Institute):
+            institutes = {target.id}
+        else: # Both institutes when a row moves between them
+            institutes = {target.institute_id, *inspect(target).attrs.institute_id.history.deleted}
+        bump_data_versions(connection, [scoped for institute_id in institutes if institute_id is not None
+                                        for scoped in tenant_scopes((scope,), institute_id)])
+    return listener
+
+
+for model, scope in SCOPES.items():
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, name, _bump_on_write(scope))
+
+
+def current_versions(scopes):
+    """Returns the counters of `scopes` as a tuple and the time the newest of them was bumped (UTC)."""
+    rows = dict((row.scope, row) for row in db.session.execute(
+        select(DataVersion.scope, DataVersion.version, DataVersion.updated_at).where(DataVersion.scope.in_(scopes))))
+    versions = tuple(rows[scope].version if scope in rows else 0 for scope in scopes)
+    updated = [row.updated_at.replace(tzinfo=timezone.utc) for row in rows.values()]
+    return versions, max(updated) if updated else None
+
+
+def nav_variant():
+    if not current_user.is_authenticated:
+        return 'anon'
+    return 'admin' if current_user.role and current_user.role.name == 'Institute_Admin' else 'member'
+
+
+class PageCache(object):
+
+    def __init__(self, size=256, tenants=64):
+        self.size = size          # Pages per tenant
+        self.tenants = tenants    # Tenants with pages cached
+        self._partitions = OrderedDict() # tenant -> OrderedDict(key -> Page), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, tenant, key):
+        with self._lock:
+            pages = self._partitions.get(tenant)
+            page = pages.get(key) if pages is not None else None
+            if page is None:
+                return None
+            if page.valid_until is not None and datetime.now() >= page.valid_until:
+                del pages[key]
+                return None
+            self._partitions.move_to_end(tenant)
+            pages.move_to_end(key)
+            return page
+
+    def put(self, tenant, key, page):
+        if self.size <= 0 or self.tenants <= 0:
+            return
+        with self._lock:
+            pages = self._partitions.get(tenant)
+            if pages is None:
+                pages = self._partitions[tenant] = OrderedDict()
+            self._partitions.move_to_end(tenant)
+            pages[key] = page
+            pages.move_to_end(key)
+            while len(pages) > self.size:
+                pages.popitem(last=False)
+            while len(self._partitions) > self.tenants:
+                self._partitions.popitem(last=False)
+
+    def clear(self, tenant=None):
+        with self._lock:
+            if tenant is None:
+                self._partitions.clear()
+            else:
+                self._partitions.pop(tenant, None)
+
+
+page_cache = PageCache(app.config.get('PAGE_CACHE_SIZE', 256), app.config.get('PAGE_CACHE_TENANTS', 64))
+
+
+_release_id = None
+
+
+def _release():
+    """A digest of the templates and static files, so a deploy that changes either changes every ETag."""
+    global _release_id
+    if _release_id is None:
+        digest = hashlib.sha1()
+        for folder in (app.template_folder, app.static_folder):
+            root = os.path.join(app.root_path, folder)
+            for directory, dirs, files in sorted(os.walk(root)):
+                for name in sorted(files):
+                    with open(os.path.join(directory, name), 'rb') as fh:
+                        digest.update(name.encode() + fh.read())
+        _release_id = digest.hexdigest()[:12]
+    return _release_id
+
+
+def _local_to_utc(moment):
+    return moment.astimezone(timezone.utc) if moment is not None else None # Naive values are local time
+
+
+def _response(body, etag, last_modified, status=200):
+    response = Response(body, status=status, mimetype='text/html')
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate; a match costs one small query
+    response.vary.add('Cookie')
+    return response
+
+
+def _not_modified(etag, last_modified):
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+
+def _tee(chunks, tenant, key, etag, last_modified, valid_until):
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    page_cache.put(tenant, key, Page(''.join(parts), etag, last_modified, valid_until)) # Only once fully sent
+
+
+def cached_page(scopes, build, stream=False):
+    """
+    Serves the page `build()` describes (a Build) from the cache while the current
+    institute's data versions of `scopes` are unchanged. `build` is only called on a
+    miss; with `stream` set the template is streamed and the page stored once it has been sent.
+    """
+    tenant = current_institute_id()
+    versions, updated_at = current_versions(tenant_scopes(scopes, tenant))
+    key = (tenant, request.endpoint, request.full_path, versions, nav_variant())
+    page = page_cache.get(tenant, key)
+    if page is not None:
+        if _not_modified(page.etag, page.last_modified):
+            return _response(b'', page.etag, page.last_modified, 304)
+        return _response(page.body, page.etag, page.last_modified)
+
+    spec = build()
+    last_modified = max(filter(None, (updated_at, _local_to_utc(spec.changed_at))), default=None)
+    etag = hashlib.sha1(repr((key, spec.valid_until, _release())).encode()).hexdigest()
+    if _not_modified(etag, last_modified):
+        return _response(b'', etag, last_modified, 304)
+    if stream:
+        chunks = stream_template(spec.template, **spec.context)
+        response = _response(_tee(chunks, tenant, key, etag, last_modified, spec.valid_until), etag, last_modified)
+        response.call_on_close(chunks.close) # Pops its request context even if _tee never started
+        return response
+    body = render_template(spec.template, **spec.context)
+    page_cache.put(tenant, key, Page(body, etag, last_modified, spec.valid_until))
+    return _response(body, etag, last_modified)
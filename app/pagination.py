@@ -0,0 +1,81 @@
+# app/pagination.py
+
+from sqlalchemy import and_, or_
+from app import db
+
+# --- Keyset pagination ---
+# Pages are addressed by the sort key of the last row shown ("2024:153") rather
+# than an OFFSET, so every page costs one index range scan no matter how deep it
+# is, and rows inserted meanwhile never shift or duplicate entries between pages.
+
+
+def encode_cursor(values):
+    return ':'.join(str(v) for v in values)
+
+
+def decode_cursor(cursor, count):
+    """Parses "2024:153" into (2024, 153); returns None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    parts = cursor.split(':')
+    if len(parts) != count or not all(p.lstrip('-').isdigit() for p in parts):
+        return None
+    return tuple(int(p) for p in parts)
+
+
+def _after(columns, values):
+    """WHERE clause selecting rows strictly after `values` in (col1 DESC, col2 DESC, ...) order."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal_prefix, column < value))
+    return or_(*clauses)
+
+
+class KeysetPage(object):
+    """
+    One page of `query`, ordered by `columns` descending. The rows are fetched lazily
+    the first time the page is iterated or tested, so a streamed template can send its
+    header before the query runs; at most `per_page + 1` rows are ever held.
+    """
+
+    def __init__(self, query, columns, cursor=None, per_page=30):
+        self.columns = columns
+        self.per_page = per_page
+        self.cursor = decode_cursor(cursor, len(columns))
+        if self.cursor is not None:
+            query = query.filter(_after(columns, self.cursor))
+        self._query = query.order_by(*(c.desc() for c in columns)).limit(per_page + 1)
+        self._items = None
+        self.has_next = False
+
+    @property
+    def items(self):
+        if self._items is None:
+            # Run on the session that is current now: a streamed template iterates after the
+            # view's session has been removed, and reopening that one would leak its connection
+            rows = self._query.with_session(db.session()).all()
+            self.has_next = len(rows) > self.per_page
+            self._items = rows[:self.per_page]
+        return self._items
+
+    @property
+    def next_cursor(self):
+        """Cursor of the following page, or None on the last page."""
+        if not self.items or not self.has_next:
+            return None
+        last = self.items[-1]
+        return encode_cursor(getattr(last, c.key) for c in self.columns)
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
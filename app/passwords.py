@@ -0,0 +1,163 @@
+# app/passwords.py
+
+import hashlib
+import hmac
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from flask import url_for
+from itsdangerous import BadData, URLSafeTimedSerializer
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+from app import app
+
+# --- Password hashing ---
+# Password hashes are deliberately slow, so logins verify them in a small process
+# pool instead of on the request thread. The pool has PASSWORD_WORKERS processes per
+# web worker, forked while the worker still has a single thread: gunicorn.conf.py
+# starts it in post_worker_init, and single-threaded processes such as CLI commands
+# start it on first use. A process that already runs threads (e.g. `flask run`)
+# checks inline instead. The pool is never spawned: spawn would re-run the parent's
+# __main__ and import the whole app in every worker, which breaks any entry script
+# without an `if __name__ == '__main__'` guard. At most PASSWORD_MAX_PENDING checks
+# may be queued or running in the pool; past that, or after PASSWORD_TIMEOUT seconds,
+# the login gets a quick 503 rather than holding a thread. New hashes use PASSWORD_HASH_METHOD. A successful login
+# whose stored hash uses other parameters is re-hashed with the configured ones.
+# Accounts created through Google have no password: their hash is OAUTH_ONLY, which
+# never matches and is never hashed. Accounts an admin creates without a password
+# get INVITE_PENDING, which never matches either, until their owner follows an
+# invite link (see invite_token) and chooses one.
+
+OAUTH_ONLY = '!oauth'
+INVITE_PENDING = '!invite'
+
+
+class PasswordCheckBusy(Exception):
+    """Too many password checks are queued; try again shortly."""
+
+
+def _normalise(method):
+    """The method prefix werkzeug stores for `method`, with its default parameters filled in."""
+    parts = method.split(':')
+    defaults = {'scrypt': ['scrypt', '32768', '8', '1'],
+                'pbkdf2': ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]}.get(parts[0], parts)
+    return ':'.join(parts + defaults[len(parts):])
+
+
+def hash_method():
+    return app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+
+def hash_password(password):
+    return generate_password_hash(password, hash_method())
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _normalise(hash_method())
+
+
+def can_fork():
+    """True while this process has a single thread, so a fork cannot copy a lock another thread holds."""
+    return threading.active_count() == 1
+
+
+def fork_pool(workers):
+    """A process pool whose workers are forked right away; only call it when can_fork()."""
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    pool.submit(int).result() # A fork pool starts every worker on its first task
+    return pool
+
+
+class PasswordChecker(object):
+
+    def __init__(self, workers=1, max_pending=16, timeout=10.0):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Forks the hashing processes; call it before this process starts any thread."""
+        with self._lock:
+            if self.workers and self._pool is None:
+                self._pool = fork_pool(self.workers)
+
+    @property
+    def pool(self):
+        """The hashing processes, or None when checks run inline."""
+        return self._pool
+
+    def _run(self, fn, *args):
+        if self._pool is None and self.workers and can_fork():
+            self.start()
+        if self._pool is None: # PASSWORD_WORKERS=0, or threads were already running
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordCheckBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise PasswordCheckBusy()
+
+    def verify(self, user, password):
+        """
+        True if `password` is `user`'s. On success the hash is upgraded to the
+        configured method when it differs; the caller commits.
+        """
+        stored = user.password_hash
+        if not stored or stored.startswith('!'):
+            return False
+        if not self._run(check_password_hash, stored, password):
+            return False
+        if needs_rehash(stored):
+            try:
+                user.password_hash = self._run(generate_password_hash, password, hash_method())
+            except PasswordCheckBusy:
+                pass # Upgraded on a later login
+        return True
+
+
+# --- Invite and reset links ---
+# A link carries a signed, timestamped token naming the account and a fingerprint of
+# its current hash, so it stops working after INVITE_MAX_AGE seconds or as soon as a
+# password has been set with it.
+
+def _fingerprint(password_hash):
+    return hashlib.sha256((password_hash or '').encode('utf-8')).hexdigest()[:16]
+
+
+def _serializer():
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='set-password')
+
+
+def invite_token(user):
+    """A token that lets whoever holds it choose `user`'s password, once."""
+    return _serializer().dumps([user.id, _fingerprint(user.password_hash)])
+
+
+def invite_url(user):
+    """The absolute link at which `user` chooses a password; needs a request context."""
+    return url_for('set_password', token=invite_token(user), _external=True)
+
+
+def user_for_invite(token, load_user):
+    """The user `token` was issued for (loaded with `load_user(id)`), or None if it is invalid, used or expired."""
+    try:
+        user_id, fingerprint = _serializer().loads(token, max_age=app.config.get('INVITE_MAX_AGE', 604800))
+    except (BadData, ValueError, TypeError):
+        return None
+    user = load_user(user_id)
+    if user is None or not hmac.compare_digest(_fingerprint(user.password_hash), fingerprint):
+        return None
+    return user
+
+
+password_checker = PasswordChecker(workers=app.config.get('PASSWORD_WORKERS', 1),
+                                   max_pending=app.config.get('PASSWORD_MAX_PENDING', 16),
+                                   timeout=app.config.get('PASSWORD_TIMEOUT', 10.0))
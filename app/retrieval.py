@@ -0,0 +1,300 @@
+# app/retrieval.py
+
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models import Alumni, Event
+
+# --- Chatbot retrieval ---
+# An in-memory BM25 index over upcoming events and the public alumni fields (name,
+# major, city, graduation year; never contact details). One index holds every
+# institute's documents, each tagged with its institute, and a search only returns
+# the asking institute's. The best matching snippets are put into the chatbot prompt, capped at RETRIEVAL_TOP_K snippets and
+# RETRIEVAL_MAX_CHARS characters. The index is built on a background thread on first
+# use (the chatbot answers without portal data until it is ready), patched after
+# every commit in this process and rebuilt the same way every
+# RETRIEVAL_REFRESH_INTERVAL seconds to pick up writes made by other workers.
+
+K1, B = 1.2, 0.75           # BM25 parameters
+SNIPPET_CHARS = 240         # Longest single snippet
+TIMING_WINDOW = 1000        # Recent retrievals kept for the latency percentiles
+
+_STOPWORDS = frozenset("""a an the and or of in on at to for from by with about is are was were be been
+    who whom what where which how do does did can could would will i me my you your we our us it
+    its this that these those there any some please tell know anyone studied study live lives""".split())
+_EVENT_WORDS = frozenset('event events next upcoming meetup reunion when schedule'.split())
+
+np = None  # numpy, bound by the first build so that importing this module stays cheap
+
+
+def _tokens(text):
+    return [t for t in re.findall(r'\w+', (text or '').lower()) if t not in _STOPWORDS]
+
+
+def _event_snippet(e):
+    when = e.date_time.strftime('%d %b %Y %H:%M')
+    text = f"Event: {e.title} on {when}" + (f" at {e.location}" if e.location else '')
+    if e.description:
+        text += f". {' '.join(e.description.split())}"
+    return text[:SNIPPET_CHARS]
+
+
+def _alumni_snippet(a):
+    details = ', '.join(v for v in (a.major, a.city) if v)
+    return f"Alumnus: {a.name}" + (f", {details}" if details else '') + f", class of {a.graduation_year}"
+
+
+def _event_doc(e):
+    return (('event', e.id), e.institute_id, _event_snippet(e), e.date_time,
+            ['event'] + _tokens(f"{e.title} {e.location} {e.description}"))
+
+
+def _alumni_doc(a):
+    return (('alumni', a.id), a.institute_id, _alumni_snippet(a), None,
+            _tokens(f"{a.name} {a.major} {a.city} {a.graduation_year}"))
+
+
+class RetrievalIndex(object):
+    """
+    Documents live in numbered slots; each term keeps the slots and term frequencies
+    of its documents, so a query is scored with a few vectorised numpy operations
+    and masked to one institute's slots.
+    Updates append a new slot and retire the old one; retired slots are dropped on
+    the next full build. Updates that arrive while a build is reading the database
+    are also queued and replayed onto the new contents, so none is lost.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._lock = threading.RLock()
+        self.built_at = None
+        self._building = False
+        self._queued = {}                   # key -> document or None, applied while a build ran
+        self._timings = deque(maxlen=TIMING_WINDOW)
+
+    def _reset(self):
+        global np
+        if np is None:
+            import numpy as np
+        self._slots = {}                    # key -> slot of its live document
+        self._docs = []                     # slot -> (key, snippet, event datetime or None)
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._institutes = np.full(1024, -1, dtype=np.int64)  # slot -> institute id (-1: none)
+        self._postings = defaultdict(lambda: ([], []))  # term -> ([slot, ...], [tf, ...])
+        self._arrays = {}                   # term -> (slots, tfs) as arrays, rebuilt after the term changes
+        self._events = {}                   # event key -> (institute id, datetime), for "next event" questions
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _remove(self, key):
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._alive[slot] = False
+            self._total_length -= self._lengths[slot]
+            self._events.pop(key, None)
+
+    def _add(self, key, institute_id, snippet, when, tokens):
+        slot = len(self._docs)
+        if slot == len(self._alive):
+            self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+            self._alive = np.concatenate([self._alive, np.zeros_like(self._alive)])
+            self._institutes = np.concatenate([self._institutes, np.full_like(self._institutes, -1)])
+        self._docs.append((key, snippet, when))
+        self._slots[key] = slot
+        self._lengths[slot] = len(tokens)
+        self._alive[slot] = True
+        self._institutes[slot] = -1 if institute_id is None else institute_id
+        self._total_length += len(tokens)
+        if when is not None:
+            self._events[key] = (institute_id, when)
+        for term, tf in Counter(tokens).items():
+            slots, tfs = self._postings[term]
+            slots.append(slot)
+            tfs.append(tf)
+            self._arrays.pop(term, None)
+
+    def _term_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            slots, tfs = self._postings[term]
+            arrays = self._arrays[term] = (np.array(slots, dtype=np.int64), np.array(tfs, dtype=np.float32))
+        return arrays
+
+    def build(self, db_session):
+        """Replaces the contents with every institute's upcoming events and alumni."""
+        with self._lock:
+            self._building, self._queued = True, {}
+        try:
+            self._build(db_session)
+        finally:
+            with self._lock:
+                self._building, self._queued = False, {}
+
+    def _build(self, db_session):
+        # Shared by every institute, so not narrowed to the requesting one; search() is (see app/tenancy.py)
+        events = db_session.execute(select(Event.id, Event.institute_id, Event.title, Event.description,
+                                           Event.date_time, Event.location)
+                                    .where(Event.date_time >= datetime.now()).execution_options(all_tenants=True))
+        alumni = db_session.execute(select(Alumni.id, Alumni.institute_id, Alumni.name, Alumni.major, Alumni.city,
+                                           Alumni.graduation_year).execution_options(all_tenants=True))
+        docs = [_event_doc(e) for e in events] + [_alumni_doc(a) for a in alumni]
+        with self._lock:
+            self._reset()
+            for doc in docs:
+                self._add(*doc)
+            self._apply(self._queued) # Committed while we were reading; possibly after our snapshot
+            self.built_at = time.monotonic()
+
+    def apply(self, changes):
+        """`changes` maps (kind, id) to a document tuple, or to None for a deletion."""
+        with self._lock:
+            if self._building:
+                self._queued.update(changes)
+            if self.built_at is not None:
+                self._apply(changes)
+
+    def _apply(self, changes):
+        for key, doc in changes.items():
+            self._remove(key)
+            if doc is not None:
+                self._add(*doc)
+
+    def search(self, query, institute_id, limit=5, max_chars=1200):
+        """Returns the best matching snippets of one institute, best first, within `limit` and `max_chars`."""
+        started = time.perf_counter()
+        terms = set(_tokens(query))
+        now = datetime.now()
+        with self._lock:
+            n = len(self._slots)
+            avg_length = self._total_length / n if n else 1.0
+            scores = np.zeros(len(self._docs), dtype=np.float32)
+            for term in terms & self._postings.keys():
+                slots, tfs = self._term_arrays(term)
+                df = np.count_nonzero(self._alive[slots])
+                if not df:
+                    continue
+                idf = np.log1p((n - df + 0.5) / (df + 0.5))
+                norm = K1 * (1 - B + B * self._lengths[slots] / avg_length)
+                scores[slots] += idf * tfs * (K1 + 1) / (tfs + norm)
+            scores[~self._alive[:len(scores)] | (self._institutes[:len(scores)] != institute_id)] = 0
+            # A few spare candidates make up for events that have already taken place
+            candidates = min(np.count_nonzero(scores), limit + len(self._events))
+            best = np.argpartition(-scores, candidates - 1)[:candidates] if candidates else []
+            ranked = [self._docs[slot] for slot in sorted(best, key=lambda slot: -scores[slot])]
+            ranked = [doc for doc in ranked if doc[2] is None or doc[2] >= now]
+            if terms & _EVENT_WORDS: # "When is the next event?": add the soonest events as well
+                upcoming = sorted((when, key) for key, (owner, when) in self._events.items()
+                                  if owner == institute_id and when >= now)
+                seen = {doc[0] for doc in ranked}
+                ranked += [self._docs[self._slots[key]] for _, key in upcoming[:2] if key not in seen]
+            snippets, used = [], 0
+            for _, snippet, _ in ranked[:limit]:
+                if used + len(snippet) > max_chars:
+                    break
+                snippets.append(snippet)
+                used += len(snippet)
+        self._timings.append(time.perf_counter() - started)
+        return snippets
+
+    def timings(self):
+        """Latency percentiles (ms) of recent searches."""
+        samples = sorted(self._timings)
+        if not samples:
+            return {'count': 0}
+        pct = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+        return {'count': len(samples), 'p50_ms': pct(0.50), 'p95_ms': pct(0.95), 'max_ms': samples[-1] * 1000}
+
+
+retrieval_index = RetrievalIndex()
+_build_lock = threading.Lock()
+
+
+def _build_in_background(app):
+    """Starts a full build unless one is already running; requests keep using the current index."""
+    if not _build_lock.acquire(blocking=False):
+        return
+
+    def worker():
+        try:
+            with app.app_context():
+                try:
+                    retrieval_index.build(db.session)
+                finally:
+                    db.session.remove()
+        finally:
+            _build_lock.release()
+
+    threading.Thread(target=worker, name='retrieval-index-build', daemon=True).start()
+
+
+def retrieve_context(app, query, institute_id):
+    """
+    Snippets of institute `institute_id`'s portal data relevant to `query`; none for
+    no institute, or until the first build has finished.
+    """
+    index = retrieval_index
+    refresh = app.config.get('RETRIEVAL_REFRESH_INTERVAL', 300)
+    if index.built_at is None or (refresh and time.monotonic() - index.built_at > refresh):
+        _build_in_background(app)
+    if index.built_at is None or institute_id is None:
+        return []
+    return index.search(query, institute_id, limit=app.config.get('RETRIEVAL_TOP_K', 5),
+                        max_chars=app.config.get('RETRIEVAL_MAX_CHARS', 1200))
+
+
+# --- Change tracking ---
+# Same pattern as the recommender: collect per session, apply after commit.
+
+def _pending_changes(target):
+    session = object_session(target)
+    return session.info.setdefault('retrieval_changes', {}) if session is not None else None
+
+
+def queue_alumni_documents(session, rows):
+    """Queues alumni written with Core statements (no ORM events) for the index; applied on commit."""
+    session.info.setdefault('retrieval_changes', {}).update((('alumni', row.id), _alumni_doc(row)) for row in rows)
+
+
+@event.listens_for(Event, 'after_insert')
+@event.listens_for(Event, 'after_update')
+def _event_written(mapper, connection, target):
+    changes = _pending_changes(target)
+    if changes is not None:
+        changes[('event', target.id)] = _event_doc(target)
+
+
+@event.listens_for(Alumni, 'after_insert')
+@event.listens_for(Alumni, 'after_update')
+def _alumni_written(mapper, connection, target):
+    changes = _pending_changes(target)
+    if changes is not None:
+        changes[('alumni', target.id)] = _alumni_doc(target)
+
+
+@event.listens_for(Event, 'after_delete')
+@event.listens_for(Alumni, 'after_delete')
+def _document_deleted(mapper, connection, target):
+    changes = _pending_changes(target)
+    if changes is not None:
+        changes[('event' if isinstance(target, Event) else 'alumni', target.id)] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed_changes(session):
+    changes = session.info.pop('retrieval_changes', None)
+    if changes:
+        retrieval_index.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('retrieval_changes', None)
@@ -0,0 +1,234 @@
+# app/rollups.py
+
+from collections import Counter, namedtuple
+from sqlalchemy import delete, event, func, inspect, or_, select, text
+from app import db
+from app.models import Alumni, Event, InstituteRollup
+from app.page_cache import bump_data_versions, tenant_scopes
+
+# --- Institute analytics rollups ---
+# The portal's only counter store. The admin dashboard, the directory's year
+# facets and the recommendations page read their numbers from the institute_rollup table:
+# one counter per (institute, dimension, key), such as (3, 'city', 'Berlin'). Every
+# ORM insert/update/delete of an Alumni or Event row moves the affected counters with
+# upserts on the same connection, so they commit or roll back with the write. The
+# dashboard then costs one small query however many alumni an institute has.
+# Core bulk inserts bypass ORM events: alumni go through record_alumni_inserted()
+# (app/bulk_import.py), events call apply_event_rollups() themselves. Writes that the events cannot see, such as raw
+# SQL, make the counters drift; `flask rollups reconcile`, run from cron, puts them right.
+
+ALUMNI_DIMENSIONS = (('alumni', None), ('year', 'graduation_year'), ('major', 'major'), ('city', 'city'),
+                     ('profile', 'profile_complete'))
+EVENT_DIMENSIONS = (('events', None), ('event_month', 'date_time'))
+RANKED_DIMENSIONS = ('major', 'city') # Read largest first, cut to `top`
+
+InstituteAnalytics = namedtuple('InstituteAnalytics', 'alumni complete completion_rate years majors cities events event_months')
+# years, majors, cities, event_months: [(key, count)]; years and months in order, the rest largest first
+
+
+def _key(dimension, value):
+    if dimension in ('alumni', 'events'):
+        return ''
+    if dimension == 'profile':
+        return 'complete' if value else 'incomplete'
+    if value is None or value == '':
+        return None
+    return value.strftime('%Y-%m') if dimension == 'event_month' else str(value)
+
+
+def _keys(dimensions, values):
+    """The (institute_id, dimension, key) counters one row with `values` (a dict) counts towards."""
+    institute_id = values.get('institute_id')
+    if institute_id is None:
+        return []
+    keys = []
+    for dimension, field in dimensions:
+        key = _key(dimension, values.get(field) if field else None)
+        if key is not None:
+            keys.append((institute_id, dimension, key))
+    return keys
+
+
+def _insert(connection):
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(InstituteRollup.__table__)
+
+
+def apply_rollup_deltas(connection, deltas):
+    """Adds each {(institute_id, dimension, key): delta} to its counter in the current transaction."""
+    table = InstituteRollup.__table__
+    for (institute_id, dimension, key), delta in sorted(deltas.items()): # A fixed order, so writers lock rows alike
+        if delta:
+            stmt = _insert(connection).values(institute_id=institute_id, dimension=dimension, key=key, count=delta)
+            connection.execute(stmt.on_conflict_do_update(index_elements=['institute_id', 'dimension', 'key'],
+                                                          set_={'count': table.c.count + delta}))
+
+
+def _row_deltas(dimensions, rows, sign=1):
+    deltas = Counter()
+    for values in rows:
+        for key in _keys(dimensions, values):
+            deltas[key] += sign
+    return deltas
+
+
+def apply_alumni_rollups(connection, rows, sign=1):
+    """Counts alumni rows (dicts of column values) in, or out with sign=-1."""
+    apply_rollup_deltas(connection, _row_deltas(ALUMNI_DIMENSIONS, rows, sign))
+
+
+def apply_event_rollups(connection, rows, sign=1):
+    """Counts event rows (dicts of column values) in, or out with sign=-1."""
+    apply_rollup_deltas(connection, _row_deltas(EVENT_DIMENSIONS, rows, sign))
+
+
+def _fields(dimensions):
+    """The columns a row's counters depend on."""
+    return ['institute_id'] + [field for _, field in dimensions if field]
+
+
+def _values(target, dimensions):
+    return {field: getattr(target, field) for field in _fields(dimensions)}
+
+
+def _update_values(mapper, connection, target, dimensions):
+    """
+    The counted fields of `target` before and after this flush, or None when none
+    of them changed. Setting an attribute doesn't load its stored value; the stored
+    values that are still needed are read here, in one SELECT, and only for rows
+    whose counted fields changed.
+    """
+    state = inspect(target)
+    fields = _fields(dimensions)
+    if not any(state.attrs[field].history.has_changes() for field in fields):
+        return None
+    old, new, stored = {}, {}, []
+    for field in fields:
+        history = state.attrs[field].history
+        if history.has_changes():
+            new[field] = history.added[0] if history.added else None
+            if history.deleted:
+                old[field] = history.deleted[0]
+            else: # Set while unloaded, or it was None
+                stored.append(field)
+        elif field in state.unloaded:
+            stored.append(field)
+        else:
+            old[field] = new[field] = getattr(target, field)
+    if stored:
+        where = [column == value for column, value in zip(mapper.primary_key, state.identity)]
+        row = connection.execute(select(*[getattr(mapper.class_, field) for field in stored]).where(*where)).one()
+        for field, value in zip(stored, row):
+            old[field] = value
+            new.setdefault(field, value)
+    return old, new
+
+
+def _listen(model, dimensions):
+    def inserted(mapper, connection, target):
+        apply_rollup_deltas(connection, _row_deltas(dimensions, [_values(target, dimensions)]))
+
+    def deleted(mapper, connection, target):
+        apply_rollup_deltas(connection, _row_deltas(dimensions, [_values(target, dimensions)], -1))
+
+    def updating(mapper, connection, target):
+        values = _update_values(mapper, connection, target, dimensions)
+        if values is not None:
+            deltas = _row_deltas(dimensions, [values[1]])
+            deltas.subtract(_row_deltas(dimensions, [values[0]]))
+            apply_rollup_deltas(connection, deltas)
+
+    event.listen(model, 'after_insert', inserted)
+    event.listen(model, 'before_delete', deleted) # Before: expired attributes can still be loaded
+    event.listen(model, 'before_update', updating) # Before: the stored row still holds the old values
+
+
+_listen(Alumni, ALUMNI_DIMENSIONS)
+_listen(Event, EVENT_DIMENSIONS)
+
+
+def _expected(connection, institute_id=None):
+    """Every counter recomputed from the Alumni and Event tables."""
+    expected = Counter()
+    for model, dimensions in ((Alumni, ALUMNI_DIMENSIONS), (Event, EVENT_DIMENSIONS)):
+        scope = model.institute_id.isnot(None) if institute_id is None else model.institute_id == institute_id
+        for dimension, field in dimensions:
+            columns = [model.institute_id] + ([getattr(model, field)] if field else [])
+            for row in connection.execute(select(*columns, func.count()).where(scope).group_by(*columns)):
+                key = _key(dimension, row[1] if field else None)
+                if key is not None:
+                    expected[(row[0], dimension, key)] += row[-1]
+    return expected
+
+
+def reconcile_rollups(institute_id=None):
+    """
+    Recomputes the counters of one institute (or all) from the Alumni and Event
+    tables, corrects the ones that drifted and commits. Returns the number corrected.
+    """
+    connection = db.session.connection()
+    table = InstituteRollup.__table__
+    # Hold off other writers until we commit, so no write lands between reading the
+    # source tables and correcting the counters.
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('LOCK TABLE institute_rollup IN EXCLUSIVE MODE'))
+    else: # Any write takes SQLite's writer lock; counts below zero are always wrong anyway
+        connection.execute(delete(table).where(table.c.count < 0))
+
+    expected = _expected(connection, institute_id)
+    current = select(table.c.institute_id, table.c.dimension, table.c.key, table.c.count)
+    if institute_id is not None:
+        current = current.where(table.c.institute_id == institute_id)
+    actual = {(row[0], row[1], row[2]): row[3] for row in connection.execute(current)}
+
+    corrected, directories = 0, set()
+    for key in sorted(set(expected) | set(actual)):
+        count = expected.get(key, 0)
+        if actual.get(key) == count:
+            continue
+        corrected += 1
+        if key[1] in ('alumni', 'year'):
+            directories.add(key[0])
+        if count:
+            stmt = _insert(connection).values(institute_id=key[0], dimension=key[1], key=key[2], count=count)
+            connection.execute(stmt.on_conflict_do_update(index_elements=['institute_id', 'dimension', 'key'],
+                                                          set_={'count': count}))
+        else: # Drop counters that have fallen to zero
+            connection.execute(delete(table).where(table.c.institute_id == key[0], table.c.dimension == key[1],
+                                                   table.c.key == key[2]))
+    for institute_id in sorted(directories): # The alumni directory shows these counts
+        bump_data_versions(connection, tenant_scopes(('alumni',), institute_id))
+    db.session.commit()
+    return corrected
+
+
+def get_institute_analytics(institute_id, top=None):
+    """
+    Returns the InstituteAnalytics of one institute from its counters, with a single
+    query. With `top`, only that many of the largest majors and cities are read.
+    """
+    table = InstituteRollup.__table__
+    rank = func.row_number().over(partition_by=table.c.dimension, order_by=(table.c.count.desc(), table.c.key))
+    ranked = select(table.c.dimension, table.c.key, table.c.count, rank.label('rank')) \
+        .where(table.c.institute_id == institute_id, table.c.count > 0).subquery()
+    query = select(ranked.c.dimension, ranked.c.key, ranked.c.count).order_by(ranked.c.dimension, ranked.c.rank)
+    if top is not None:
+        query = query.where(or_(ranked.c.dimension.notin_(RANKED_DIMENSIONS), ranked.c.rank <= top))
+    counts = {}
+    for dimension, key, count in db.session.execute(query):
+        counts.setdefault(dimension, {})[key] = count # Largest first
+
+    def largest(dimension):
+        return list(counts.get(dimension, {}).items())
+
+    alumni = counts.get('alumni', {}).get('', 0)
+    complete = counts.get('profile', {}).get('complete', 0)
+    return InstituteAnalytics(alumni=alumni, complete=complete,
+                              completion_rate=complete / alumni if alumni else None,
+                              years=sorted(counts.get('year', {}).items(), key=lambda item: int(item[0])),
+                              majors=largest('major'), cities=largest('city'),
+                              events=counts.get('events', {}).get('', 0),
+                              event_months=sorted(counts.get('event_month', {}).items()))
@@ -1,98 +1,95 @@
-from flask import render_template, request, abort, redirect, url_for, flash, jsonify
+from flask import render_template, request, abort, redirect, url_for, flash, jsonify, Response, stream_with_context, send_from_directory, g
 from flask_login import current_user, login_user, logout_user, login_required
 from . import app, db, oauth
 from .utils import save_profile_picture 
+from .images import InvalidImage, photo_dir, photo_pipeline
 from .ml_utils import get_recommendations
+from .pagination import KeysetPage
+from .search import search_alumni
+from .rollups import get_institute_analytics
+from .chatbot import get_chat_client, sse_event, ChatbotBusy, ChatbotUnavailable
+from .retrieval import retrieve_context
+from .bulk_import import AlumniImporter, iter_records, detect_format
+from .export import EXPORTS, FORMATS, export_rows
+from .metrics import metrics as request_metrics, render as render_metrics
+from .page_cache import Build, cached_page
+from .passwords import INVITE_PENDING, OAUTH_ONLY, PasswordCheckBusy, invite_url, user_for_invite
+from .availability import KINDS as AVAILABILITY_KINDS, availability_index
 from app.models import Alumni, Institute, Event, User, Role
 from app.forms import (
     IndividualRegistrationForm, InstituteRegistrationForm, LoginForm, 
-    ProfileCompletionForm, AdminStudentRegistrationForm, EventForm
+    ProfileCompletionForm, AdminStudentRegistrationForm, EventForm, BulkImportForm, SetPasswordForm
 )
-from datetime import datetime, timedelta 
+from datetime import datetime 
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
-import google.generativeai as genai
+import csv
+import hmac
+import io
+import json
 import os
+import time
 import traceback 
 
-# --- CRITICAL: Automatic Database Initialization ---
-with app.app_context():
-    try:
-        if not db.engine.dialect.has_table(db.engine.connect(), "role"):
-            print("--- Database setup running (tables not found) ---")
-            db.create_all()
-            
-            # Roles
-            role_admin = Role(name='Institute_Admin')
-            role_alumnus = Role(name='Alumnus')
-            role_student = Role(name='Student')
-            db.session.add_all([role_admin, role_alumnus, role_student])
-            db.session.commit()
-
-            admin_role_id = role_admin.id
-            alumnus_role_id = role_alumnus.id
-
-            # Institute
-            main_institute = Institute(name='Main University', logo_path='logo.png')
-            db.session.add(main_institute)
-            db.session.flush() 
-            main_institute_id = main_institute.id
-
-            # Admin User
-            admin_user = User(
-                username='admin_main', 
-                email='admin@main.edu', 
-                role_id=admin_role_id,
-                institute_id=main_institute.id
-            )
-            admin_user.set_password('supersecret')
-            db.session.add(admin_user)
-
-            # Sample Data
-            sample_alumni = [
-                Alumni(name='Alice Johnson', graduation_year=2025, major='Computer Science', city='New York', phone_number='555-1234', linkedin_id='alice_j', institute_id=main_institute.id, profile_complete=True),
-                Alumni(name='Bob Smith', graduation_year=2024, major='Electrical Engineering', city='San Francisco', phone_number='555-5678', linkedin_id='bob_s', institute_id=main_institute.id, profile_complete=True),
-            ]
-            db.session.add_all(sample_alumni)
-            
-            sample_events = [
-                Event(title='Annual Gala Dinner', date_time=datetime.now() + timedelta(days=60), location='Grand Hall', institute_id=main_institute.id),
-                Event(title='Mentorship Workshop', date_time=datetime.now() + timedelta(days=90), location='Online Webinar', institute_id=main_institute.id),
-            ]
-            db.session.add_all(sample_events)
-            
-            db.session.commit()
-            print("--- LIVE DATABASE SCHEMA AND DATA SUCCESSFULLY CREATED ---")
-    except Exception as e:
-        print(f"--- Database setup skipped or failed: {e} ---")
-        db.session.rollback()
-
-
 # --- PUBLIC ROUTES ---
 @app.route('/')
 def home():
-    institute = db.session.get(Institute, 1) 
-    logo_path = institute.logo_path if institute else 'logo.png' 
-    upcoming_events = []
-    if institute:
-        upcoming_events = Event.query.filter(Event.date_time >= datetime.now()).order_by(Event.date_time).limit(2).all()
-    return render_template('index.html', institute_logo=logo_path, events=upcoming_events)
+    def build():
+        institute = db.session.get(Institute, g.institute_id) if g.institute_id is not None else None
+        logo_path = institute.logo_path if institute else 'logo.png' 
+        upcoming_events = []
+        if institute:
+            upcoming_events = _upcoming_events(now).limit(2).all()
+        return Build('index.html', dict(institute_logo=logo_path, events=upcoming_events), *_event_window(upcoming_events, now))
+    now = datetime.now()
+    return cached_page(('events', 'institutes'), build)
 
 @app.route('/events')
 def events_list():
-    all_upcoming_events = Event.query.filter(Event.date_time >= datetime.now()).order_by(Event.date_time).all()
-    return render_template('events.html', events=all_upcoming_events)
+    def build():
+        all_upcoming_events = _upcoming_events(now).all()
+        return Build('events.html', dict(events=all_upcoming_events), *_event_window(all_upcoming_events, now))
+    now = datetime.now()
+    return cached_page(('events',), build)
+
+def _upcoming_events(now):
+    return Event.query.filter(Event.date_time >= now).order_by(Event.date_time)
+
+def _event_window(events, now):
+    """When a list of upcoming events goes stale (its first event starts) and when it last changed that way."""
+    last_started = db.session.query(func.max(Event.date_time)).filter(Event.date_time < now).scalar()
+    return (events[0].date_time if events else None), last_started
 
 @app.route('/alumni', methods=['GET'])
 def alumni_directory():
     selected_year = request.args.get('year') 
-    query = Alumni.query
-    if selected_year and selected_year.isdigit():
-        filter_year = int(selected_year)
-        query = query.filter_by(graduation_year=filter_year)
-    filtered_alumni = query.order_by(Alumni.graduation_year.desc()).all()
-    all_years_query = db.session.query(Alumni.graduation_year).distinct().order_by(Alumni.graduation_year.desc())
-    graduation_years = [y[0] for y in all_years_query.all()]
-    return render_template('alumni.html', alumni=filtered_alumni, years=graduation_years, selected_year=selected_year)
+    search_query = request.args.get('q', '').strip()
+    if search_query:
+        return alumni_search(search_query, selected_year)
+    def build():
+        query = Alumni.query
+        if selected_year and selected_year.isdigit():
+            filter_year = int(selected_year)
+            query = query.filter_by(graduation_year=filter_year)
+        # Keyset page on (graduation_year, id); rows are fetched while the template streams
+        page = KeysetPage(query, (Alumni.graduation_year, Alumni.id), cursor=request.args.get('after'), per_page=app.config['DIRECTORY_PAGE_SIZE'])
+        analytics = get_institute_analytics(g.institute_id) # This institute's counts
+        year_counts = {int(year): count for year, count in analytics.years}
+        result_count = year_counts.get(int(selected_year), 0) if selected_year and selected_year.isdigit() else analytics.alumni
+        return Build('alumni.html', dict(alumni=page, page=page, years=sorted(year_counts, reverse=True), selected_year=selected_year, result_count=result_count))
+    return cached_page(('alumni',), build, stream=True)
+
+def alumni_search(search_query, selected_year):
+    """Ranked full-text results with year/major/city facet counts, from one query."""
+    selected_major = request.args.get('major') or None
+    selected_city = request.args.get('city') or None
+    filter_year = int(selected_year) if selected_year and selected_year.isdigit() else None
+    def build():
+        results = search_alumni(search_query, year=filter_year, major=selected_major, city=selected_city, institute_id=g.institute_id, limit=app.config['DIRECTORY_PAGE_SIZE'])
+        graduation_years = [year for year, _ in results.facets['year']]
+        return Build('alumni.html', dict(alumni=results.hits, search=results, q=search_query, years=graduation_years,
+                                         selected_year=selected_year, selected_major=selected_major, selected_city=selected_city))
+    return cached_page(('alumni',), build, stream=True)
 
 @app.route('/alumni/<int:alumni_id>')
 @login_required 
@@ -107,6 +104,15 @@ def alumni_profile(alumni_id):
 def register_hub():
     return render_template('register_hub.html', title='Choose Registration Type')
 
+@app.route('/api/availability')
+def availability():
+    """As-you-type checks: ?username=&email=&institute_name= -> {"username": true, ...}, true meaning free."""
+    values = {kind: request.args[kind] for kind in AVAILABILITY_KINDS if request.args.get(kind)}
+    if not values: return jsonify({'error': f"Pass one or more of {', '.join(AVAILABILITY_KINDS)}."}), 400
+    response = jsonify(availability_index.check(**values))
+    response.cache_control.no_store = True
+    return response
+
 @app.route('/register/individual', methods=['GET', 'POST'])
 def register_individual():
     if current_user.is_authenticated: return redirect(url_for('home'))
@@ -117,7 +123,7 @@ def register_individual():
             if not alumnus_role: raise Exception("Default 'Alumnus' role not found.")
             user = User(username=form.username.data, email=form.email.data, role_id=alumnus_role.id)
             user.set_password(form.password.data)
-            new_alumni_profile = Alumni(name=form.name.data, graduation_year=form.graduation_year.data, institute_id=1)
+            new_alumni_profile = Alumni(name=form.name.data, graduation_year=form.graduation_year.data, institute_id=g.institute_id)
             user.alumni_profile = new_alumni_profile
             db.session.add_all([user, new_alumni_profile])
             db.session.commit()
@@ -166,9 +172,16 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter((User.username == form.username_or_email.data) | (User.email == form.username_or_email.data)).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except PasswordCheckBusy:
+            flash('Too many people are logging in right now. Please try again in a few seconds.', 'warning')
+            return render_template('login.html', title='Log In', form=form), 503, {'Retry-After': '5'}
+        if not valid:
             flash('Invalid username/email or password', 'danger')
             return redirect(url_for('login'))
+        if db.session.is_modified(user):
+            db.session.commit() # Password hash upgraded to the current PASSWORD_HASH_METHOD
         login_user(user) 
         if user.alumni_profile and not user.alumni_profile.profile_complete:
             flash('Welcome! Please complete your profile to activate full portal access.', 'warning')
@@ -177,6 +190,22 @@ def login():
         return redirect(url_for('home'))
     return render_template('login.html', title='Log In', form=form)
 
+@app.route('/set_password/<token>', methods=['GET', 'POST'])
+def set_password(token):
+    """Where invite and reset links land: the account's owner chooses a password."""
+    user = user_for_invite(token, lambda user_id: db.session.get(User, user_id))
+    if user is None:
+        flash('That link is invalid, expired or already used. Ask your institute admin for a new one.', 'danger')
+        return redirect(url_for('login'))
+    form = SetPasswordForm()
+    if form.validate_on_submit():
+        user.set_password(form.password.data)
+        db.session.commit()
+        logout_user()
+        flash('Your password is set. Please log in.', 'success')
+        return redirect(url_for('login'))
+    return render_template('set_password.html', title='Choose a Password', form=form, user=user)
+
 @app.route('/logout')
 def logout():
     logout_user()
@@ -209,14 +238,14 @@ def google_auth():
     if user is None: 
         try:
             alumnus_role = Role.query.filter_by(name='Alumnus').first() 
-            main_institute = Institute.query.get(1)
+            main_institute = Institute.query.get(g.institute_id or app.config['DEFAULT_INSTITUTE_ID'])
             if not alumnus_role or not main_institute: raise Exception("Setup data missing")
             
             username = userinfo.get('name', email.split('@')[0]).replace(" ", "")
             new_alumni_profile = Alumni(name=userinfo.get('name', 'Google User'), graduation_year=datetime.now().year, institute_id=main_institute.id, profile_complete=False)
             
             user = User(username=username, email=email, role_id=alumnus_role.id, institute_id=main_institute.id, alumni_profile=new_alumni_profile)
-            user.set_password('GOOGLE_OAUTH_USER_NO_PASSWORD')
+            user.password_hash = OAUTH_ONLY # No password: never hashed, never matches
             
             db.session.add_all([user, new_alumni_profile])
             db.session.commit()
@@ -238,7 +267,10 @@ def complete_profile():
     if current_user.role.name not in ['Alumnus', 'Student']: return redirect(url_for('dashboard'))
     if not current_user.alumni_profile: 
         try:
-            main_institute = Institute.query.get(1)
+            main_institute = Institute.query.get(g.institute_id or app.config['DEFAULT_INSTITUTE_ID'])
+            if main_institute is None:
+                flash('There is no institute to add your profile to yet. Please contact an administrator.', 'danger')
+                return redirect(url_for('logout'))
             new_profile = Alumni(name=current_user.username, graduation_year=datetime.now().year, institute_id=main_institute.id)
             current_user.alumni_profile = new_profile
             db.session.add(new_profile)
@@ -250,19 +282,37 @@ def complete_profile():
     form = ProfileCompletionForm()
     if form.validate_on_submit():
         alumni = current_user.alumni_profile
+        try:
+            photo_file = save_profile_picture(form.photo.data, alumni.id) if form.photo.data else 'default_user.png'
+        except InvalidImage:
+            form.photo.errors.append('That file could not be read as an image.')
+            return render_template('complete_profile.html', title='Complete Profile', form=form)
         alumni.major = form.major.data
         alumni.city = form.city.data
         alumni.phone_number = form.phone_number.data
         alumni.linkedin_id = form.linkedin_id.data
-        if form.photo.data:
-            alumni.photo_file = save_profile_picture(form.photo.data, alumni.id)
-        else:
-            alumni.photo_file = 'default_user.png'
+        alumni.photo_file = photo_file
         alumni.profile_complete = True 
         db.session.commit()
         return redirect(url_for('dashboard'))
     return render_template('complete_profile.html', title='Complete Profile', form=form)
 
+@app.route('/photos/<filename>')
+def photo(filename):
+    """Processed profile photos; names are content-hashed, so they never change."""
+    directory = photo_dir(app)
+    if not os.path.exists(os.path.join(directory, filename)):
+        photo_pipeline.wait(filename.split('-', 1)[0], timeout=app.config['PHOTO_WAIT'])
+    if not os.path.exists(os.path.join(directory, filename)):
+        # Still processing (in another worker) or failed: show the placeholder, but don't let it be cached
+        response = redirect(url_for('static', filename='images/default_user.png'))
+        response.cache_control.no_store = True
+        return response
+    response = send_from_directory(directory, filename, max_age=app.config['PHOTO_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
@@ -271,18 +321,20 @@ def dashboard():
             return redirect(url_for('complete_profile'))
         return render_template('dashboard_alumni.html', title='Alumni Dashboard')
     elif current_user.role.name == 'Institute_Admin':
-        return render_template('dashboard_institute.html', title='Institute Dashboard')
+        analytics = get_institute_analytics(current_user.institute_id, top=ANALYTICS_TOP)
+        return render_template('dashboard_institute.html', title='Institute Dashboard', analytics=analytics)
     return redirect(url_for('home')) 
 
 @app.route('/recommendations')
 @login_required
 def recommendations():
     if current_user.role.name not in ['Alumnus', 'Student']: return redirect(url_for('dashboard'))
-    if Alumni.query.count() < 2: return render_template('recommendations.html', recommended_alumni=[], title='Recommended')
+    if get_institute_analytics(g.institute_id).alumni < 2: return render_template('recommendations.html', recommended_alumni=[], title='Recommended')
     
     try:
         ids = get_recommendations(current_user.alumni_id, db.session)
-        recs = Alumni.query.filter(Alumni.id.in_(ids)).all()
+        by_id = {a.id: a for a in Alumni.query.filter(Alumni.id.in_(ids)).all()} if ids else {}
+        recs = [by_id[i] for i in ids if i in by_id] # Keep the ranking order
     except: recs = []
     return render_template('recommendations.html', recommended_alumni=recs, title='Recommended Connections')
 
@@ -293,9 +345,104 @@ def admin_register_student():
     if current_user.role.name != 'Institute_Admin': abort(403)
     form = AdminStudentRegistrationForm()
     if form.validate_on_submit():
-        # (Implementation assumed from previous steps)
-        pass 
-    return render_template('admin_register_student.html', title='Register New Student', form=form)
+        errors = []
+        record = {field: getattr(form, field).data for field in ('name', 'graduation_year', 'major', 'city', 'phone_number', 'linkedin_id', 'email', 'username')}
+        with AlumniImporter(current_user.institute_id, on_error=errors.append) as importer:
+            report = importer.run([(1, record)])
+        if report.imported:
+            user = User.query.filter_by(email=record['email'].lower()).first()
+            flash(f'{form.name.data} registered successfully. Send them this link to choose a password: {invite_url(user)}', 'success')
+            return redirect(url_for('admin_register_student'))
+        flash(f'Registration failed: {errors[0].error if errors else "unknown error"}', 'danger')
+    return render_template('admin_register_student.html', title='Register New Student', form=form, import_form=BulkImportForm())
+
+@app.route('/admin/import_alumni', methods=['POST'])
+@login_required
+def admin_import_alumni():
+    """
+    Bulk import from a form upload (field `file`) or a raw text/csv or application/x-ndjson body.
+    Streams NDJSON back: one line per rejected row, a progress line per chunk, then a summary.
+    """
+    if current_user.role.name != 'Institute_Admin': abort(403)
+    if request.mimetype == 'multipart/form-data':
+        form = BulkImportForm()
+        if not form.validate_on_submit(): return jsonify({'errors': form.errors}), 400
+        upload = form.file.data
+        stream, fmt = upload.stream, detect_format(upload.filename)
+        upload.stream = io.BytesIO() # Keep the spooled file open after the view returns; lines() closes it
+    else: # Only scripts can send these types cross-origin-free, so no CSRF token is needed
+        stream, fmt = request.stream, detect_format(None, request.mimetype)
+    if fmt is None: return jsonify({'errors': {'file': ['Send a .csv or .ndjson file.']}}), 400
+
+    importer = AlumniImporter(current_user.institute_id, chunk_size=app.config['BULK_IMPORT_CHUNK_SIZE'])
+    def lines():
+        errors = []
+        importer.on_error = errors.append
+        report = None
+        with importer, stream:
+            for report in importer.iter_run(iter_records(stream, fmt)):
+                for error in errors:
+                    yield json.dumps(error._asdict()) + '\n'
+                errors.clear()
+                yield json.dumps({'progress': report._asdict()}) + '\n'
+        summary = report._asdict() if report else {'read': 0, 'imported': 0, 'rejected': 0, 'seconds': 0.0}
+        summary['rows_per_second'] = round(summary['read'] / summary['seconds'], 1) if summary['seconds'] else None
+        yield json.dumps({'summary': summary}) + '\n'
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+@app.route('/admin/invites.csv')
+@login_required
+def admin_invites():
+    """Invite links for the institute's accounts that have no password yet, as CSV for a mail merge."""
+    if current_user.role.name != 'Institute_Admin': abort(403)
+    users = User.query.filter_by(institute_id=current_user.institute_id, password_hash=INVITE_PENDING).order_by(User.id)
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('username', 'email', 'invite_url'))
+        for user in users.yield_per(500):
+            writer.writerow((user.username, user.email, invite_url(user)))
+            if buffer.tell() > 8192:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    response = Response(stream_with_context(lines()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename="invites.csv"'
+    return response
+
+@app.route('/admin/export/<kind>.<fmt>')
+@login_required
+def admin_export(kind, fmt):
+    """Streams the institute's alumni or events as CSV/NDJSON, gzip-encoded when the client accepts it."""
+    if current_user.role.name != 'Institute_Admin': abort(403)
+    if kind not in EXPORTS or fmt not in FORMATS: abort(404)
+    compress = 'gzip' in request.accept_encodings
+    response = Response(stream_with_context(export_rows(kind, fmt, current_user.institute_id, compress)), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    response.vary.add('Accept-Encoding')
+    if compress: response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+ANALYTICS_TOP = 10 # Majors and cities on the dashboard and in its charts
+ANALYTICS_CHARTS = {'years': 'years', 'majors': 'majors', 'cities': 'cities', 'events': 'event_months'}
+
+@app.route('/admin/analytics/<chart>.json')
+@login_required
+def admin_analytics(chart):
+    """One dashboard series as {labels, counts}; revalidated with its ETag, so an unchanged chart costs a 304."""
+    if current_user.role.name != 'Institute_Admin': abort(403)
+    analytics = get_institute_analytics(current_user.institute_id, top=ANALYTICS_TOP)
+    if chart == 'profile':
+        series = [('complete', analytics.complete), ('incomplete', analytics.alumni - analytics.complete)]
+    elif chart in ANALYTICS_CHARTS:
+        series = getattr(analytics, ANALYTICS_CHARTS[chart])
+    else:
+        abort(404)
+    response = jsonify(labels=[label for label, _ in series], counts=[count for _, count in series])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.route('/admin/create_event', methods=['GET', 'POST'])
 @login_required
@@ -309,17 +456,59 @@ def create_event():
         return redirect(url_for('events_list'))
     return render_template('admin_create_event.html', title='Create New Event', form=form)
 
+def _chat_context(message):
+    """Retrieved portal snippets for `message` and a Server-Timing value for the lookup."""
+    started = time.perf_counter()
+    context = retrieve_context(app, message, g.institute_id)
+    return context, f'retrieval;dur={(time.perf_counter() - started) * 1000:.2f}'
+
 @app.route('/api/chatbot', methods=['POST'])
 def chatbot_api():
-    api_key = app.config.get('GEMINI_API_KEY')
-    if not api_key: return jsonify({'reply': 'Chatbot unavailable.'}), 500
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        data = request.get_json()
-        response = model.generate_content(f"You are a helpful Alumni Assistant. User: {data.get('message')}")
-        return jsonify({'reply': response.text})
-    except: return jsonify({'reply': 'Error processing request.'}), 500
+        client = get_chat_client(app)
+        message = (request.get_json(silent=True) or {}).get('message', '')
+        context, timing = _chat_context(message)
+        response = jsonify({'reply': client.reply(message, context, g.institute_id)})
+        response.headers['Server-Timing'] = timing
+        return response
+    except ChatbotUnavailable: return jsonify({'reply': 'Chatbot unavailable.'}), 500
+    except ChatbotBusy: return jsonify({'reply': 'The assistant is busy, please try again shortly.'}), 503
+    except TimeoutError: return jsonify({'reply': 'The assistant took too long to answer.'}), 504
+    except Exception: return jsonify({'reply': 'Error processing request.'}), 500
+
+@app.route('/api/chatbot/stream', methods=['GET', 'POST'])
+def chatbot_stream():
+    """Server-Sent Events: one `data` event per chunk, then `done` (or `error`)."""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message') or request.args.get('message', '')
+    try:
+        client = get_chat_client(app)
+        context, timing = _chat_context(message)
+        chunks = client.stream(message, context, g.institute_id)
+    except ChatbotUnavailable: return jsonify({'reply': 'Chatbot unavailable.'}), 500
+    except ChatbotBusy: return jsonify({'reply': 'The assistant is busy, please try again shortly.'}), 503
+    except Exception: return jsonify({'reply': 'Error processing request.'}), 500
+
+    def events():
+        try:
+            for chunk in chunks:
+                yield sse_event({'text': chunk})
+            yield sse_event({}, event='done')
+        except TimeoutError:
+            yield sse_event({'reply': 'The assistant took too long to answer.'}, event='error')
+        except Exception:
+            yield sse_event({'reply': 'Error processing request.'}, event='error')
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Server-Timing': timing})
+
+# --- METRICS ---
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request metrics of every worker in the Prometheus text format."""
+    token = app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'): abort(403)
+    return Response(render_metrics(request_metrics.collect()), mimetype='text/plain; version=0.0.4')
 
 @app.errorhandler(404)
 def not_found_error(error): return render_template('404.html'), 404
@@ -0,0 +1,137 @@
+# app/search.py
+
+import re
+from collections import namedtuple
+from sqlalchemy import text, inspect
+from app import db
+
+# --- Alumni full-text search ---
+# SQLite: an FTS5 external-content table over alumni(name, major, city), kept in
+#         sync by triggers so every write path (ORM, bulk inserts, raw SQL) is covered.
+# Postgres: a generated tsvector column on alumni with a GIN index.
+# One statement returns the ranked hits and the year/major/city facet counts.
+
+SearchHit = namedtuple('SearchHit', 'id name major city graduation_year')
+SearchResult = namedtuple('SearchResult', 'hits facets total')
+
+FACET_LIMIT = 10  # Values shown per major/city facet
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS alumni_fts USING fts5(
+        name, major, city, content='alumni', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS alumni_fts_ai AFTER INSERT ON alumni BEGIN
+        INSERT INTO alumni_fts(rowid, name, major, city) VALUES (new.id, new.name, new.major, new.city);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS alumni_fts_ad AFTER DELETE ON alumni BEGIN
+        INSERT INTO alumni_fts(alumni_fts, rowid, name, major, city) VALUES ('delete', old.id, old.name, old.major, old.city);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS alumni_fts_au AFTER UPDATE OF name, major, city ON alumni BEGIN
+        INSERT INTO alumni_fts(alumni_fts, rowid, name, major, city) VALUES ('delete', old.id, old.name, old.major, old.city);
+        INSERT INTO alumni_fts(rowid, name, major, city) VALUES (new.id, new.name, new.major, new.city);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    """ALTER TABLE alumni ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(major, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(city, '')), 'B')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_alumni_search_vector ON alumni USING GIN (search_vector)",
+]
+
+
+def ensure_search_index(engine=None):
+    """Creates the full-text index for the current backend if it does not exist yet."""
+    engine = engine or db.engine
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == 'sqlite':
+            created = not inspect(conn).has_table('alumni_fts')
+            for ddl in _SQLITE_DDL:
+                conn.execute(text(ddl))
+            if created: # Index rows that existed before the FTS table
+                conn.execute(text("INSERT INTO alumni_fts(alumni_fts) VALUES ('rebuild')"))
+        elif dialect == 'postgresql':
+            for ddl in _POSTGRES_DDL:
+                conn.execute(text(ddl))
+
+
+def rebuild_search_index(engine=None):
+    """Re-indexes every alumnus (SQLite only; the Postgres column is always current)."""
+    engine = engine or db.engine
+    ensure_search_index(engine)
+    if engine.dialect.name == 'sqlite':
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO alumni_fts(alumni_fts) VALUES ('rebuild')"))
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _match_clause(dialect, query, params):
+    """Returns (FROM/WHERE fragment, rank expression) matching every term as a prefix."""
+    terms = _terms(query)
+    if dialect == 'postgresql':
+        params['q'] = ' & '.join(f'{t}:*' for t in terms)
+        return ("FROM alumni a WHERE a.search_vector @@ to_tsquery('simple', :q)",
+                "-ts_rank_cd(a.search_vector, to_tsquery('simple', :q))")
+    params['q'] = ' AND '.join(f'"{t}"*' for t in terms)
+    return ("FROM alumni_fts JOIN alumni a ON a.id = alumni_fts.rowid WHERE alumni_fts MATCH :q",
+            "bm25(alumni_fts, 10.0, 5.0, 5.0)")
+
+
+def search_alumni(query, year=None, major=None, city=None, institute_id=None, limit=30):
+    """
+    Full-text search over alumni name, major and city, optionally narrowed by facet
+    values and to one institute (raw SQL, so tenant scoping does not apply by itself).
+    Returns SearchResult(hits, facets, total) where `hits` are ranked best first and
+    `facets` maps 'year'/'major'/'city' to [(value, count), ...].
+    """
+    if not _terms(query):
+        return SearchResult([], {'year': [], 'major': [], 'city': []}, 0)
+
+    dialect = db.engine.dialect.name
+    params = {'limit': limit, 'facet_limit': FACET_LIMIT}
+    source, rank = _match_clause(dialect, query, params)
+    if institute_id is not None:
+        source += " AND a.institute_id = :institute_id"
+        params['institute_id'] = institute_id
+    if year is not None:
+        source += " AND a.graduation_year = :year"
+        params['year'] = year
+    if major:
+        source += " AND a.major = :major"
+        params['major'] = major
+    if city:
+        source += " AND a.city = :city"
+        params['city'] = city
+
+    # Hits and facets share one column layout so they come back in a single UNION ALL
+    sql = f"""
+        WITH matches AS (
+            SELECT a.id, a.name, a.major, a.city, a.graduation_year, {rank} AS rank {source}
+        )
+        SELECT * FROM (SELECT 'hit' AS kind, id, name, major, city, graduation_year, rank AS score
+                       FROM matches ORDER BY rank LIMIT :limit) hits
+        UNION ALL
+        SELECT 'year', NULL, NULL, NULL, NULL, graduation_year, COUNT(*) FROM matches GROUP BY graduation_year
+        UNION ALL
+        SELECT * FROM (SELECT 'major' AS kind, NULL AS id, NULL AS name, major, NULL AS city, NULL AS graduation_year, COUNT(*) AS score
+                       FROM matches WHERE major IS NOT NULL GROUP BY major ORDER BY COUNT(*) DESC LIMIT :facet_limit) majors
+        UNION ALL
+        SELECT * FROM (SELECT 'city' AS kind, NULL AS id, NULL AS name, NULL AS major, city, NULL AS graduation_year, COUNT(*) AS score
+                       FROM matches WHERE city IS NOT NULL GROUP BY city ORDER BY COUNT(*) DESC LIMIT :facet_limit) cities
+    """
+    hits, facets = [], {'year': [], 'major': [], 'city': []}
+    for row in db.session.execute(text(sql), params):
+        if row.kind == 'hit':
+            hits.append(SearchHit(row.id, row.name, row.major, row.city, row.graduation_year))
+        elif row.kind == 'year':
+            facets['year'].append((row.graduation_year, int(row.score)))
+        else:
+            facets[row.kind].append((getattr(row, row.kind), int(row.score)))
+
+    facets['year'].sort(reverse=True)
+    total = sum(count for _, count in facets['year'])
+    return SearchResult(hits, facets, total)
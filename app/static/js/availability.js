@@ -0,0 +1,24 @@
+// As-you-type availability hints for inputs marked data-availability="username|email|institute_name"
+document.querySelectorAll('[data-availability]').forEach(function (input) {
+    var kind = input.dataset.availability, timer = null;
+    var hint = document.createElement('span');
+    hint.className = 'error availability-hint';
+    input.closest('p').after(hint);
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        hint.textContent = '';
+        var value = input.value.trim();
+        if (!value) return;
+        timer = setTimeout(function () {
+            fetch('/api/availability?' + new URLSearchParams({[kind]: input.value}))
+                .then(function (response) { return response.ok ? response.json() : {}; })
+                .then(function (result) {
+                    if (input.value.trim() === value && result[kind] === false) {
+                        hint.textContent = kind === 'email' ? 'That email is already registered.'
+                            : kind === 'username' ? 'That username is taken.' : 'That institute is already registered.';
+                    }
+                })
+                .catch(function () {});
+        }, 300);
+    });
+});
@@ -0,0 +1,117 @@
+# app/synthetic.py
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from app import db
+from app.models import Alumni, Event, Institute, Role, User
+from app.page_cache import bump_data_versions, tenant_scopes
+from app.rollups import apply_event_rollups
+from app.bulk_import import record_alumni_inserted
+from app.passwords import hash_password
+
+# --- Synthetic data ---
+# Fills the database with a reproducible population for load testing: the same
+# seed and volumes always produce the same rows. Everything is written with
+# multi-row INSERTs, one transaction per CHUNK_SIZE alumni; record_alumni_inserted()
+# keeps the rollups, page caches and in-memory indexes in step. Every user shares one password
+# (hashed once); usernames are "synth<seed>-u<n>" for alumni and
+# "synth<seed>-admin<n>" for institute admins, which is what `flask bench routes`
+# logs in as.
+
+CHUNK_SIZE = 5000
+
+FIRST_NAMES = ('Aarav Aditi Alice Amara Ana Arjun Ben Carlos Chen Chloe Daniel Diya Elena Emeka Fatima Hana '
+               'Ibrahim Isha James Jun Kavya Kenji Lara Leila Liam Lucas Maria Mateo Mei Mohammed Nadia Noah '
+               'Olivia Omar Priya Rahul Rohan Sara Sofia Tariq Uma Victor Wei Yara Yusuf Zara').split()
+LAST_NAMES = ('Adeyemi Ahmed Bauer Chen Costa Das Dubois Fernandes Garcia Gupta Haddad Ito Iyer Jensen Kim '
+              'Kowalski Kumar Lee Lopez Martin Mehta Moreau Muller Nakamura Nair Nguyen Novak Okafor Patel '
+              'Petrov Reddy Rossi Santos Schmidt Shah Silva Singh Smith Suzuki Tanaka Wang Williams Yilmaz').split()
+MAJORS = ('Computer Science', 'Electrical Engineering', 'Mechanical Engineering', 'Civil Engineering',
+          'Chemical Engineering', 'Biotechnology', 'Mathematics', 'Physics', 'Chemistry', 'Economics',
+          'Business Administration', 'Finance', 'Accounting', 'Marketing', 'Psychology', 'Sociology',
+          'Political Science', 'History', 'English Literature', 'Philosophy', 'Architecture', 'Design',
+          'Medicine', 'Nursing', 'Pharmacy', 'Law', 'Data Science', 'Information Technology',
+          'Aerospace Engineering', 'Environmental Science')
+CITIES = ('Mumbai', 'Delhi', 'Bengaluru', 'Hyderabad', 'Chennai', 'Pune', 'Kolkata', 'Ahmedabad', 'Jaipur',
+          'Kochi', 'New York', 'San Francisco', 'Seattle', 'Austin', 'Boston', 'Chicago', 'Toronto',
+          'Vancouver', 'London', 'Manchester', 'Berlin', 'Munich', 'Paris', 'Amsterdam', 'Dublin', 'Zurich',
+          'Dubai', 'Singapore', 'Tokyo', 'Seoul', 'Sydney', 'Melbourne', 'Nairobi', 'Lagos', 'Sao Paulo')
+EVENT_KINDS = ('Annual Reunion', 'Mentorship Workshop', 'Career Fair', 'Tech Talk', 'Networking Evening',
+               'Homecoming', 'Startup Pitch Night', 'Alumni Webinar', 'Sports Day', 'Gala Dinner')
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def _alumni_rows(rng, start, stop, institute_ids, current_year):
+    rows = []
+    for n in range(start, stop):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append({'name': f'{first} {last}', 'graduation_year': rng.randint(current_year - 50, current_year + 4),
+                     'major': rng.choice(MAJORS), 'city': rng.choice(CITIES),
+                     'phone_number': f'555-{rng.randrange(10 ** 7):07d}', 'linkedin_id': f'{first}-{last}-{n + 1}'.lower(),
+                     'institute_id': rng.choice(institute_ids), 'profile_complete': True})
+    return rows
+
+
+def generate_dataset(seed=1, institutes=10, alumni=10000, events=50, password='Password123', progress=None):
+    """
+    Writes `institutes` institutes (each with one admin), `alumni` alumni with one
+    user each and `events` events per institute, spread a year either side of today.
+    `progress(alumni_written)` is called after every committed chunk.
+    Returns a dict of row counts and the elapsed seconds.
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    prefix = f'synth{seed}'
+    roles = dict(db.session.execute(select(Role.name, Role.id)).all())
+    missing = {'Institute_Admin', 'Alumnus', 'Student'} - roles.keys()
+    if missing:
+        raise ValueError(f"Roles {', '.join(sorted(missing))} are missing; run `flask init-db` first")
+    if db.session.execute(select(User.id).where(User.username == f'{prefix}-admin1')).first():
+        raise ValueError(f'Seed {seed} has already been generated into this database')
+
+    password_hash = hash_password(password)
+    institute_ids = db.session.execute(
+        insert(Institute).returning(Institute.id, sort_by_parameter_order=True),
+        [{'name': f'Synthetic Institute {i} ({prefix})', 'logo_path': 'logo.png'} for i in range(1, institutes + 1)]
+    ).scalars().all()
+    db.session.execute(insert(User), [
+        {'username': f'{prefix}-admin{i}', 'email': f'admin{i}@{prefix}.example.org', 'password_hash': password_hash,
+         'role_id': roles['Institute_Admin'], 'institute_id': institute_id}
+        for i, institute_id in enumerate(institute_ids, 1)])
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    event_rows = [
+        {'title': f'{rng.choice(EVENT_KINDS)} {n}', 'description': f'Synthetic event {n} for load testing.',
+         'date_time': now + timedelta(hours=rng.randint(-365 * 24, 365 * 24)), 'location': rng.choice(CITIES),
+         'institute_id': institute_id}
+        for institute_id in institute_ids for n in range(1, events + 1)]
+    db.session.execute(insert(Event), event_rows)
+    apply_event_rollups(db.session.connection(), event_rows)
+    bump_data_versions(db.session.connection(), [scope for institute_id in institute_ids
+                                                 for scope in tenant_scopes(('institutes', 'events'), institute_id)])
+    db.session.commit()
+
+    current_year = now.year
+    for start, stop in _chunks(alumni, CHUNK_SIZE):
+        rows = _alumni_rows(rng, start, stop, institute_ids, current_year)
+        ids = db.session.execute(insert(Alumni).returning(Alumni.id, sort_by_parameter_order=True), rows).scalars().all()
+        db.session.execute(insert(User), [
+            {'username': f'{prefix}-u{n}', 'email': f'u{n}@{prefix}.example.org', 'password_hash': password_hash,
+             'role_id': roles['Student' if row['graduation_year'] > current_year else 'Alumnus'],
+             'alumni_id': alumni_id, 'institute_id': row['institute_id']}
+            for n, row, alumni_id in zip(range(start + 1, stop + 1), rows, ids)])
+
+        record_alumni_inserted(db.session, [dict(row, id=alumni_id) for row, alumni_id in zip(rows, ids)])
+        db.session.commit()
+        if progress:
+            progress(stop)
+
+    return {'institutes': institutes, 'admins': institutes, 'alumni': alumni, 'events': events * institutes,
+            'seconds': time.perf_counter() - started}
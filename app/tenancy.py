@@ -0,0 +1,66 @@
+# app/tenancy.py
+
+from flask import g, has_request_context, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import with_loader_criteria
+from app import app, db
+from app.db_routing import RoutingSession
+from app.models import Alumni, Event, Institute
+
+# --- Tenant scoping ---
+# Every request belongs to one institute (the tenant). It is resolved once, before
+# the view runs, and kept in g.institute_id:
+#   - a logged-in user: their own institute (an admin's, or their alumni profile's);
+#   - a visitor: the one picked with ?institute=<id>, which the session remembers
+#     once it is known to exist, or DEFAULT_INSTITUTE_ID.
+# While a request is scoped, every ORM SELECT that touches Alumni or Event gets
+# "institute_id = <tenant>" added through with_loader_criteria. This includes
+# Session.get and relationship loads, so another institute's rows are simply not
+# there. Writes are not filtered. A query that has to see every institute, such as
+# one that builds a shared in-memory index, opts out with
+# .execution_options(all_tenants=True). Raw SQL is never rewritten and must filter
+# itself (see search_alumni).
+
+TENANT_MODELS = (Alumni, Event)
+SESSION_KEY = 'institute_id'
+UNSCOPED_ENDPOINTS = ('static', 'photo', 'prometheus_metrics')
+
+
+def resolve_institute_id():
+    """The institute the current request works in (None for a user without one)."""
+    if current_user.is_authenticated:
+        if current_user.institute_id is not None:
+            return current_user.institute_id
+        profile = current_user.alumni_profile
+        return profile.institute_id if profile is not None else None
+    chosen = request.args.get('institute', type=int)
+    if chosen is not None and session.get(SESSION_KEY) != chosen:
+        if db.session.get(Institute, chosen) is not None: # Checked once, when picked
+            session[SESSION_KEY] = chosen
+        else:
+            session.pop(SESSION_KEY, None)
+    return session.get(SESSION_KEY, app.config.get('DEFAULT_INSTITUTE_ID', 1))
+
+
+def current_institute_id():
+    """The tenant of the current request, or None outside one (CLI commands, background jobs)."""
+    return g.get('institute_id') if has_request_context() else None
+
+
+@app.before_request
+def scope_to_institute():
+    if request.endpoint not in UNSCOPED_ENDPOINTS:
+        g.institute_id = resolve_institute_id()
+        g.tenant_scoped = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _add_tenant_criteria(state):
+    if (not state.is_select or state.is_column_load or state.is_relationship_load
+            or state.execution_options.get('all_tenants') or not has_request_context() or not g.get('tenant_scoped')):
+        return
+    institute_id = g.institute_id
+    state.statement = state.statement.options(*(
+        with_loader_criteria(model, lambda cls: cls.institute_id == institute_id, include_aliases=True)
+        for model in TENANT_MODELS))
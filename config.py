@@ -2,6 +2,43 @@ import os
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def database_url(url):
+    """Normalises a DATABASE_URL-style Postgres URL (driver, SSL); SQLite URLs pass through."""
+    if url.startswith('sqlite'):
+        return url
+    url = url.replace('postgres://', 'postgresql://', 1).replace('postgresql://', 'postgresql+psycopg2://', 1)
+    # Force SSL
+    if '?sslmode=' not in url:
+        url = url + '?sslmode=require'
+    return url
+
+
+def engine_options(url):
+    """SQLAlchemy engine options for `url`, tuned per dialect."""
+    if url.startswith('sqlite'):
+        # A local file: nothing to ping or recycle. Writers queue on the file lock for
+        # `timeout` seconds; the pragmas in SQLITE_PRAGMAS are set per connection.
+        return {
+            "pool_size": int(os.environ.get('DB_POOL_SIZE', 10)),
+            "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+            "pool_timeout": 30,
+            "connect_args": {"timeout": float(os.environ.get('SQLITE_BUSY_TIMEOUT', 15))},
+        }
+    options = {
+        "pool_pre_ping": True,        # Pings DB before query to revive connection
+        "pool_recycle": 300,          # Recycle connections every 5 minutes
+        "pool_timeout": 30,           # Wait 30s for a connection
+        "pool_size": int(os.environ.get('DB_POOL_SIZE', 10)),      # Per process: size it with the worker count
+        "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        "pool_use_lifo": True,        # Reuse warm connections; idle extras time out server-side
+        "query_cache_size": int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 1000)),  # Compiled SQL kept per engine
+    }
+    if os.environ.get('DB_STATEMENT_TIMEOUT_MS'):
+        options["connect_args"] = {"options": f"-c statement_timeout={int(os.environ['DB_STATEMENT_TIMEOUT_MS'])}"}
+    return options
+
+
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a_very_hard_to_guess_secret_key_local'
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
@@ -10,28 +47,102 @@ class Config(object):
     # Database URI Logic
     DB_URL = os.environ.get('DATABASE_URL')
     if DB_URL:
-        # Ensure correct driver and scheme
-        DB_URL = DB_URL.replace('postgres://', 'postgresql://', 1)
-        SQLALCHEMY_DATABASE_URI = DB_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
-        
-        # Force SSL
-        if '?sslmode=' not in SQLALCHEMY_DATABASE_URI:
-             SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI + '?sslmode=require'
+        SQLALCHEMY_DATABASE_URI = database_url(DB_URL)
     else:
         SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'site.db')
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    # --- Keep-Alive Options ---
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_pre_ping": True,        # Pings DB before query to revive connection
-        "pool_recycle": 300,          # Recycle connections every 5 minutes
-        "pool_timeout": 30,           # Wait 30s for a connection
-        "pool_size": 10,
-        "max_overflow": 5,
+    # --- Connection pool / driver options (per dialect) ---
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',    # Readers no longer block on (or block) the writer
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),  # Durable at checkpoints; safe with WAL
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # Bytes read through mmap
     }
+
+    # --- Read replica (GET requests read from it; see app/db_routing.py) ---
+    REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')  # e.g. a second SQLite file kept current with `flask sync-replica`
+    SQLALCHEMY_BINDS = {'replica': dict(engine_options(database_url(REPLICA_URL)), url=database_url(REPLICA_URL))} if REPLICA_URL else {}
+    REPLICA_PIN_SECONDS = float(os.environ.get('REPLICA_PIN_SECONDS', 5))  # Clients that wrote read from the primary this long
     # ----------------------------------------
 
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
-    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
\ No newline at end of file
+    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+
+    # --- Identity cache (login user loader) ---
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 1024))
+    # Adds an X-Query-Count header with the number of SQL statements per request
+    QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', 'False').lower() == 'true'
+
+    # Alumni shown per directory page
+    DIRECTORY_PAGE_SIZE = int(os.environ.get('DIRECTORY_PAGE_SIZE', 30))
+
+    # --- Recommendations ---
+    # Seconds between checks for a newly published recommendation index
+    RECS_RELOAD_INTERVAL = int(os.environ.get('RECS_RELOAD_INTERVAL', 30))
+    # Seconds between background full rebuilds of the index (0 disables them)
+    RECS_REBUILD_INTERVAL = int(os.environ.get('RECS_REBUILD_INTERVAL', 3600))
+
+    # --- Chatbot ---
+    # 'gemini' (the default when GEMINI_API_KEY is set) or 'fake' for an offline stand-in
+    CHATBOT_BACKEND = os.environ.get('CHATBOT_BACKEND')
+    CHATBOT_MODEL = os.environ.get('CHATBOT_MODEL', 'gemini-2.5-flash')
+    # Upstream calls allowed in flight per process; further requests get a 503
+    CHATBOT_MAX_CONCURRENCY = int(os.environ.get('CHATBOT_MAX_CONCURRENCY', 4))
+    # Seconds to wait for a reply (or between streamed chunks) before giving up
+    CHATBOT_TIMEOUT = float(os.environ.get('CHATBOT_TIMEOUT', 30))
+    CHATBOT_FAKE_LATENCY = float(os.environ.get('CHATBOT_FAKE_LATENCY', 0.5))
+    CHATBOT_FAKE_TOKEN_DELAY = float(os.environ.get('CHATBOT_FAKE_TOKEN_DELAY', 0.02))
+    # Response cache: 'memory' (per process), 'sqlite' (shared by the workers on a host) or 'none'
+    CHATBOT_CACHE = os.environ.get('CHATBOT_CACHE', 'memory')
+    CHATBOT_CACHE_PATH = os.environ.get('CHATBOT_CACHE_PATH')  # Defaults to instance/chatbot_cache.sqlite
+    CHATBOT_CACHE_TTL = int(os.environ.get('CHATBOT_CACHE_TTL', 86400))
+    CHATBOT_CACHE_SIZE = int(os.environ.get('CHATBOT_CACHE_SIZE', 1024))
+
+    # --- Chatbot retrieval (portal data put into the prompt) ---
+    RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', 5))           # Snippets per prompt
+    RETRIEVAL_MAX_CHARS = int(os.environ.get('RETRIEVAL_MAX_CHARS', 1200)) # Characters of snippets per prompt
+    # Seconds between full rebuilds, which pick up writes made by other workers
+    RETRIEVAL_REFRESH_INTERVAL = int(os.environ.get('RETRIEVAL_REFRESH_INTERVAL', 300))
+
+    # --- Profile photos ---
+    PHOTO_SIZES = (48, 100, 200, 400)   # Square sizes generated per upload, in pixels
+    PHOTO_WORKERS = int(os.environ.get('PHOTO_WORKERS', 2))       # Resizing threads per process
+    PHOTO_WAIT = float(os.environ.get('PHOTO_WAIT', 5))           # Seconds /photos waits for a photo still processing
+    PHOTO_MAX_AGE = int(os.environ.get('PHOTO_MAX_AGE', 31536000)) # Photo names are content-hashed, so a year is safe
+
+    # --- Bulk alumni import ---
+    BULK_IMPORT_CHUNK_SIZE = int(os.environ.get('BULK_IMPORT_CHUNK_SIZE', 1000))  # Rows per transaction
+    BULK_IMPORT_WORKERS = int(os.environ['BULK_IMPORT_WORKERS']) if os.environ.get('BULK_IMPORT_WORKERS') else None  # Hashing processes of `flask alumni import` (default: CPU count)
+
+    # --- Request metrics (/metrics) and slow-query log ---
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # Per-worker snapshots are summed from here; gunicorn.conf.py sets it
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))  # Seconds between snapshot writes
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # When set, /metrics needs "Authorization: Bearer <token>"
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))  # Statements at least this slow are logged; 0 turns it off
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')  # File for the slow-query log (default: the app's log output)
+
+    # --- Page cache (home, events, alumni directory) ---
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 256))  # Rendered pages kept per institute and process; 0 turns caching off (ETags still work)
+    PAGE_CACHE_TENANTS = int(os.environ.get('PAGE_CACHE_TENANTS', 64))  # Institutes with cached pages per process (least recently used dropped)
+
+    # --- Static assets (fingerprinted, precompressed; see app/assets.py) ---
+    ASSET_FINGERPRINTS = os.environ.get('ASSET_FINGERPRINTS', 'True').lower() == 'true'  # Always off in debug mode
+    ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 31536000))  # Fingerprinted names never change content
+
+    # --- Password hashing (see app/passwords.py) ---
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')  # werkzeug method, e.g. scrypt:32768:8:1 or pbkdf2:sha256:1000000
+    PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', 1))  # Hashing processes per web worker; 0 checks inline
+    PASSWORD_MAX_PENDING = int(os.environ.get('PASSWORD_MAX_PENDING', 16))  # Checks queued per web worker before logins get a 503
+    PASSWORD_TIMEOUT = float(os.environ.get('PASSWORD_TIMEOUT', 10))  # Seconds a login waits for its check
+    INVITE_MAX_AGE = int(os.environ.get('INVITE_MAX_AGE', 604800))  # Seconds an invite / password reset link stays valid
+
+    # --- Username / email availability API (see app/availability.py) ---
+    AVAILABILITY_REFRESH = float(os.environ.get('AVAILABILITY_REFRESH', 5))  # Seconds between reads of other workers' new users
+    AVAILABILITY_FALSE_POSITIVE_RATE = float(os.environ.get('AVAILABILITY_FALSE_POSITIVE_RATE', 0.01))  # Free values that still cost a query
+
+    # --- Tenant scoping (see app/tenancy.py) ---
+    DEFAULT_INSTITUTE_ID = int(os.environ.get('DEFAULT_INSTITUTE_ID', 1))  # Institute shown to visitors who have not picked one
\ No newline at end of file
@@ -0,0 +1,70 @@
+# gunicorn.conf.py
+# Usage: gunicorn run:app
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+
+# Threaded workers: a request waiting on the chatbot (or streaming its reply) holds
+# one thread, not the whole worker, so directory pages keep being served. The chat
+# client caps its own in-flight calls below this (CHATBOT_MAX_CONCURRENCY).
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Seconds a worker may stay silent before it is restarted
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+# --- Preloading (copy-on-write) ---
+# With GUNICORN_PRELOAD=1 the app is imported once in the master and the workers
+# are forked from it, sharing the imported code and data pages instead of each
+# importing everything again. GUNICORN_PRELOAD_ML=1 also imports the numeric stack
+# (numpy/scipy, otherwise loaded by a worker on its first recommendation or chat
+# request) in the master. Code changes then need a full restart, not a HUP.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+preload_ml = os.environ.get('GUNICORN_PRELOAD_ML', '').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    if preload_app:
+        from app.assets import manifest
+        manifest.load() # Fingerprint and compress static files once, before forking
+    if preload_app and preload_ml:
+        from app.ml_utils import _import_numeric
+        _import_numeric()
+        import numpy # Used by the chatbot retrieval index
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's reach: a GC pass in a
+    # worker would otherwise touch (and so copy) every shared object's header
+    import gc
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Fork the password hashing processes now, while the worker has a single thread
+    from app.passwords import password_checker
+    password_checker.start()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the workers;
+    # drop them from each worker's pool without closing the master's sockets
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+# --- Metrics ---
+# Workers write their request metrics here and /metrics sums them (see app/metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics'))
+
+
+def on_starting(server):
+    # Snapshots of a previous run's workers would otherwise be counted again
+    import glob
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
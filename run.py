@@ -3,6 +3,12 @@
 from app import app
 
 if __name__ == '__main__':
+    # The development server sets up (and seeds) the database itself; in production run `flask init-db` once
+    from app.bootstrap import init_database
+    with app.app_context():
+        init_database()
+    from app.passwords import password_checker
+    password_checker.start() # Before the threaded server starts, so the hashing processes can be forked
     # Use host='0.0.0.0' to be accessible on local network if needed
     # Port can be specified e.g., app.run(debug=True, port=5001)
     app.run(debug=app.config['DEBUG'])
\ No newline at end of file
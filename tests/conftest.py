@@ -0,0 +1,62 @@
+# tests/conftest.py
+
+import os
+import tempfile
+
+import pytest
+
+# The app reads its configuration when it is first imported, so the scratch
+# database and the test settings go into the environment before that.
+_scratch = tempfile.mkdtemp(prefix='alumni-portal-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(_scratch, 'portal.db'),
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',  # Cheap hashes
+    'PASSWORD_WORKERS': '0',                        # Checked inline; no processes to fork
+    'CHATBOT_BACKEND': 'fake',
+    'CHATBOT_CACHE': 'none',
+    'RECS_REBUILD_INTERVAL': '0',
+    'METRICS_DIR': os.path.join(_scratch, 'metrics'),
+})
+
+from sqlalchemy import select  # noqa: E402
+from app import app as flask_app, db  # noqa: E402
+from app.bootstrap import init_database  # noqa: E402
+from app.models import Institute  # noqa: E402
+from app.synthetic import generate_dataset  # noqa: E402
+
+PASSWORD = 'Password123' # Every synthetic user's
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        init_database()
+    return flask_app
+
+
+@pytest.fixture(scope='session')
+def institutes(app):
+    """The ids of two synthetic institutes, with alumni (users synth1-u<n>), events and admins (synth1-admin<n>)."""
+    with app.app_context():
+        generate_dataset(seed=1, institutes=2, alumni=60, events=6, password=PASSWORD)
+        ids = db.session.execute(select(Institute.id).where(Institute.name.like('Synthetic Institute %'))
+                                 .order_by(Institute.id)).scalars().all()
+        db.session.remove()
+    return ids
+
+
+@pytest.fixture
+def session(app):
+    with app.app_context():
+        yield db.session
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username, password=PASSWORD):
+    return client.post('/login', data={'username_or_email': username, 'password': password})
@@ -0,0 +1,69 @@
+# tests/test_passwords.py
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import passwords
+from app.bootstrap import LEGACY_OAUTH_PASSWORD, migrate_legacy_oauth_hashes
+from app.models import User
+from app.passwords import INVITE_PENDING, OAUTH_ONLY, PasswordChecker, hash_method, needs_rehash
+from tests.conftest import login
+
+OLD_METHOD = 'pbkdf2:sha256:2000' # Anything but the configured PASSWORD_HASH_METHOD
+
+
+def _user(session, username, password_hash):
+    user = User(username=username, email=f'{username}@example.org', password_hash=password_hash)
+    session.add(user)
+    session.commit()
+    return user
+
+
+def test_login_rehashes_with_the_configured_method(session, client):
+    user = _user(session, 'rehash-me', generate_password_hash('hunter22', OLD_METHOD))
+    assert needs_rehash(user.password_hash)
+
+    assert not login(client, 'rehash-me', 'hunter22').location.endswith('/login')
+    session.refresh(user)
+    assert user.password_hash.startswith(hash_method() + '$')
+    assert not needs_rehash(user.password_hash)
+    assert check_password_hash(user.password_hash, 'hunter22')
+
+
+def test_failed_login_keeps_the_stored_hash(session, client):
+    stored = generate_password_hash('hunter22', OLD_METHOD)
+    user = _user(session, 'wrong-guess', stored)
+
+    assert login(client, 'wrong-guess', 'hunter23').location.endswith('/login')
+    session.refresh(user)
+    assert user.password_hash == stored
+
+
+def test_accounts_without_a_password_never_match(session):
+    checker = PasswordChecker(workers=0)
+    for marker in (OAUTH_ONLY, INVITE_PENDING, None, ''):
+        user = User(username='nobody', email='nobody@example.org', password_hash=marker)
+        assert not checker.verify(user, marker or '')
+        assert user.password_hash == marker
+
+
+def test_checks_run_inline_when_the_process_cannot_fork(monkeypatch):
+    monkeypatch.setattr(passwords, 'can_fork', lambda: False)
+    checker = PasswordChecker(workers=2)
+    user = User(username='inline', email='inline@example.org', password_hash=generate_password_hash('pw', OLD_METHOD))
+    assert checker.verify(user, 'pw')
+    assert checker.pool is None
+    assert not needs_rehash(user.password_hash)
+
+
+def test_legacy_oauth_hashes_become_oauth_only(session, client):
+    legacy = _user(session, 'legacy-google', generate_password_hash(LEGACY_OAUTH_PASSWORD, OLD_METHOD))
+    regular = _user(session, 'regular', generate_password_hash('hunter22', OLD_METHOD))
+    regular_hash = regular.password_hash
+
+    assert migrate_legacy_oauth_hashes() == 1
+    session.commit()
+    session.refresh(legacy)
+    session.refresh(regular)
+    assert legacy.password_hash == OAUTH_ONLY
+    assert regular.password_hash == regular_hash
+    assert login(client, 'legacy-google', LEGACY_OAUTH_PASSWORD).location.endswith('/login')
@@ -0,0 +1,100 @@
+# tests/test_recommendations.py
+
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.ml_utils import _build_partition, _import_numeric, build_index, index_holder
+from app.models import Alumni
+
+MAJORS = ('Law', 'Physics', 'History', 'Design', 'Finance')
+CITIES = ('Oslo', 'Lagos', 'Pune', 'Lima')
+
+
+def _rows(ids, seed):
+    rng = random.Random(seed)
+    return [SimpleNamespace(id=i, major=rng.choice(MAJORS), city=rng.choice(CITIES),
+                            graduation_year=rng.randint(1990, 2020)) for i in ids]
+
+
+def _features(row):
+    return row.major, row.city, row.graduation_year
+
+
+def _partition(rows):
+    _import_numeric()
+    return _build_partition(sorted(rows, key=lambda row: row.id), 1, time.time())
+
+
+def test_batch_matches_a_rebuild():
+    rows = _rows(range(1, 401, 2), seed=1)
+    index = _partition(rows)
+    added, updated, removed = _rows(range(2, 80, 2), seed=2), _rows(range(1, 40, 2), seed=3), list(range(41, 81, 2))
+    changes = {row.id: _features(row) for row in added + updated}
+    changes.update(dict.fromkeys(removed))
+    index.apply(changes)
+
+    final = {row.id: row for row in rows}
+    final.update((row.id, row) for row in added + updated)
+    for alumni_id in removed:
+        del final[alumni_id]
+    reference = _partition(final.values())
+
+    assert np.array_equal(index.ids, reference.ids)
+    assert abs(index.matrix - reference.matrix).max() < 1e-6
+    assert not np.isin(index.neighbours, removed).any()
+    for row in added + updated: # Rescored rows get the full list a rebuild gives them
+        assert np.allclose(index.scores[index.row_of(row.id)], reference.scores[reference.row_of(row.id)], atol=1e-5)
+    for row in range(len(index.ids)): # Every kept entry still carries its true score
+        for neighbour, score in zip(index.neighbours[row], index.scores[row]):
+            if neighbour >= 0:
+                a, b = reference.row_of(index.ids[row]), reference.row_of(neighbour)
+                assert score == pytest.approx(float((reference.matrix[a] @ reference.matrix[b].T).toarray()[0, 0]), abs=1e-5)
+
+
+def test_batch_into_an_empty_partition():
+    index = _partition([])
+    index.apply({row.id: _features(row) for row in _rows(range(1, 6), seed=4)})
+    assert list(index.ids) == [1, 2, 3, 4, 5]
+    assert sorted(index.lookup(1)) == [2, 3, 4, 5]
+
+
+def test_changes_of_one_commit_reach_the_index_as_one_batch(session, institutes, monkeypatch):
+    index = build_index(session)
+    index_holder.publish(index)
+    batches = []
+    monkeypatch.setattr(type(index), 'apply', lambda self, changes: batches.append(dict(changes)))
+
+    first, second = institutes
+    moved = Alumni.query.filter_by(institute_id=first).first()
+    session.add_all([Alumni(name='Batch A', graduation_year=2010, major='Law', city='Oslo', institute_id=first),
+                     Alumni(name='Batch B', graduation_year=2011, major='Law', city='Lima', institute_id=second)])
+    moved.institute_id = second
+    session.commit()
+
+    assert len(batches) == 1
+    change = batches[0]
+    assert change[moved.id] == (second, (moved.major, moved.city, moved.graduation_year))
+    assert sorted(institute_id for institute_id, _ in change.values()) == sorted([first, second, second])
+
+    moved.institute_id = first # Leave the synthetic institutes as they were
+    session.commit()
+
+
+def test_partitioned_apply_moves_alumni_between_institutes(session, institutes):
+    index = build_index(session)
+    first, second = institutes
+    alumni_id = int(index.partitions[first].ids[0])
+    index.apply({alumni_id: (second, ('Law', 'Oslo', 2001)), 10 ** 9: (first, ('Law', 'Oslo', 2001))})
+
+    assert index.institute_of[alumni_id] == second
+    assert index.partitions[first].row_of(alumni_id) is None
+    assert index.partitions[second].row_of(alumni_id) is not None
+    assert alumni_id not in index.partitions[first].neighbours
+    assert set(index.lookup(alumni_id)) <= {int(i) for i in index.partitions[second].ids}
+
+    index.apply({alumni_id: None})
+    assert index.lookup(alumni_id) is None and index.partitions[second].row_of(alumni_id) is None
@@ -0,0 +1,109 @@
+# tests/test_rollups.py
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, select, text
+
+from app import db
+from app.models import Alumni, Event, Institute, InstituteRollup
+from app.rollups import get_institute_analytics, reconcile_rollups
+
+
+@pytest.fixture
+def institute(session):
+    """A fresh, empty institute."""
+    institute = Institute(name=f'Rollup Institute {Institute.query.count() + 1}')
+    session.add(institute)
+    session.commit()
+    return institute.id
+
+
+def _counters(session, institute_id):
+    rows = session.execute(select(InstituteRollup.dimension, InstituteRollup.key, InstituteRollup.count)
+                           .where(InstituteRollup.institute_id == institute_id, InstituteRollup.count != 0))
+    return {(dimension, key): count for dimension, key, count in rows}
+
+
+def test_orm_writes_move_the_counters(session, institute):
+    first = Alumni(name='A', graduation_year=2001, major='Law', city='Oslo', institute_id=institute)
+    second = Alumni(name='B', graduation_year=2002, major='Law', city='Lima', institute_id=institute, profile_complete=True)
+    session.add_all([first, second, Event(title='Reunion', date_time=datetime(2030, 5, 1), institute_id=institute)])
+    session.commit()
+    assert _counters(session, institute) == {
+        ('alumni', ''): 2, ('year', '2001'): 1, ('year', '2002'): 1, ('major', 'Law'): 2, ('city', 'Oslo'): 1,
+        ('city', 'Lima'): 1, ('profile', 'complete'): 1, ('profile', 'incomplete'): 1,
+        ('events', ''): 1, ('event_month', '2030-05'): 1}
+
+    first.city, first.major = 'Lima', None # Both expired since the commit
+    session.commit()
+    session.delete(second)
+    session.commit()
+    assert _counters(session, institute) == {
+        ('alumni', ''): 1, ('year', '2001'): 1, ('city', 'Lima'): 1, ('profile', 'incomplete'): 1,
+        ('events', ''): 1, ('event_month', '2030-05'): 1}
+    assert reconcile_rollups(institute) == 0
+
+
+def test_moving_an_alumnus_moves_its_counts(session, institute):
+    other = Institute(name=f'Rollup Institute {institute}b')
+    alumnus = Alumni(name='C', graduation_year=2003, major='Art', city='Pune', institute_id=institute)
+    session.add_all([other, alumnus])
+    session.commit()
+
+    alumnus.institute_id = other.id
+    session.commit()
+    assert _counters(session, institute).get(('alumni', ''), 0) == 0
+    assert _counters(session, other.id)[('major', 'Art')] == 1
+    assert reconcile_rollups() == 0
+
+
+def test_setting_columns_loads_no_old_values(session, institute):
+    alumnus = Alumni(name='D', graduation_year=2004, major='Law', city='Oslo', institute_id=institute)
+    session.add(alumnus)
+    session.commit()
+    session.refresh(alumnus)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        alumnus.name = 'Renamed' # Not counted
+        alumnus.city = 'Lima'    # Counted; the old value is in the attribute history
+        session.commit()
+        assert 'SELECT' not in statements
+
+        del statements[:]
+        alumnus.city = 'Pune' # Expired by the commit: setting it reads nothing
+        assert statements == []
+        session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert _counters(session, institute)[('city', 'Pune')] == 1
+    assert reconcile_rollups(institute) == 0
+
+
+def test_reconcile_corrects_drift(session, institute):
+    session.add_all([Alumni(name=f'E{n}', graduation_year=2005, major='Law', city='Oslo', institute_id=institute)
+                     for n in range(3)])
+    session.commit()
+    session.execute(text('UPDATE alumni SET city = :city WHERE institute_id = :id'), {'city': 'Raw', 'id': institute})
+    session.commit()
+
+    assert reconcile_rollups(institute) == 2 # Oslo gone, Raw added
+    assert _counters(session, institute)[('city', 'Raw')] == 3
+    assert ('city', 'Oslo') not in _counters(session, institute)
+    assert reconcile_rollups(institute) == 0
+
+
+def test_analytics_reads_only_the_top_majors_and_cities(session, institute):
+    majors = {'Law': 4, 'Art': 3, 'Physics': 3, 'History': 1}
+    session.add_all([Alumni(name=major, graduation_year=2000 + n, major=major, city=major, institute_id=institute)
+                     for major, count in majors.items() for n in range(count)])
+    session.commit()
+
+    analytics = get_institute_analytics(institute, top=2)
+    assert analytics.majors == [('Law', 4), ('Art', 3)] # Ties broken by key
+    assert analytics.cities == [('Law', 4), ('Art', 3)]
+    assert analytics.alumni == 11
+    assert [year for year, _ in analytics.years] == ['2000', '2001', '2002', '2003']
+    assert len(get_institute_analytics(institute).majors) == 4
@@ -0,0 +1,83 @@
+# tests/test_tenancy.py
+
+from flask import g
+
+from app.chat_cache import MemoryResponseCache
+from app.chatbot import ChatClient, FakeBackend
+from app.models import Alumni, Event, User
+from app.retrieval import retrieval_index
+from tests.conftest import login
+
+
+def _scoped(app, path):
+    """A request context for `path` with the tenant resolved, as a view would see it."""
+    context = app.test_request_context(path)
+    context.push()
+    app.preprocess_request()
+    return context
+
+
+def _member(institute_id):
+    """A synthetic alumnus of `institute_id` who has a user account."""
+    return (User.query.join(Alumni, User.alumni_id == Alumni.id)
+            .filter(Alumni.institute_id == institute_id).order_by(User.id).first())
+
+
+def test_queries_only_see_the_request_institute(app, session, institutes):
+    first, second = institutes
+    other = Alumni.query.filter_by(institute_id=second).first().id
+    context = _scoped(app, f'/events?institute={first}')
+    try:
+        assert g.institute_id == first
+        assert {a.institute_id for a in Alumni.query} == {first}
+        assert {e.institute_id for e in Event.query} == {first}
+        assert session.get(Alumni, other, populate_existing=True) is None
+        everyone = Alumni.query.execution_options(all_tenants=True)
+        assert {a.institute_id for a in everyone} >= {first, second}
+    finally:
+        context.pop()
+
+
+def test_members_cannot_open_other_institutes_profiles(session, client, institutes):
+    first, second = institutes
+    member = _member(first)
+    colleague = Alumni.query.filter(Alumni.institute_id == first, Alumni.id != member.alumni_id).first().id
+    stranger = Alumni.query.filter_by(institute_id=second).first().id
+
+    login(client, member.username)
+    assert client.get(f'/alumni/{colleague}').status_code == 200
+    assert client.get(f'/alumni/{stranger}').status_code == 404
+
+
+def test_visitors_pick_an_institute_once(app, institutes):
+    first, second = institutes
+    with app.test_client() as client:
+        client.get(f'/events?institute={second}')
+        client.get('/events') # Remembered by the session
+        assert g.institute_id == second
+        client.get('/events?institute=999999') # No such institute
+        assert g.institute_id == app.config['DEFAULT_INSTITUTE_ID']
+
+
+def test_retrieval_only_returns_the_asking_institute(session, institutes):
+    first, second = institutes
+    retrieval_index.build(session)
+    session.add(Alumni(name='Quillon Zebedee', graduation_year=2012, major='Law', city='Oslo', institute_id=second))
+    session.commit() # Reaches the built index through change tracking
+
+    assert retrieval_index.search('Quillon Zebedee', second) == ['Alumnus: Quillon Zebedee, Law, Oslo, class of 2012']
+    assert retrieval_index.search('Quillon Zebedee', first) == []
+    for institute_id in institutes:
+        own = {f'Alumnus: {a.name}' for a in Alumni.query.filter_by(institute_id=institute_id)}
+        for snippet in retrieval_index.search('alumnus class law engineering', institute_id, limit=50, max_chars=10 ** 6):
+            assert snippet.split(',')[0] in own
+
+
+def test_chat_cache_is_kept_per_institute():
+    backend = FakeBackend({'CHATBOT_FAKE_LATENCY': 0, 'CHATBOT_FAKE_TOKEN_DELAY': 0})
+    client = ChatClient(backend, cache=MemoryResponseCache())
+    client.reply('When is the reunion?', ['Event: Reunion'], institute_id=1)
+    client.reply('When is the reunion?', ['Event: Reunion'], institute_id=2)
+    client.reply('When is the reunion?', ['Event: Reunion'], institute_id=1)
+    stats = client.cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)